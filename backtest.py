@@ -0,0 +1,177 @@
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from dotenv import load_dotenv
+from nav_store import nav_store, to_iso
+from scoring import PORTFOLIO_BANDS
+
+import json
+import math
+import numpy as np
+import os
+
+load_dotenv()
+
+# Historical performance of an equity / fixed-income mix, from the NAV store's series.
+# Everything is computed a column at a time; there is no per-day Python loop.
+
+# Instruments standing in for each asset class
+BACKTEST_EQUITY_SYMBOL = os.getenv("BACKTEST_EQUITY_SYMBOL", "NIFTY50")
+BACKTEST_FIXED_INCOME_SYMBOL = os.getenv("BACKTEST_FIXED_INCOME_SYMBOL", "CRISIL_BOND")
+# Distinct (allocation, range, rebalance, ...) results kept
+BACKTEST_CACHE_SIZE = int(os.getenv("BACKTEST_CACHE_SIZE", "256"))
+
+REBALANCE_FREQUENCIES = ("none", "daily", "monthly", "quarterly", "annually")
+# Value of the portfolio on the first day
+INITIAL_VALUE = 100.0
+DAYS_PER_YEAR = 365.25
+
+class NotEnoughHistoryError(ValueError):
+  pass
+
+def band_allocation(band: str) -> Tuple[str, int]:
+  # Band name (any case, spaces, hyphens or underscores) -> (name, equity %)
+  wanted = band.replace("-", " ").replace("_", " ").strip().lower()
+  for _, portfolio_type, equity, _ in PORTFOLIO_BANDS:
+    if portfolio_type.lower() == wanted:
+      return portfolio_type, equity
+  raise KeyError(band)
+
+def band_name(equity: float) -> Optional[str]:
+  for _, portfolio_type, band_equity, _ in PORTFOLIO_BANDS:
+    if band_equity == equity:
+      return portfolio_type
+  return None
+
+# ---------------------------
+# Engine
+# ---------------------------
+def aligned_prices(equity_symbol: str, fixed_income_symbol: str, start: Optional[date], end: Optional[date]):
+  # Days both instruments have a price for, and the (days, 2) price matrix
+  equity_days, equity_prices = nav_store.series(equity_symbol, start, end)
+  fixed_days, fixed_prices = nav_store.series(fixed_income_symbol, start, end)
+  days, equity_index, fixed_index = np.intersect1d(equity_days, fixed_days, assume_unique=True, return_indices=True)
+  prices = np.column_stack((equity_prices[equity_index], fixed_prices[fixed_index]))
+  return days.astype(np.int64), prices
+
+def rebalance_anchors(days: np.ndarray, frequency: str) -> np.ndarray:
+  # Indices of the days the portfolio is reset to its target weights (at that day's close)
+  if frequency == "daily":
+    return np.arange(len(days))
+  if frequency == "none":
+    return np.zeros(1, dtype=np.int64)
+  months = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+  periods = {"monthly": months, "quarterly": months // 3, "annually": months // 12}[frequency]
+  return np.concatenate(([0], np.flatnonzero(np.diff(periods)) + 1))
+
+def portfolio_values(prices: np.ndarray, weights: np.ndarray, anchors: np.ndarray) -> np.ndarray:
+  # Between two rebalances the holdings are fixed, so relative to the last anchor a the
+  # value grows by (prices[t] / prices[a]) @ weights. Day t belongs to the period of the
+  # last anchor strictly before it (the anchor day itself closes the previous period).
+  period = np.maximum(np.searchsorted(anchors, np.arange(len(prices)), side="left") - 1, 0)
+  growth = (prices / prices[anchors[period]]) @ weights
+  anchor_values = np.cumprod(np.concatenate(([1.0], growth[anchors[1:]])))
+  return INITIAL_VALUE * anchor_values[period] * growth
+
+def drawdown(days: np.ndarray, values: np.ndarray) -> Dict:
+  peaks = np.maximum.accumulate(values)
+  drawdowns = values / peaks - 1
+  trough = int(np.argmin(drawdowns))
+  peak = int(np.argmax(values[:trough + 1]))
+  return {
+    "max_drawdown": float(drawdowns[trough]),
+    "peak_date": to_iso(days[peak:peak + 1])[0],
+    "trough_date": to_iso(days[trough:trough + 1])[0],
+  }
+
+def rolling_returns(days: np.ndarray, values: np.ndarray, years: float) -> Dict:
+  # Annualized return over the `years` ending on each day, measured from the last price
+  # on or before the window start; days without a full window are left out.
+  window = int(round(years * DAYS_PER_YEAR))
+  start_index = np.searchsorted(days, days - window, side="right") - 1
+  full = days - window >= days[0]
+  if not full.any():
+    return {"years": years, "dates": [], "values": [], "min": None, "median": None, "max": None}
+  returns = (values[full] / values[start_index[full]]) ** (1 / years) - 1
+  return {
+    "years": years,
+    "dates": to_iso(days[full]),
+    "values": returns.tolist(),
+    "min": float(returns.min()),
+    "median": float(np.median(returns)),
+    "max": float(returns.max()),
+  }
+
+def run_backtest(
+  equity: float,
+  start: Optional[date] = None,
+  end: Optional[date] = None,
+  rebalance: str = "monthly",
+  rolling_years: float = 1.0,
+  equity_symbol: str = BACKTEST_EQUITY_SYMBOL,
+  fixed_income_symbol: str = BACKTEST_FIXED_INCOME_SYMBOL,
+) -> Dict:
+  # equity is the equity weight in percent; the rest is fixed income. Memoized on the
+  # arguments plus both instruments' row counts, so appended history is picked up. The
+  # result is shared between callers and must not be modified.
+  return _memoized(equity, start, end, rebalance, rolling_years, equity_symbol, fixed_income_symbol)[0]
+
+def run_backtest_json(
+  equity: float,
+  start: Optional[date] = None,
+  end: Optional[date] = None,
+  rebalance: str = "monthly",
+  rolling_years: float = 1.0,
+  equity_symbol: str = BACKTEST_EQUITY_SYMBOL,
+  fixed_income_symbol: str = BACKTEST_FIXED_INCOME_SYMBOL,
+) -> bytes:
+  # Same, already encoded: encoding the curves costs more than a cache hit
+  return _memoized(equity, start, end, rebalance, rolling_years, equity_symbol, fixed_income_symbol)[1]
+
+def _memoized(equity, start, end, rebalance, rolling_years, equity_symbol, fixed_income_symbol):
+  if not 0 <= equity <= 100:
+    raise ValueError("equity must be between 0 and 100")
+  if rebalance not in REBALANCE_FREQUENCIES:
+    raise ValueError(f"rebalance must be one of {', '.join(REBALANCE_FREQUENCIES)}")
+  versions = (nav_store.instrument(equity_symbol)["rows"], nav_store.instrument(fixed_income_symbol)["rows"])
+  return _cached_backtest(float(equity), start, end, rebalance, float(rolling_years), equity_symbol, fixed_income_symbol, versions)
+
+@lru_cache(maxsize=BACKTEST_CACHE_SIZE)
+def _cached_backtest(equity, start, end, rebalance, rolling_years, equity_symbol, fixed_income_symbol, versions):
+  result = compute_backtest(equity, start, end, rebalance, rolling_years, equity_symbol, fixed_income_symbol)
+  return result, json.dumps(result, separators=(",", ":")).encode("utf-8")
+
+def compute_backtest(equity, start, end, rebalance, rolling_years, equity_symbol, fixed_income_symbol) -> Dict:
+  days, prices = aligned_prices(equity_symbol, fixed_income_symbol, start, end)
+  if len(days) < 2:
+    raise NotEnoughHistoryError("Not enough price history in the requested range.")
+  weights = np.array([equity / 100, 1 - equity / 100])
+  values = portfolio_values(prices, weights, rebalance_anchors(days, rebalance))
+
+  years = (days[-1] - days[0]) / DAYS_PER_YEAR
+  daily_returns = values[1:] / values[:-1] - 1
+  # Observations per year from the data itself, so trading-day and calendar-day series
+  # annualize alike
+  per_year = len(daily_returns) / years if years > 0 else 0.0
+  volatility = float(np.std(daily_returns, ddof=1) * math.sqrt(per_year)) if len(daily_returns) > 1 else 0.0
+  return {
+    "portfolio_type": band_name(equity),
+    "equity_allocation": equity,
+    "fixed_income_allocation": 100 - equity,
+    "equity_symbol": equity_symbol,
+    "fixed_income_symbol": fixed_income_symbol,
+    "rebalance": rebalance,
+    "start": to_iso(days[:1])[0],
+    "end": to_iso(days[-1:])[0],
+    "final_value": float(values[-1]),
+    "total_return": float(values[-1] / INITIAL_VALUE - 1),
+    "cagr": float((values[-1] / INITIAL_VALUE) ** (1 / years) - 1) if years > 0 else None,
+    "volatility": volatility,
+    **drawdown(days, values),
+    "equity_curve": {"dates": to_iso(days), "values": values.tolist()},
+    "rolling_returns": rolling_returns(days, values, rolling_years),
+  }
+
+def backtest_cache_stats() -> Dict[str, float]:
+  info = _cached_backtest.cache_info()
+  return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
@@ -0,0 +1,205 @@
+import os
+
+# Benchmarks run against a local SQLite database unless a URL is given explicitly;
+# this has to be set before `database` is imported anywhere.
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", "sqlite:///benchmarks.db")
+
+from sqlalchemy import ARRAY, event
+from sqlalchemy.ext.compiler import compiles
+from database import Base, engine, SessionLocal
+from models import Questions, User, InputType
+from scoring import DEFAULT_RULES, encode_rules
+
+import asyncio
+import fnmatch
+import random
+import time
+
+# ---------------------------
+# SQLite compatibility
+# ---------------------------
+# Postgres ARRAY columns are stored as JSON text on SQLite. Only the DDL matters here;
+# benchmarks never filter on the array contents.
+@compiles(ARRAY, "sqlite")
+def _compile_array_sqlite(element, compiler, **kw):
+  return "JSON"
+
+def reset_database():
+  Base.metadata.drop_all(bind=engine)
+  Base.metadata.create_all(bind=engine)
+
+def seed_questionnaire(db):
+  questions = []
+  for display_order, (text, rules) in enumerate(DEFAULT_RULES.items(), start=1):
+    options = sorted({option for factor, points in rules for option in (points or {})})
+    questions.append(Questions(
+      text=text,
+      input_type=InputType.RADIO_BUTTON if options else InputType.INPUT_NUMBER,
+      options=options or None,
+      weight={},
+      scoring_rules=encode_rules(rules),
+      display_order=display_order
+    ))
+  db.add_all(questions)
+  db.commit()
+  return questions
+
+def seed_user(db, username="bench_user"):
+  user = User(username=username, email=f"{username}@example.com", password_hash="x")
+  db.add(user)
+  db.commit()
+  return user
+
+def random_submission(questions, rnd=random):
+  payload = []
+  for question in questions:
+    if question.options:
+      response = rnd.choice(question.options)
+    else:
+      response = str(rnd.randrange(1000, 100000, 500))
+    payload.append({"question_id": str(question.id), "submitted_response": response})
+  return payload
+
+# ---------------------------
+# Round-trip counting
+# ---------------------------
+class RoundTripCounter:
+  # Counts statements sent to the database plus COMMIT/ROLLBACK, i.e. network round trips
+  # on a real server.
+
+  def __init__(self, bind=engine):
+    self.bind = bind
+    self.statements = 0
+    self.transactions = 0
+
+  def _on_execute(self, *args):
+    self.statements += 1
+
+  def _on_commit(self, *args):
+    self.transactions += 1
+
+  def __enter__(self):
+    event.listen(self.bind, "before_cursor_execute", self._on_execute)
+    event.listen(self.bind, "commit", self._on_commit)
+    event.listen(self.bind, "rollback", self._on_commit)
+    return self
+
+  def __exit__(self, *exc):
+    event.remove(self.bind, "before_cursor_execute", self._on_execute)
+    event.remove(self.bind, "commit", self._on_commit)
+    event.remove(self.bind, "rollback", self._on_commit)
+
+  @property
+  def round_trips(self):
+    return self.statements + self.transactions
+
+def session():
+  # Seeded objects stay readable after the session is closed.
+  return SessionLocal(expire_on_commit=False)
+
+# ---------------------------
+# Redis stand-in
+# ---------------------------
+class FakeRedis:
+  # In-process replacement for the handful of redis.Redis calls the app makes.
+
+  def __init__(self):
+    self.store = {}
+
+  def exists(self, key):
+    expires_at = self.store.get(key)
+    if expires_at is not None and expires_at <= time.time():
+      del self.store[key]
+      return 0
+    return int(expires_at is not None)
+
+  def setex(self, key, ttl, value):
+    self.store[key] = time.time() + ttl
+    return True
+
+class FakeAsyncRedis:
+  # In-process replacement for the redis.asyncio client used by revocation.RevocationStore:
+  # EXISTS/SET EX/PTTL/SCAN, pipelines and pub/sub within a single event loop.
+
+  def __init__(self):
+    self.store = {}
+    self.subscribers = []
+
+  def _live(self, key):
+    expires_at = self.store.get(key)
+    if expires_at is not None and expires_at <= time.time():
+      del self.store[key]
+      return None
+    return expires_at
+
+  async def exists(self, key):
+    return int(self._live(key) is not None)
+
+  async def scan_iter(self, match="*", count=None):
+    for key in list(self.store):
+      if fnmatch.fnmatchcase(key, match) and self._live(key) is not None:
+        yield key
+
+  def pipeline(self, transaction=True):
+    return FakeAsyncPipeline(self)
+
+  def pubsub(self):
+    return FakeAsyncPubSub(self)
+
+class FakeAsyncPipeline:
+  def __init__(self, redis):
+    self.redis = redis
+    self.commands = []
+
+  async def __aenter__(self):
+    return self
+
+  async def __aexit__(self, *exc):
+    self.commands = []
+
+  def set(self, key, value, ex=None):
+    self.commands.append(("set", key, value, ex))
+
+  def publish(self, channel, message):
+    self.commands.append(("publish", channel, message))
+
+  def pttl(self, key):
+    self.commands.append(("pttl", key))
+
+  async def execute(self):
+    results = []
+    for command, *args in self.commands:
+      if command == "set":
+        key, value, ex = args
+        self.redis.store[key] = time.time() + ex if ex else float("inf")
+        results.append(True)
+      elif command == "publish":
+        channel, message = args
+        receivers = [pubsub for pubsub in self.redis.subscribers if channel in pubsub.channels]
+        for pubsub in receivers:
+          pubsub.queue.put_nowait({"type": "message", "channel": channel, "data": message})
+        results.append(len(receivers))
+      else:
+        expires_at = self.redis._live(args[0])
+        results.append(-2 if expires_at is None else int((expires_at - time.time()) * 1000))
+    self.commands = []
+    return results
+
+class FakeAsyncPubSub:
+  def __init__(self, redis):
+    self.redis = redis
+    self.channels = set()
+    self.queue = asyncio.Queue()
+
+  async def subscribe(self, channel):
+    self.channels.add(channel)
+    if self not in self.redis.subscribers:
+      self.redis.subscribers.append(self)
+
+  async def listen(self):
+    while True:
+      yield await self.queue.get()
+
+  async def aclose(self):
+    if self in self.redis.subscribers:
+      self.redis.subscribers.remove(self)
@@ -0,0 +1,87 @@
+# Query plan and latency of "latest FinancialMetrics row for a user".
+#
+#   python -m benchmarks.latest_metrics [users] [rows_per_user] [lookups]
+#
+# Seeds users * rows_per_user metrics rows, then times three variants:
+#   unordered  - the old filter_by(user_id=...).first(), no index (may return any row)
+#   no index   - the ordered latest-row query with the composite index dropped
+#   indexed    - queries.get_latest_id / get_latest with ix_financial_metrics_user_id_created_at
+from benchmarks.common import reset_database, session
+from datetime import datetime, timedelta
+from sqlalchemy import insert, text
+from models import User, FinancialMetrics
+from queries import latest_id_query, get_latest_id, get_latest
+
+import random
+import sys
+import time
+import uuid
+
+INDEX_NAME = "ix_financial_metrics_user_id_created_at"
+
+def seed(db, users, rows_per_user, chunk=5000):
+  user_ids = [uuid.uuid4() for _ in range(users)]
+  for start in range(0, users, chunk):
+    db.execute(insert(User), [
+      {"id": user_id, "username": f"user{start + i}", "email": f"user{start + i}@example.com", "password_hash": "x"}
+      for i, user_id in enumerate(user_ids[start:start + chunk])
+    ])
+  base = datetime(2025, 1, 1)
+  rows = []
+  for n in range(rows_per_user):
+    for user_id in user_ids:
+      rows.append({
+        "user_id": user_id, "risk_capacity": 50, "risk_tolerance": 10, "investing_potential": 5000,
+        "liquidity_ratio": 0, "debt_to_income_ratio": 0, "investment_horizon_score": 10,
+        "created_at": base + timedelta(days=n, seconds=random.randrange(86400)),
+      })
+      if len(rows) >= chunk:
+        db.execute(insert(FinancialMetrics), rows)
+        rows = []
+  if rows:
+    db.execute(insert(FinancialMetrics), rows)
+  db.commit()
+  return user_ids
+
+def explain(db, statement):
+  dialect = db.get_bind().dialect.name
+  compiled = statement.compile(dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True})
+  if dialect == "sqlite":
+    rows = db.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+    return "\n".join(f"    {row[-1]}" for row in rows)
+  rows = db.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {compiled}")).all()
+  return "\n".join(f"    {row[0]}" for row in rows)
+
+def timed(label, fn, user_ids, lookups):
+  sample = random.Random(7).choices(user_ids, k=lookups)
+  start = time.perf_counter()
+  for user_id in sample:
+    fn(user_id)
+  elapsed = time.perf_counter() - start
+  print(f"  {label:<22} {elapsed / lookups * 1e6:9.1f} us/lookup")
+
+def main(users=20000, rows_per_user=10, lookups=2000):
+  reset_database()
+  with session() as db:
+    start = time.perf_counter()
+    user_ids = seed(db, users, rows_per_user)
+    print(f"seeded {users * rows_per_user} financial_metrics rows in {time.perf_counter() - start:.1f}s")
+    probe = user_ids[0]
+
+    db.execute(text(f"DROP INDEX {INDEX_NAME}"))
+    db.commit()
+    print("\nplan without index:")
+    print(explain(db, latest_id_query(FinancialMetrics, probe)))
+    timed("unordered first()", lambda u: db.query(FinancialMetrics).filter_by(user_id=u).first(), user_ids, max(lookups // 20, 1))
+    timed("latest id, no index", lambda u: get_latest_id(db, FinancialMetrics, u), user_ids, max(lookups // 20, 1))
+
+    db.execute(text(f"CREATE INDEX {INDEX_NAME} ON financial_metrics (user_id, created_at DESC, id DESC)"))
+    db.execute(text("ANALYZE"))
+    db.commit()
+    print("\nplan with index:")
+    print(explain(db, latest_id_query(FinancialMetrics, probe)))
+    timed("latest id (indexed)", lambda u: get_latest_id(db, FinancialMetrics, u), user_ids, lookups)
+    timed("latest row (indexed)", lambda u: get_latest(db, FinancialMetrics, u), user_ids, lookups)
+
+if __name__ == "__main__":
+  main(*(int(arg) for arg in sys.argv[1:]))
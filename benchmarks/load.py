@@ -0,0 +1,259 @@
+# End-to-end load benchmark of the whole application (main.app, lifespan included).
+#
+#   python -m benchmarks.load [--users N] [--concurrency C] [--requests R] [--mix SPEC]
+#                             [--seed S] [--output FILE] [--baseline FILE]
+#
+# Requests are driven in-process through httpx's ASGI transport against SQLite (or
+# SQLALCHEMY_DATABASE_URL) with an in-process Redis stand-in, so nothing external is needed.
+# Password hashing still goes through the real bcrypt process pool; with more concurrent
+# signups/signins than PASSWORD_POOL_MAX_PENDING some of them get 503, as in production.
+#
+# Setup signs up --users users and submits one questionnaire each (not measured). Then
+# --concurrency workers issue --requests requests in total, each picking a route from the
+# weighted --mix and a random user. Throughput and p50/p95/p99 per route are printed and
+# written as JSON (default benchmarks/results/load-<commit>.json); pass an earlier file
+# as --baseline to print the change per route.
+from benchmarks.common import FakeAsyncRedis, random_submission, reset_database, seed_questionnaire, session
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from database import engine
+from main import app
+from revocation import revocation_store
+
+import argparse
+import asyncio
+import httpx
+import json
+import logger
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import time
+
+ROUTES = ("signup", "signin", "questions", "submit", "portfolio")
+DEFAULT_MIX = "signup=2,signin=3,questions=30,submit=15,portfolio=50"
+PASSWORD = "bench-password"
+
+def parse_mix(spec: str):
+  mix = {}
+  for item in filter(None, (part.strip() for part in spec.split(","))):
+    route, _, weight = item.partition("=")
+    if route.strip() not in ROUTES:
+      raise SystemExit(f"Unknown route in --mix: {route.strip()} (expected one of {', '.join(ROUTES)})")
+    mix[route.strip()] = float(weight)
+  return mix
+
+def percentile(ordered, fraction):
+  # Nearest-rank percentile of an already sorted list
+  if not ordered:
+    return 0.0
+  rank = max(math.ceil(fraction * len(ordered)), 1)
+  return ordered[rank - 1]
+
+def git_commit():
+  try:
+    return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return "unknown"
+
+# ---------------------------
+# Virtual users
+# ---------------------------
+class VirtualUser:
+  # One browser session: its own cookie jar, and the questionnaire ETag it last saw.
+
+  def __init__(self, username: str):
+    self.username = username
+    self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+    self.etag = None
+
+  async def signup(self):
+    return await self.client.post("/auth/signup", json={
+      "username": self.username, "email": f"{self.username}@example.com", "password": PASSWORD
+    })
+
+  async def signin(self):
+    return await self.client.post("/auth/signin", json={"username": self.username, "password": PASSWORD})
+
+  async def questions(self):
+    headers = {"If-None-Match": self.etag} if self.etag else {}
+    response = await self.client.get("/questions/", headers=headers)
+    self.etag = response.headers.get("etag", self.etag)
+    return response
+
+  async def submit(self, questions, rnd):
+    return await self.client.post("/questions/submit", json=random_submission(questions, rnd))
+
+  async def portfolio(self):
+    return await self.client.get("/portfolio/")
+
+class LoadRun:
+  def __init__(self, questions, mix, seed):
+    self.questions = questions
+    self.routes = list(mix)
+    self.weights = [mix[route] for route in self.routes]
+    self.seed = seed
+    self.users = []
+    self.signups = 0
+    self.latencies = defaultdict(list)
+    self.statuses = defaultdict(Counter)
+
+  def new_user(self):
+    self.signups += 1
+    return VirtualUser(f"bench_{self.seed}_{self.signups}")
+
+  async def call(self, route, user, rnd):
+    if route == "signup":
+      user = self.new_user()
+      response = await user.signup()
+      if response.status_code == 200:
+        self.users.append(user)
+      return response
+    if route == "submit":
+      return await user.submit(self.questions, rnd)
+    return await getattr(user, route)()
+
+  async def setup(self, users):
+    async def onboard(user):
+      (await user.signup()).raise_for_status()
+      (await user.submit(self.questions, random.Random(user.username))).raise_for_status()
+      self.users.append(user)
+    # Bounded so setup stays within the password pool's admission limit
+    for start in range(0, users, 8):
+      await asyncio.gather(*(onboard(self.new_user()) for _ in range(min(8, users - start))))
+
+  async def worker(self, index, remaining):
+    rnd = random.Random(self.seed * 1000 + index)
+    while remaining[0] > 0:
+      remaining[0] -= 1
+      route = rnd.choices(self.routes, self.weights)[0]
+      user = rnd.choice(self.users)
+      start = time.perf_counter()
+      try:
+        status = (await self.call(route, user, rnd)).status_code
+      except Exception as e:
+        status = type(e).__name__
+      self.latencies[route].append(time.perf_counter() - start)
+      self.statuses[route][str(status)] += 1
+
+  async def run(self, concurrency, requests):
+    remaining = [requests]
+    start = time.perf_counter()
+    await asyncio.gather(*(self.worker(index, remaining) for index in range(concurrency)))
+    return time.perf_counter() - start
+
+  async def close(self):
+    await asyncio.gather(*(user.client.aclose() for user in self.users))
+
+# ---------------------------
+# Reporting
+# ---------------------------
+def summarize(run, seconds):
+  routes = {}
+  for route in run.routes:
+    ordered = sorted(run.latencies[route])
+    if not ordered:
+      continue
+    routes[route] = {
+      "count": len(ordered),
+      "throughput": len(ordered) / seconds,
+      "mean_ms": sum(ordered) / len(ordered) * 1000,
+      "p50_ms": percentile(ordered, 0.50) * 1000,
+      "p95_ms": percentile(ordered, 0.95) * 1000,
+      "p99_ms": percentile(ordered, 0.99) * 1000,
+      "max_ms": ordered[-1] * 1000,
+      "status": dict(run.statuses[route]),
+    }
+  total = sum(route["count"] for route in routes.values())
+  return {"requests": total, "seconds": seconds, "throughput": total / seconds if seconds else 0.0}, routes
+
+def print_report(total, routes, baseline=None):
+  print(f"\n{'route':<10} {'count':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  status")
+  for route, stats in routes.items():
+    statuses = " ".join(f"{code}:{count}" for code, count in sorted(stats["status"].items()))
+    print(f"{route:<10} {stats['count']:>7} {stats['throughput']:>9.1f} {stats['p50_ms']:>9.2f} "
+          f"{stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}  {statuses}")
+  print(f"{'total':<10} {total['requests']:>7} {total['throughput']:>9.1f}   ({total['seconds']:.1f}s)")
+
+  if baseline is None:
+    return
+  print(f"\nchange vs {baseline['meta']['commit']} (positive = slower)")
+  for route, stats in routes.items():
+    before = baseline["routes"].get(route)
+    if before is None:
+      continue
+    changes = "  ".join(
+      f"{key[:-3]} {(stats[key] - before[key]) / before[key] * 100:+6.1f}%" if before[key] else f"{key[:-3]}    n/a"
+      for key in ("p50_ms", "p95_ms", "p99_ms")
+    )
+    print(f"{route:<10} {changes}")
+  if baseline["total"]["throughput"]:
+    change = (total["throughput"] - baseline["total"]["throughput"]) / baseline["total"]["throughput"] * 100
+    print(f"{'total':<10} throughput {change:+6.1f}%")
+
+async def run_benchmark(args, mix):
+  reset_database()
+  with session() as db:
+    questions = seed_questionnaire(db)
+
+  revocation_store.client = FakeAsyncRedis()
+  async with app.router.lifespan_context(app):
+    run = LoadRun(questions, mix, args.seed)
+    start = time.perf_counter()
+    await run.setup(args.users)
+    print(f"onboarded {args.users} users in {time.perf_counter() - start:.1f}s")
+    seconds = await run.run(args.concurrency, args.requests)
+    await run.close()
+  return run, seconds
+
+def main():
+  parser = argparse.ArgumentParser(description="End-to-end load benchmark of the API.")
+  parser.add_argument("--users", type=int, default=50, help="users signed up and onboarded before measuring")
+  parser.add_argument("--concurrency", type=int, default=16, help="concurrent virtual clients")
+  parser.add_argument("--requests", type=int, default=5000, help="measured requests in total")
+  parser.add_argument("--mix", default=DEFAULT_MIX, help=f"route weights (default {DEFAULT_MIX})")
+  parser.add_argument("--seed", type=int, default=1)
+  parser.add_argument("--output", help="results file (default benchmarks/results/load-<commit>.json)")
+  parser.add_argument("--baseline", help="earlier results file to compare against")
+  args = parser.parse_args()
+  mix = parse_mix(args.mix)
+
+  # Keep file logging (part of the request cost) but not the console output
+  logger.stream_handler.setLevel(logging.ERROR)
+  run, seconds = asyncio.run(run_benchmark(args, mix))
+  total, routes = summarize(run, seconds)
+
+  commit = git_commit()
+  results = {
+    "meta": {
+      "commit": commit,
+      "timestamp": datetime.now(timezone.utc).isoformat(),
+      "python": platform.python_version(),
+      "database": engine.dialect.name,
+      "users": args.users,
+      "concurrency": args.concurrency,
+      "requests": args.requests,
+      "mix": mix,
+      "seed": args.seed,
+    },
+    "total": total,
+    "routes": routes,
+  }
+  baseline = None
+  if args.baseline:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+  print_report(total, routes, baseline)
+
+  output = args.output or os.path.join("benchmarks", "results", f"load-{commit}.json")
+  os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+  with open(output, "w") as f:
+    json.dump(results, f, indent=2)
+  print(f"\nresults written to {output}")
+
+# Guarded: the password pool's spawned workers re-import this module
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,114 @@
+# Per-request middleware overhead on GET /questions/ and GET /portfolio/.
+#
+#   python -m benchmarks.middleware_overhead [requests]
+#
+# Compares the routes with no middleware, with the previous three @app.middleware("http")
+# layers (reproduced below), and with RequestMiddleware. Requests are driven in-process
+# through httpx's ASGI transport against SQLite and an in-process Redis stand-in.
+from benchmarks.common import FakeRedis, reset_database, seed_questionnaire, seed_user, session
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from models import FinancialMetrics
+from revocation import revocation_store
+from routers.auth import generate_jwt_token
+from routers.portfolio import router as portfolio_router
+from routers.questions import router as questions_router
+
+import asyncio
+import httpx
+import json
+import jwt
+import middleware
+import sys
+import time
+
+# ---------------------------
+# Previous middleware stack
+# ---------------------------
+legacy_redis = FakeRedis()
+
+async def legacy_process_time(request: Request, call_next):
+  start_time = time.time()
+  response = await call_next(request)
+  response.headers["X-Process-Time"] = str(time.time() - start_time)
+  return response
+
+async def legacy_validate_json(request: Request, call_next):
+  if request.headers.get('Content-Type') == 'application/json':
+    try:
+      await request.json()
+    except json.JSONDecodeError:
+      return JSONResponse(status_code=400, content={"message": "Invalid JSON format"})
+  return await call_next(request)
+
+async def legacy_jwt_auth(request: Request, call_next):
+  body = await request.body()
+  middleware.logger.info(f"Incoming request method: {request.method}, URL: {request.url}, Body: {body.decode('utf-8')}")
+  token = request.cookies.get("jwt_token")
+  if not token or legacy_redis.exists(token):
+    return JSONResponse(content={"message": "Unauthorized"}, status_code=401)
+  try:
+    decoded = jwt.decode(token, middleware.JWT_SECRET_KEY, algorithms=[middleware.JWT_ALGORITHM])
+  except jwt.InvalidTokenError:
+    return JSONResponse(content={"message": "Invalid token"}, status_code=401)
+  request.state.username = decoded.get('username')
+  return await call_next(request)
+
+class StateOnly:
+  # Baseline: only sets what the routes need from the auth layer.
+  def __init__(self, app, username):
+    self.app = app
+    self.username = username
+
+  async def __call__(self, scope, receive, send):
+    scope.setdefault("state", {})["username"] = self.username
+    await self.app(scope, receive, send)
+
+def build_app(mode, username):
+  app = FastAPI()
+  if mode == "none":
+    app.add_middleware(StateOnly, username=username)
+  elif mode == "legacy":
+    app.middleware("http")(legacy_process_time)
+    app.middleware("http")(legacy_validate_json)
+    app.middleware("http")(legacy_jwt_auth)
+  else:
+    app.add_middleware(middleware.RequestMiddleware)
+  app.include_router(questions_router, prefix="/questions")
+  app.include_router(portfolio_router, prefix="/portfolio")
+  return app
+
+async def measure(app, path, token, requests):
+  transport = httpx.ASGITransport(app=app)
+  async with httpx.AsyncClient(transport=transport, base_url="http://bench", cookies={"jwt_token": token}) as client:
+    for _ in range(min(50, requests)):
+      (await client.get(path)).raise_for_status()
+    start = time.perf_counter()
+    for _ in range(requests):
+      await client.get(path)
+    return (time.perf_counter() - start) / requests
+
+def main(requests=2000):
+  # Local-only revocation checks, i.e. what a synced worker does per request.
+  revocation_store.client = None
+  middleware.logger.disabled = True
+  reset_database()
+  with session() as db:
+    seed_questionnaire(db)
+    user = seed_user(db)
+    db.add(FinancialMetrics(user_id=user.id, risk_capacity=50, risk_tolerance=10, investing_potential=100,
+                            liquidity_ratio=0, debt_to_income_ratio=0, investment_horizon_score=10))
+    db.commit()
+    username = user.username
+  token = generate_jwt_token(username, middleware.JWT_SECRET_KEY, middleware.JWT_ALGORITHM)
+
+  for path in ("/questions/", "/portfolio/"):
+    results = {mode: asyncio.run(measure(build_app(mode, username), path, token, requests))
+               for mode in ("none", "legacy", "asgi")}
+    baseline = results["none"]
+    for mode, seconds in results.items():
+      print(f"{path:<12} {mode:>6}: {seconds * 1e6:8.1f} us/request, "
+            f"overhead {(seconds - baseline) * 1e6:8.1f} us")
+
+if __name__ == "__main__":
+  main(*(int(arg) for arg in sys.argv[1:]))
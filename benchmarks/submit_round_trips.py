@@ -0,0 +1,65 @@
+# Round trips and wall time per /questions/submit call.
+#
+#   python -m benchmarks.submit_round_trips [submissions]
+#
+# "legacy" replays the old per-item pattern (one SELECT and one COMMIT per answer) for
+# comparison with the current route.
+from benchmarks.common import RoundTripCounter, reset_database, seed_questionnaire, seed_user, random_submission, session
+from models import Questions, User, InvestorResponse, FinancialMetrics
+from routers.questions import submit_questionnaire, SubmitQuestionnaireRequest
+from scoring import get_scoring_engine
+from types import SimpleNamespace
+
+import random
+import sys
+import time
+import uuid
+
+def legacy_submit(request, payload, db, user_id):
+  user = db.query(User).filter(User.username == request.state.username).first()
+  for item in payload:
+    question_id = uuid.UUID(item.question_id)
+    db.query(Questions).filter(Questions.id == question_id).first()
+    db.add(InvestorResponse(user_id=user.id, question_id=question_id, response=item.submitted_response))
+    db.commit()
+  _, metrics = get_scoring_engine(db).score([(item.question_id, item.submitted_response) for item in payload])
+  db.add(FinancialMetrics(user_id=user.id, **metrics))
+  db.commit()
+
+def run(label, submit, submissions, questions, user):
+  rnd = random.Random(42)
+  request = SimpleNamespace(state=SimpleNamespace(username=user.username))
+  payloads = [
+    [SubmitQuestionnaireRequest(**item) for item in random_submission(questions, rnd)]
+    for _ in range(submissions)
+  ]
+  with RoundTripCounter() as counter:
+    start = time.perf_counter()
+    for payload in payloads:
+      db = session()
+      try:
+        # Called directly, so the current_user_id dependency is passed by hand
+        submit(request, payload, db, user_id=user.id)
+      finally:
+        db.close()
+    elapsed = time.perf_counter() - start
+
+  print(f"{label:>8}: {counter.statements / submissions:6.1f} statements, "
+        f"{counter.transactions / submissions:5.1f} transactions, "
+        f"{counter.round_trips / submissions:6.1f} round trips, "
+        f"{elapsed / submissions * 1000:7.2f} ms per submission")
+
+def main(submissions=200):
+  reset_database()
+  with session() as db:
+    questions = seed_questionnaire(db)
+    user = seed_user(db)
+    get_scoring_engine(db)
+    db.expunge_all()
+
+  print(f"{len(questions)} answers per submission, {submissions} submissions")
+  run("legacy", legacy_submit, submissions, questions, user)
+  run("current", submit_questionnaire, submissions, questions, user)
+
+if __name__ == "__main__":
+  main(*(int(arg) for arg in sys.argv[1:]))
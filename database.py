@@ -3,15 +3,51 @@ from dotenv import load_dotenv
 from sqlalchemy import create_engine  # Used to create the database engine instance
 from sqlalchemy.ext.declarative import declarative_base  # Used to create declarative base class for models
 from sqlalchemy.orm import sessionmaker  # Factory to create database sessions
+from fastapi import Request
+from db_pool import (
+  DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+  InstrumentedQueuePool, pool_monitor,
+)
+from db_routing import SQLALCHEMY_REPLICA_URLS, LAST_WRITE_COOKIE, ReplicaRouter, wrote_recently
+from query_stats import instrument
 
 load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("SQLALCHEMY_DATABASE_URL")
 
 # Create SQLAlchemy engine
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(
+  SQLALCHEMY_DATABASE_URL,
+  poolclass=InstrumentedQueuePool,
+  pool_size=DB_POOL_SIZE,
+  max_overflow=DB_MAX_OVERFLOW,
+  pool_timeout=DB_POOL_TIMEOUT,
+  pool_recycle=DB_POOL_RECYCLE,
+  pool_pre_ping=DB_POOL_PRE_PING,
+)
 # The engine is the starting point for any SQLAlchemy application
 # It maintains the pool of database connections and provides the interface to your database
+# Pool settings come from the DB_POOL_* variables (see db_pool.py)
+pool_monitor.attach(engine)
+# Per-request statement counts and DB time (see query_stats.py)
+instrument(engine)
+
+# Read replicas get the same pool settings on a plain QueuePool; db_pool's monitor and
+# /internal/pool cover the primary only
+replica_engines = [
+  create_engine(
+    url,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+  )
+  for url in SQLALCHEMY_REPLICA_URLS
+]
+for replica_engine in replica_engines:
+  instrument(replica_engine)
+replica_router = ReplicaRouter(engine, replica_engines)
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -33,4 +69,15 @@ def get_db():
     # This makes the session available for dependency injection in FastAPI
   finally:
     db.close()  # Ensure the session is closed after use
-    # This is important for cleaning up resources and preventing memory leaks
\ No newline at end of file
+    # This is important for cleaning up resources and preventing memory leaks
+
+# Dependency for routes that only read: the session is bound to a replica (see
+# db_routing.py), or to the primary when no replica is configured or this client wrote
+# within the last DB_READ_YOUR_WRITES_SECONDS. Anything that writes, or must see a write
+# made earlier in the same flow, uses get_db.
+def get_read_db(request: Request):
+  db = SessionLocal(bind=replica_router.choose(wrote_recently(request.cookies.get(LAST_WRITE_COOKIE))))
+  try:
+    yield db
+  finally:
+    db.close()
@@ -0,0 +1,137 @@
+from contextvars import ContextVar
+from typing import Dict, Optional
+from dotenv import load_dotenv
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+import os
+import threading
+import time
+
+load_dotenv()
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Seconds after which a connection is replaced on checkout (-1 disables)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Connections opened by warm_pool() at startup
+DB_POOL_WARM = int(os.getenv("DB_POOL_WARM", str(DB_POOL_SIZE)))
+
+class PoolUsage:
+  # Checkout wait and hold time of the connections used while serving one request.
+  __slots__ = ("checkouts", "wait_seconds", "hold_seconds")
+
+  def __init__(self):
+    self.checkouts = 0
+    self.wait_seconds = 0.0
+    self.hold_seconds = 0.0
+
+  def server_timing(self) -> str:
+    return f"db-wait;dur={self.wait_seconds * 1000:.2f}, db-hold;dur={self.hold_seconds * 1000:.2f}"
+
+# Set per request by the middleware; sync routes and dependencies run on threadpool copies
+# of the context, which still point at the same PoolUsage object.
+request_pool_usage: ContextVar[Optional[PoolUsage]] = ContextVar("request_pool_usage", default=None)
+
+class PoolMonitor:
+  # Process-wide checkout counters for the engine's pool. Wait time is measured around
+  # the pool's own checkout (InstrumentedQueuePool), hold time from checkout to checkin.
+
+  def __init__(self):
+    self.engine = None
+    self._lock = threading.Lock()
+    self.checkouts = 0
+    self.checkins = 0
+    self.timeouts = 0
+    self.peak_checked_out = 0
+    self.total_wait_seconds = 0.0
+    self.max_wait_seconds = 0.0
+    self.total_hold_seconds = 0.0
+    self.max_hold_seconds = 0.0
+
+  def attach(self, engine):
+    # Listening on the engine keeps the hooks on the new pool after engine.dispose()
+    self.engine = engine
+    event.listen(engine, "checkout", self._on_checkout)
+    event.listen(engine, "checkin", self._on_checkin)
+
+  def record_wait(self, seconds: float, timed_out: bool = False):
+    with self._lock:
+      if timed_out:
+        self.timeouts += 1
+      self.total_wait_seconds += seconds
+      self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+    usage = request_pool_usage.get()
+    if usage is not None:
+      usage.wait_seconds += seconds
+
+  def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+    connection_record.info["checked_out_at"] = time.perf_counter()
+    checked_out = self.engine.pool.checkedout()
+    with self._lock:
+      self.checkouts += 1
+      self.peak_checked_out = max(self.peak_checked_out, checked_out)
+    usage = request_pool_usage.get()
+    if usage is not None:
+      usage.checkouts += 1
+
+  def _on_checkin(self, dbapi_connection, connection_record):
+    checked_out_at = connection_record.info.pop("checked_out_at", None)
+    if checked_out_at is None:
+      return
+    held = time.perf_counter() - checked_out_at
+    with self._lock:
+      self.checkins += 1
+      self.total_hold_seconds += held
+      self.max_hold_seconds = max(self.max_hold_seconds, held)
+    usage = request_pool_usage.get()
+    if usage is not None:
+      usage.hold_seconds += held
+
+  def stats(self) -> Dict[str, float]:
+    pool = self.engine.pool if self.engine is not None else None
+    with self._lock:
+      checkouts, checkins = self.checkouts, self.checkins
+      return {
+        "size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checked_out": pool.checkedout() if pool is not None else 0,
+        "checked_in": pool.checkedin() if pool is not None else 0,
+        # QueuePool.overflow() counts down from -size until the pool is full
+        "overflow": max(pool.overflow(), 0) if pool is not None else 0,
+        "peak_checked_out": self.peak_checked_out,
+        "checkouts": checkouts,
+        "timeouts": self.timeouts,
+        "avg_wait_seconds": self.total_wait_seconds / checkouts if checkouts else 0.0,
+        "max_wait_seconds": self.max_wait_seconds,
+        "avg_hold_seconds": self.total_hold_seconds / checkins if checkins else 0.0,
+        "max_hold_seconds": self.max_hold_seconds,
+      }
+
+pool_monitor = PoolMonitor()
+
+class InstrumentedQueuePool(QueuePool):
+  # QueuePool that reports how long each checkout waited for a free connection.
+
+  def _do_get(self):
+    start_time = time.perf_counter()
+    try:
+      connection = super()._do_get()
+    except exc.TimeoutError:
+      pool_monitor.record_wait(time.perf_counter() - start_time, timed_out=True)
+      raise
+    pool_monitor.record_wait(time.perf_counter() - start_time)
+    return connection
+
+def warm_pool(engine, count: int = DB_POOL_WARM):
+  # Opens `count` connections up front (capped at the pool size) and returns them to the
+  # pool, so the first requests after startup don't pay for connection setup.
+  connections = []
+  try:
+    for _ in range(min(count, DB_POOL_SIZE)):
+      connections.append(engine.connect())
+  finally:
+    for connection in connections:
+      connection.close()
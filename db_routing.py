@@ -0,0 +1,78 @@
+from itertools import count
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+import os
+import threading
+import time
+
+load_dotenv()
+
+# Comma-separated read replica URLs. Without any, read-only sessions use the primary too.
+SQLALCHEMY_REPLICA_URLS = [url.strip() for url in os.getenv("SQLALCHEMY_REPLICA_URLS", "").split(",") if url.strip()]
+# round_robin, or least_loaded (fewest checked-out connections, ties in turn)
+DB_REPLICA_STRATEGY = os.getenv("DB_REPLICA_STRATEGY", "round_robin")
+# After a successful write request, the client's reads stay on the primary for this many
+# seconds, so they see their own writes despite replication lag
+DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+
+# Set by the middleware on write responses when replicas are configured; holds the time
+# of the write (epoch seconds). A cookie rather than server state, so it holds across
+# worker processes.
+LAST_WRITE_COOKIE = "db_last_write"
+REPLICA_STRATEGIES = ("round_robin", "least_loaded")
+
+def wrote_recently(last_write: Optional[str], window: float = DB_READ_YOUR_WRITES_SECONDS) -> bool:
+  if not last_write:
+    return False
+  try:
+    return time.time() - float(last_write) < window
+  except ValueError:
+    return False
+
+class ReplicaRouter:
+  # Picks the engine behind each read-only session: a replica, or the primary when there
+  # are none or the client has just written.
+
+  def __init__(self, primary, replicas: List, strategy: str = DB_REPLICA_STRATEGY):
+    if strategy not in REPLICA_STRATEGIES:
+      raise ValueError(f"DB_REPLICA_STRATEGY must be one of {', '.join(REPLICA_STRATEGIES)}, got {strategy!r}")
+    self.primary = primary
+    self.replicas = replicas
+    self.strategy = strategy
+    self._turn = count()
+    self._lock = threading.Lock()
+    self.replica_sessions = [0] * len(replicas)
+    self.primary_reads = 0
+    self.pinned_reads = 0
+
+  def choose(self, recent_write: bool = False):
+    if not self.replicas or recent_write:
+      with self._lock:
+        self.primary_reads += 1
+        self.pinned_reads += recent_write
+      return self.primary
+    turn = next(self._turn)
+    if self.strategy == "least_loaded":
+      # checkedout() is a plain read of the pool's counters; good enough to spread load
+      loads = [replica.pool.checkedout() for replica in self.replicas]
+      lowest = min(loads)
+      candidates = [index for index, load in enumerate(loads) if load == lowest]
+      index = candidates[turn % len(candidates)]
+    else:
+      index = turn % len(self.replicas)
+    with self._lock:
+      self.replica_sessions[index] += 1
+    return self.replicas[index]
+
+  def stats(self) -> Dict[str, float]:
+    with self._lock:
+      stats = {
+        "replicas": len(self.replicas),
+        "primary_reads": self.primary_reads,
+        "pinned_reads": self.pinned_reads,
+      }
+      for index, replica in enumerate(self.replicas):
+        stats[f"replica{index}_sessions"] = self.replica_sessions[index]
+        stats[f"replica{index}_checked_out"] = replica.pool.checkedout()
+      return stats
@@ -0,0 +1,106 @@
+from datetime import date, datetime
+from typing import Iterable, Iterator, Optional, Sequence
+from dotenv import load_dotenv
+from sqlalchemy import select
+from database import engine
+from models import InvestorResponse, FinancialMetrics, PortfolioRecommendation
+
+import csv
+import io
+import json
+import os
+import uuid
+
+load_dotenv()
+
+# Rows fetched per round trip from the server-side cursor, and encoded per output chunk
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+
+# Exported history tables and their columns, in output order
+EXPORTS = {
+  "responses": (InvestorResponse, ("id", "user_id", "question_id", "response", "created_at")),
+  "metrics": (FinancialMetrics, (
+    "id", "user_id", "risk_capacity", "risk_tolerance", "investing_potential", "liquidity_ratio",
+    "debt_to_income_ratio", "investment_horizon_score", "created_at",
+  )),
+  "recommendations": (PortfolioRecommendation, (
+    "id", "user_id", "financial_metrics_id", "portfolio_type", "equity_allocation",
+    "fixed_income_allocation", "created_at", "updated_at",
+  )),
+}
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# ---------------------------
+# Queries
+# ---------------------------
+# Keyset pagination on the primary key: rows come back in id order and the next page
+# starts after the last id seen, so no page costs more than its own rows.
+def export_query(kind: str, user_id: Optional[uuid.UUID] = None, after_id: Optional[int] = None, limit: Optional[int] = None):
+  model, columns = EXPORTS[kind]
+  statement = select(*(getattr(model, column) for column in columns))
+  if user_id is not None:
+    statement = statement.where(model.user_id == user_id)
+  if after_id is not None:
+    statement = statement.where(model.id > after_id)
+  statement = statement.order_by(model.id)
+  if limit is not None:
+    statement = statement.limit(limit)
+  return statement
+
+def next_page_after(db, kind: str, user_id: uuid.UUID, after_id: Optional[int], limit: int) -> Optional[int]:
+  # Cursor for the page after this one: the id of this page's last row if more rows
+  # follow, otherwise None. Index-only, so the body can be streamed with the header known.
+  model, _ = EXPORTS[kind]
+  statement = select(model.id).where(model.user_id == user_id)
+  if after_id is not None:
+    statement = statement.where(model.id > after_id)
+  ids = db.execute(statement.order_by(model.id).offset(limit - 1).limit(2)).scalars().all()
+  return ids[0] if len(ids) == 2 else None
+
+def stream_rows(statement, chunk_size: int = EXPORT_CHUNK_SIZE, bind=None) -> Iterator[Sequence]:
+  # Yields lists of rows from a server-side cursor (yield_per), holding one connection
+  # of `bind` (default: the primary) for the duration. Meant to run inside a
+  # StreamingResponse, i.e. after the request's session has been closed.
+  with (bind or engine).connect() as connection:
+    result = connection.execution_options(yield_per=chunk_size).execute(statement)
+    for partition in result.partitions():
+      yield partition
+
+# ---------------------------
+# Encoding
+# ---------------------------
+def _json_default(value):
+  if isinstance(value, (datetime, date)):
+    return value.isoformat()
+  if isinstance(value, uuid.UUID):
+    return str(value)
+  raise TypeError(f"Cannot encode {type(value).__name__}")
+
+def _csv_value(value):
+  if isinstance(value, (datetime, date)):
+    return value.isoformat()
+  return value
+
+def encode_ndjson(columns: Sequence[str], partitions: Iterable[Sequence]) -> Iterator[bytes]:
+  for rows in partitions:
+    yield "".join(
+      json.dumps(dict(zip(columns, row)), default=_json_default, separators=(",", ":")) + "\n" for row in rows
+    ).encode("utf-8")
+
+def encode_csv(columns: Sequence[str], partitions: Iterable[Sequence]) -> Iterator[bytes]:
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  writer.writerow(columns)
+  for rows in partitions:
+    writer.writerows([_csv_value(value) for value in row] for row in rows)
+    yield buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate()
+  if buffer.tell():
+    yield buffer.getvalue().encode("utf-8")
+
+def export_stream(kind: str, output_format: str, statement, chunk_size: int = EXPORT_CHUNK_SIZE, bind=None) -> Iterator[bytes]:
+  _, columns = EXPORTS[kind]
+  encode = encode_csv if output_format == "csv" else encode_ndjson
+  return encode(columns, stream_rows(statement, chunk_size, bind))
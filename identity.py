@@ -0,0 +1,85 @@
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import Dict, Optional, Tuple
+from dotenv import load_dotenv
+from database import engine, get_read_db, SessionLocal
+from models import User
+
+import os
+import threading
+import time
+import uuid
+
+load_dotenv()
+
+IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "300"))
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+
+class IdentityCache:
+  # username -> user id, each entry kept for `ttl` seconds. Every protected request goes
+  # through it, so each active user costs one users query per `ttl`: the price of
+  # noticing deleted accounts, which the signed user_id claim alone can't tell.
+
+  def __init__(self, ttl: float = IDENTITY_CACHE_TTL, maxsize: int = IDENTITY_CACHE_SIZE):
+    self.ttl = ttl
+    self.maxsize = maxsize
+    self._entries: Dict[str, Tuple[uuid.UUID, float]] = {}
+    self._lock = threading.Lock()
+
+  def get(self, username: str) -> Optional[uuid.UUID]:
+    with self._lock:
+      entry = self._entries.get(username)
+      if entry is None:
+        return None
+      if entry[1] <= time.monotonic():
+        del self._entries[username]
+        return None
+      return entry[0]
+
+  def put(self, username: str, user_id: uuid.UUID):
+    with self._lock:
+      if len(self._entries) >= self.maxsize:
+        now = time.monotonic()
+        self._entries = {key: entry for key, entry in self._entries.items() if entry[1] > now}
+        if len(self._entries) >= self.maxsize:
+          self._entries.pop(next(iter(self._entries)))
+      self._entries[username] = (user_id, time.monotonic() + self.ttl)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+identity_cache = IdentityCache()
+
+def lookup_user_id(db: Session, username: str) -> Optional[uuid.UUID]:
+  return db.execute(select(User.id).where(User.username == username)).scalar()
+
+def current_user_id(request: Request, db: Session = Depends(get_read_db)) -> uuid.UUID:
+  # Dependency for protected routes: the user id for the token's username (cached, or read
+  # from a replica) without loading the whole User row. Tokens that carry a user id are
+  # checked against it too, so the account must still exist: a deleted user gets a 401
+  # (at most IDENTITY_CACHE_TTL seconds later) rather than a foreign key error on write.
+  username = request.state.username
+  user_id = identity_cache.get(username)
+  if user_id is None:
+    user_id = lookup_user_id(db, username)
+    if user_id is None and db.get_bind() is not engine:
+      # Read from a replica: the account may be too new to be replicated yet
+      with SessionLocal() as primary_db:
+        user_id = lookup_user_id(primary_db, username)
+    if user_id is None:
+      raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid username or password."
+      )
+    identity_cache.put(username, user_id)
+
+  token_user_id = getattr(request.state, "user_id", None)
+  if token_user_id and uuid.UUID(token_user_id) != user_id:
+    # The account was deleted and its username taken again
+    raise HTTPException(
+      status_code=status.HTTP_401_UNAUTHORIZED,
+      detail="Invalid username or password."
+    )
+  return user_id
@@ -0,0 +1,40 @@
+# Streams a history table to a file or stdout as NDJSON or CSV, with flat memory use:
+#
+#   python -m jobs.export_history {responses,metrics,recommendations}
+#       [--format ndjson|csv] [--user-id UUID] [--after ID] [--output FILE]
+#
+# Rows are read in id order from a server-side cursor (see export.py); --after resumes an
+# interrupted export from the last id written.
+from export import EXPORTS, FORMATS, EXPORT_CHUNK_SIZE, export_query, export_stream
+
+import argparse
+import sys
+import time
+import uuid
+
+def main():
+  parser = argparse.ArgumentParser(description="Export response, metrics or recommendation history.")
+  parser.add_argument("kind", choices=sorted(EXPORTS))
+  parser.add_argument("--format", dest="output_format", choices=sorted(FORMATS), default="ndjson")
+  parser.add_argument("--user-id", type=uuid.UUID, help="only this user's rows")
+  parser.add_argument("--after", type=int, help="only rows with a greater id")
+  parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE, help="rows per cursor fetch")
+  parser.add_argument("--output", help="file to write (default stdout)")
+  args = parser.parse_args()
+
+  statement = export_query(args.kind, args.user_id, args.after)
+  output = open(args.output, "wb") if args.output else sys.stdout.buffer
+  written = 0
+  start = time.perf_counter()
+  try:
+    for chunk in export_stream(args.kind, args.output_format, statement, args.chunk_size):
+      output.write(chunk)
+      written += len(chunk)
+  finally:
+    if args.output:
+      output.close()
+  elapsed = time.perf_counter() - start
+  print(f"exported {written} bytes in {elapsed:.1f}s", file=sys.stderr)
+
+if __name__ == "__main__":
+  main()
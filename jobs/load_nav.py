@@ -0,0 +1,45 @@
+# Loads fund NAV / index price history from CSV into the memory-mapped store (nav_store.py):
+#
+#   python -m jobs.load_nav FILE [FILE ...] [--symbol SYMBOL] [--kind fund|index]
+#                           [--name NAME] [--store DIR]
+#
+# Each file has a date column and a value column (value, nav, close or price). Files with
+# a symbol column may hold any number of instruments; otherwise the rows belong to
+# --symbol, or to the file name without its extension. Only rows dated after an
+# instrument's last stored date are appended, so re-running with a longer file is safe.
+from nav_store import NAV_STORE_PATH, INSTRUMENT_KINDS, NavStore, load_csv
+
+import argparse
+import os
+import sys
+import time
+
+def main():
+  parser = argparse.ArgumentParser(description="Load NAV / price history CSV files into the NAV store.")
+  parser.add_argument("files", nargs="+")
+  parser.add_argument("--symbol", help="instrument of files without a symbol column (default: file name)")
+  parser.add_argument("--kind", choices=INSTRUMENT_KINDS, default="fund")
+  parser.add_argument("--name", help="display name (default: the symbol)")
+  parser.add_argument("--store", default=NAV_STORE_PATH, help=f"store directory (default {NAV_STORE_PATH})")
+  args = parser.parse_args()
+
+  store = NavStore(args.store)
+  appended = skipped = instruments = 0
+  start = time.perf_counter()
+  for path in args.files:
+    symbol = args.symbol or os.path.splitext(os.path.basename(path))[0]
+    try:
+      results = load_csv(store, path, symbol, args.kind, args.name)
+    except (OSError, ValueError) as e:
+      print(f"{path}: {e}", file=sys.stderr)
+      continue
+    for added, ignored in results.values():
+      appended += added
+      skipped += ignored
+    instruments += len(results)
+  elapsed = time.perf_counter() - start
+  print(f"appended {appended} rows ({skipped} not after the last stored date) to {instruments} "
+        f"instruments in {elapsed:.1f}s")
+
+if __name__ == "__main__":
+  main()
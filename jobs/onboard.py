@@ -0,0 +1,62 @@
+# Bulk questionnaire submissions for many users from CSV or NDJSON files (onboarding.py),
+# the same as POST /internal/onboarding without going through the API:
+#
+#   python -m jobs.onboard FILE [FILE ...] [--format csv|ndjson] [--batch-users N]
+#                          [--errors FILE]
+#
+# Each row is user_id (or username), question_id and response; a user's rows must be
+# consecutive. Files are read in blocks, so memory use does not grow with their size. The
+# summary goes to stderr and every row error to --errors (NDJSON) or stdout.
+from onboarding import ONBOARDING_BATCH_USERS, ONBOARDING_FORMATS, Onboarding, OnboardingInputError
+
+import argparse
+import json
+import os
+import sys
+
+READ_SIZE = 1 << 20
+
+def main():
+  parser = argparse.ArgumentParser(description="Score and save questionnaire answers for many users.")
+  parser.add_argument("files", nargs="+")
+  parser.add_argument("--format", dest="input_format", choices=ONBOARDING_FORMATS,
+                      help="input format (default: from the file extension, else csv)")
+  parser.add_argument("--batch-users", type=int, default=ONBOARDING_BATCH_USERS, help="users written per transaction")
+  parser.add_argument("--errors", help="file for row errors as NDJSON (default stdout)")
+  args = parser.parse_args()
+
+  errors = open(args.errors, "w") if args.errors else sys.stdout
+  try:
+    for path in args.files:
+      input_format = args.input_format or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+      # Every error is written out, not just the first ONBOARDING_MAX_ERRORS
+      onboarding = Onboarding(input_format, batch_users=args.batch_users, max_errors=sys.maxsize)
+      try:
+        with open(path, "rb") as f:
+          for block in iter(lambda: f.read(READ_SIZE), b""):
+            onboarding.feed(block)
+            write_errors(errors, path, onboarding)
+        summary = onboarding.finish()
+        write_errors(errors, path, onboarding)
+      except (OSError, OnboardingInputError) as e:
+        print(f"{path}: {e}", file=sys.stderr)
+        continue
+      print(
+        f"{os.path.basename(path)}: {summary['rows']} rows, {summary['submissions']} submissions written "
+        f"({summary['rows_written']} rows), {summary['rejected_submissions']} rejected "
+        f"({summary['rejected_rows']} rows, {summary['error_count']} errors) in {summary['seconds']:.1f}s, "
+        f"{summary['rows_per_second']} rows/s",
+        file=sys.stderr
+      )
+  finally:
+    if args.errors:
+      errors.close()
+
+def write_errors(output, path: str, onboarding: Onboarding):
+  # Drains the errors collected so far, so they are not all held until the end
+  for error in onboarding.errors:
+    output.write(json.dumps({"file": path, **error}) + "\n")
+  onboarding.errors.clear()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,141 @@
+# Re-scores every user's latest FinancialMetrics row against the current
+# scoring.FINAL_SCORE_WEIGHTS / PORTFOLIO_BANDS and writes the recommendations that changed.
+# Run it after changing either table:
+#
+#   python -m jobs.rescore_portfolios [--chunk-size N] [--dry-run]
+#
+# Metrics rows are streamed chunk by chunk (server-side cursor on Postgres) and each chunk is
+# scored as columns with numpy, so per-row Python work is limited to reading and writing rows.
+# Recommendations are upserted on financial_metrics_id; rows whose band did not change are
+# not written at all. API workers pick the new bands up once their portfolio cache entries
+# expire (PORTFOLIO_CACHE_TTL).
+from datetime import datetime, timezone
+from sqlalchemy import func, select
+from database import engine
+from models import FinancialMetrics, PortfolioRecommendation
+from queries import upsert_statement
+from scoring import FINAL_SCORE_WEIGHTS, PORTFOLIO_BANDS
+
+import argparse
+import numpy as np
+import time
+
+METRIC_COLUMNS = tuple(FINAL_SCORE_WEIGHTS)
+
+def latest_metrics_query():
+  # Latest metrics row per user (same ordering as queries.latest_id_query) joined to the
+  # recommendation currently stored for it, if any.
+  ranked = select(
+    FinancialMetrics.id,
+    FinancialMetrics.user_id,
+    *(getattr(FinancialMetrics, name) for name in METRIC_COLUMNS),
+    func.row_number().over(
+      partition_by=FinancialMetrics.user_id,
+      order_by=(FinancialMetrics.created_at.desc(), FinancialMetrics.id.desc()),
+    ).label("rn"),
+  ).subquery()
+  recommendation = PortfolioRecommendation.__table__
+  return (
+    select(
+      ranked.c.id,
+      ranked.c.user_id,
+      *(ranked.c[name] for name in METRIC_COLUMNS),
+      recommendation.c.portfolio_type,
+      recommendation.c.equity_allocation,
+      recommendation.c.fixed_income_allocation,
+    )
+    .select_from(ranked.outerjoin(recommendation, recommendation.c.financial_metrics_id == ranked.c.id))
+    .where(ranked.c.rn == 1)
+  )
+
+def score_chunk(metrics: "np.ndarray") -> "np.ndarray":
+  # metrics is (rows, len(METRIC_COLUMNS)); returns the index into PORTFOLIO_BANDS per row.
+  # The score is accumulated column by column in the same order as scoring.final_score so
+  # both give bit-identical results at the band boundaries.
+  scores = np.zeros(len(metrics))
+  for column, weight in enumerate(FINAL_SCORE_WEIGHTS.values()):
+    scores += weight * metrics[:, column]
+  upper_bounds = np.array([band[0] for band in PORTFOLIO_BANDS], dtype=float)
+  # side="right" gives the first band with score < upper_bound, as in select_portfolio
+  bands = np.searchsorted(upper_bounds, scores, side="right")
+  return np.minimum(bands, len(PORTFOLIO_BANDS) - 1)
+
+def rescore(chunk_size: int = 50000, dry_run: bool = False) -> dict:
+  names = np.array([band[1] for band in PORTFOLIO_BANDS], dtype=object)
+  equities = np.array([band[2] for band in PORTFOLIO_BANDS], dtype=float)
+  fixed_incomes = np.array([band[3] for band in PORTFOLIO_BANDS], dtype=float)
+  upsert = upsert_statement(
+    engine.dialect.name, PortfolioRecommendation, [PortfolioRecommendation.financial_metrics_id],
+    ["portfolio_type", "equity_allocation", "fixed_income_allocation", "updated_at"],
+  )
+  width = len(METRIC_COLUMNS)
+  totals = {"rows": 0, "written": 0, "seconds": 0.0}
+  # SQLite cannot commit on another connection while the read cursor is open, so there the
+  # changed rows are held back and written once the scan is done.
+  deferred = [] if engine.dialect.name == "sqlite" else None
+  start = time.perf_counter()
+
+  with engine.connect() as reader:
+    result = reader.execution_options(yield_per=chunk_size).execute(latest_metrics_query())
+    for partition in result.partitions():
+      columns = list(zip(*partition))
+      metrics = np.array(columns[2:2 + width], dtype=float).T
+      bands = score_chunk(metrics)
+
+      current_types = np.array(columns[2 + width], dtype=object)
+      current_equities = np.array(columns[3 + width], dtype=float)
+      current_fixed_incomes = np.array(columns[4 + width], dtype=float)
+      # Missing recommendations come back as NULL/NaN and never compare equal
+      changed = np.flatnonzero(
+        (current_types != names[bands])
+        | (current_equities != equities[bands])
+        | (current_fixed_incomes != fixed_incomes[bands])
+      )
+
+      if len(changed) and not dry_run:
+        now = datetime.now(timezone.utc)
+        metrics_ids, user_ids = columns[0], columns[1]
+        rows = [
+          {
+            "user_id": user_ids[i],
+            "financial_metrics_id": metrics_ids[i],
+            "portfolio_type": names[band],
+            "equity_allocation": float(equities[band]),
+            "fixed_income_allocation": float(fixed_incomes[band]),
+            "created_at": now,
+            "updated_at": now,
+          }
+          for i, band in zip(changed.tolist(), bands[changed].tolist())
+        ]
+        if deferred is not None:
+          deferred.extend(rows)
+        else:
+          with engine.begin() as writer:
+            writer.execute(upsert, rows)
+
+      totals["rows"] += len(partition)
+      totals["written"] += len(changed)
+      elapsed = time.perf_counter() - start
+      print(f"  {totals['rows']:>10} rows  {totals['written']:>10} changed  {totals['rows'] / elapsed:10.0f} rows/s")
+
+  if deferred:
+    with engine.begin() as writer:
+      for offset in range(0, len(deferred), chunk_size):
+        writer.execute(upsert, deferred[offset:offset + chunk_size])
+
+  totals["seconds"] = time.perf_counter() - start
+  return totals
+
+def main():
+  parser = argparse.ArgumentParser(description="Recompute portfolio recommendations for every user's latest metrics.")
+  parser.add_argument("--chunk-size", type=int, default=50000, help="metrics rows fetched and scored per chunk")
+  parser.add_argument("--dry-run", action="store_true", help="report how many recommendations would change without writing")
+  args = parser.parse_args()
+
+  totals = rescore(args.chunk_size, args.dry_run)
+  rate = totals["rows"] / totals["seconds"] if totals["seconds"] else 0.0
+  action = "would change" if args.dry_run else "changed"
+  print(f"rescored {totals['rows']} users in {totals['seconds']:.1f}s ({rate:.0f} rows/s), {totals['written']} recommendations {action}")
+
+if __name__ == "__main__":
+  main()
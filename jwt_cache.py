@@ -0,0 +1,80 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+
+import hashlib
+import os
+import threading
+import time
+
+load_dotenv()
+
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+
+def token_digest(token: str) -> bytes:
+  # Tokens are never kept in memory or in Redis in the clear, only their digest.
+  return hashlib.sha256(token.encode("utf-8")).digest()
+
+class VerifiedTokenCache:
+  # Bounded LRU of tokens whose signature has already been verified, keyed by the token's
+  # SHA-256 digest and holding the decoded claims. An entry is only served while
+  # `exp` is in the future; after that the caller falls back to jwt.decode, which
+  # produces the usual "expired" error. Revocation is still checked by the caller on
+  # every request; revoke() just drops the entry early.
+
+  def __init__(self, maxsize: int = JWT_CACHE_SIZE):
+    self.maxsize = maxsize
+    self._entries: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def get(self, token: str) -> Optional[Dict[str, Any]]:
+    key = token_digest(token)
+    with self._lock:
+      claims = self._entries.get(key)
+      if claims is None:
+        self.misses += 1
+        return None
+      if claims["exp"] <= time.time():
+        del self._entries[key]
+        self.evictions += 1
+        self.misses += 1
+        return None
+      self._entries.move_to_end(key)
+      self.hits += 1
+      return claims
+
+  def put(self, token: str, claims: Dict[str, Any]):
+    # Tokens without a numeric exp are never cached.
+    if self.maxsize <= 0 or not isinstance(claims.get("exp"), (int, float)):
+      return
+    key = token_digest(token)
+    with self._lock:
+      self._entries[key] = claims
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.maxsize:
+        self._entries.popitem(last=False)
+        self.evictions += 1
+
+  def revoke(self, token: str):
+    with self._lock:
+      if self._entries.pop(token_digest(token), None) is not None:
+        self.evictions += 1
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+  def stats(self) -> Dict[str, int]:
+    with self._lock:
+      return {
+        "size": len(self._entries),
+        "maxsize": self.maxsize,
+        "hits": self.hits,
+        "misses": self.misses,
+        "evictions": self.evictions,
+      }
+
+token_cache = VerifiedTokenCache()
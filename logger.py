@@ -1,22 +1,94 @@
 import logging
-from datetime import datetime
+import logging.handlers
+from contextvars import ContextVar
+from dotenv import load_dotenv
+import atexit
 import os
+import queue
+import random
+import re
+
+load_dotenv()
+
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "14"))
+LOG_MAX_BODY_BYTES = int(os.getenv("LOG_MAX_BODY_BYTES", "1024"))
+# Comma separated "<path prefix>=<rate>" pairs, e.g. "/questions=0.1,/portfolio=0.25".
+# INFO and DEBUG records emitted while serving a matching route are kept with that
+# probability; warnings and errors are always kept.
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
 
 # Create logs directory if it doesn't exist
-if not os.path.exists("logs"):
-  os.makedirs("logs")
+if not os.path.exists(LOG_DIR):
+  os.makedirs(LOG_DIR)
 
-# Configure logging
-logging.basicConfig(
-  level=logging.INFO,
-  format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-  handlers=[
-      # File handler for all logs
-      logging.FileHandler(f'logs/app_{datetime.now().strftime("%Y%m%d")}.log'),
-      # Console handler
-      logging.StreamHandler()
-  ]
+# Path of the request being served, set by the middleware
+request_path: ContextVar[str] = ContextVar("request_path", default="")
+
+def parse_sample_rates(spec: str):
+  rates = []
+  for item in filter(None, (part.strip() for part in spec.split(","))):
+    prefix, _, rate = item.partition("=")
+    rates.append((prefix.strip(), float(rate)))
+  # Longest prefix wins
+  return sorted(rates, key=lambda pair: len(pair[0]), reverse=True)
+
+class RouteSampler(logging.Filter):
+  def __init__(self, rates):
+    super().__init__()
+    self.rates = rates
+
+  def filter(self, record):
+    if record.levelno >= logging.WARNING or not self.rates:
+      return True
+    path = request_path.get()
+    for prefix, rate in self.rates:
+      if path.startswith(prefix):
+        return random.random() < rate
+    return True
+
+# ---------------------------
+# Request bodies
+# ---------------------------
+REDACTED_FIELDS = re.compile(r'("(?:[^"]*password[^"]*|[^"]*token[^"]*|secret|email)"\s*:\s*)"(?:[^"\\]|\\.)*"', re.IGNORECASE)
+
+def format_body(body: bytes) -> str:
+  # Redacts credential fields and caps the size of a request body before it is logged.
+  text = body[:LOG_MAX_BODY_BYTES].decode("utf-8", errors="replace")
+  text = REDACTED_FIELDS.sub(r'\1"***"', text)
+  if len(body) > LOG_MAX_BODY_BYTES:
+    text += f"... ({len(body)} bytes)"
+  return text
+
+# ---------------------------
+# Handlers
+# ---------------------------
+# Request code only puts records on an in-memory queue; a background listener thread
+# does the formatting and all file/console I/O.
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+# File handler for all logs, rotated at midnight
+file_handler = logging.handlers.TimedRotatingFileHandler(
+  os.path.join(LOG_DIR, "app.log"), when="midnight", backupCount=LOG_RETENTION_DAYS, encoding="utf-8"
 )
+file_handler.setFormatter(formatter)
+
+# Console handler
+stream_handler = logging.StreamHandler()
+stream_handler.setFormatter(formatter)
+
+log_queue = queue.SimpleQueue()
+queue_handler = logging.handlers.QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter("%(message)s"))
+queue_handler.addFilter(RouteSampler(parse_sample_rates(LOG_SAMPLE_RATES)))
+
+listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)
+
+# Configure logging
+logging.basicConfig(level=LOG_LEVEL, handlers=[queue_handler])
 
 # Create logger
-logger = logging.getLogger(__name__) 
\ No newline at end of file
+logger = logging.getLogger(__name__)
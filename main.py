@@ -4,13 +4,39 @@ from contextlib import asynccontextmanager
 from routers.auth import router as auth_router
 from routers.portfolio import router as portfolio_router
 from routers.questions import router as questions_router
-from middleware import add_process_time_header, validate_request_json, validate_jwt_auth
+from routers.internal import router as internal_router
+from routers.export import router as export_router
+from routers.finance import router as finance_router
+from middleware import RequestMiddleware
 from logger import logger
+from database import SessionLocal, engine
+from db_pool import warm_pool
+from scoring import load_scoring_engine
+from questionnaire_cache import get_questionnaire_snapshot
+from revocation import revocation_store
+from password_pool import password_pool
+from response_writer import response_writer
+from sqlalchemy.exc import SQLAlchemyError
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting up FastAPI application")
+    try:
+        warm_pool(engine)
+        with SessionLocal() as db:
+            load_scoring_engine(db)
+            get_questionnaire_snapshot(db)
+    except SQLAlchemyError as e:
+        # Connections are opened and both caches built lazily on first use instead
+        logger.warning("Could not warm up the database at startup: %s", e)
+    await revocation_store.start()
+    password_pool.start()
+    response_writer.start()
     yield
+    # Queued responses are written before the pool and the engine go away
+    response_writer.shutdown()
+    password_pool.shutdown()
+    await revocation_store.stop()
     logger.info("Shutting down FastAPI application")
 
 app = FastAPI(lifespan=lifespan)
@@ -28,21 +54,14 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
-@app.middleware("http")
-async def add_process_time_header_entrypoint(request, call_next):
-  return await add_process_time_header(request, call_next)
-
-@app.middleware("http")
-async def validate_request_json_entrypoint(request, call_next):
-  return await validate_request_json(request, call_next)
-
-@app.middleware("http")
-async def validate_jwt_auth_entrypoint(request, call_next):
-  return await validate_jwt_auth(request, call_next)
+# Added after CORS so it stays the outermost layer, as the old @app.middleware stack was
+app.add_middleware(RequestMiddleware)
 
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
-# app.include_router(finance_router, prefix="/finance", tags=["finance"])
+app.include_router(finance_router, prefix="/finance", tags=["finance"])
 app.include_router(questions_router, prefix="/questions", tags=["questions"])
 app.include_router(portfolio_router, prefix="/portfolio", tags=["portfolio"])
+app.include_router(export_router, prefix="/export", tags=["export"])
+app.include_router(internal_router, prefix="/internal", tags=["internal"])
 
 
@@ -0,0 +1,114 @@
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+# Request metrics rendered in the Prometheus text exposition format (GET /internal/metrics).
+# Everything here is recorded from the middleware, i.e. on the event loop thread only, so
+# plain dict/list updates are enough; there are no locks on the request path.
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implicit
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Route label for requests answered without reaching a route (unknown paths, requests
+# rejected by the auth middleware), so arbitrary paths can't create unbounded series
+UNMATCHED_ROUTE = "unmatched"
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class Histogram:
+  __slots__ = ("counts", "sum", "count")
+
+  def __init__(self):
+    # One slot per bucket plus +Inf; cumulated when rendered
+    self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+    self.sum = 0.0
+    self.count = 0
+
+  def observe(self, seconds: float):
+    self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+    self.sum += seconds
+    self.count += 1
+
+class RequestMetrics:
+  def __init__(self):
+    self.in_flight = 0
+    self.latency: Dict[Tuple[str, str], Histogram] = defaultdict(Histogram)
+    self.responses: Dict[Tuple[str, str, int], int] = defaultdict(int)
+    self.auth_failures: Dict[str, int] = defaultdict(int)
+    # (method, route) -> [statements, db seconds, N+1 requests, over-budget requests]
+    self.queries: Dict[Tuple[str, str], List[float]] = defaultdict(lambda: [0, 0.0, 0, 0])
+
+  def observe(self, method: str, route: str, status: int, seconds: float):
+    self.latency[(method, route)].observe(seconds)
+    self.responses[(method, route, status)] += 1
+
+  def observe_queries(self, method: str, route: str, statements: int, seconds: float, repeated: int, over_budget: bool):
+    totals = self.queries[(method, route)]
+    totals[0] += statements
+    totals[1] += seconds
+    totals[2] += repeated > 0
+    totals[3] += over_budget
+
+  def auth_failure(self, reason: str):
+    # reason: missing, expired, invalid or revoked
+    self.auth_failures[reason] += 1
+
+  def render(self) -> List[str]:
+    lines = [
+      "# HELP http_requests_in_flight Requests currently being served.",
+      "# TYPE http_requests_in_flight gauge",
+      f"http_requests_in_flight {self.in_flight}",
+      "# HELP http_request_duration_seconds Request latency by route template.",
+      "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route), histogram in sorted(self.latency.items()):
+      labels = f'method="{method}",route="{escape(route)}"'
+      cumulative = 0
+      for upper_bound, count in zip(LATENCY_BUCKETS + (float("inf"),), histogram.counts):
+        cumulative += count
+        le = "+Inf" if upper_bound == float("inf") else repr(upper_bound)
+        lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+      lines.append(f"http_request_duration_seconds_sum{{{labels}}} {histogram.sum!r}")
+      lines.append(f"http_request_duration_seconds_count{{{labels}}} {histogram.count}")
+
+    lines += [
+      "# HELP http_responses_total Responses by route template and status code.",
+      "# TYPE http_responses_total counter",
+    ]
+    for (method, route, status), count in sorted(self.responses.items()):
+      lines.append(f'http_responses_total{{method="{method}",route="{escape(route)}",status="{status}"}} {count}')
+
+    query_series = (
+      ("db_statements_total", "counter", "SQL statements issued by route template."),
+      ("db_seconds_total", "counter", "Time spent executing SQL by route template."),
+      ("db_repeated_statement_requests_total", "counter", "Requests that repeated a statement shape (likely N+1)."),
+      ("db_query_budget_exceeded_total", "counter", "Requests over their query_stats.QUERY_BUDGETS entry."),
+    )
+    for index, (name, kind, help_text) in enumerate(query_series):
+      lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+      for (method, route), totals in sorted(self.queries.items()):
+        lines.append(f'{name}{{method="{method}",route="{escape(route)}"}} {totals[index]!r}')
+
+    lines += [
+      "# HELP auth_failures_total Rejected JWTs by reason.",
+      "# TYPE auth_failures_total counter",
+    ]
+    for reason, count in sorted(self.auth_failures.items()):
+      lines.append(f'auth_failures_total{{reason="{reason}"}} {count}')
+    return lines
+
+request_metrics = RequestMetrics()
+
+def escape(value: str) -> str:
+  return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_stats(prefix: str, stats: Dict[str, float], help_text: str) -> List[str]:
+  # Exposes a component's stats() dict as gauges named <prefix>_<key>
+  lines = []
+  for key, value in stats.items():
+    name = f"{prefix}_{key}"
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {float(value)!r}"]
+  return lines
+
+def render(sections: Iterable[List[str]]) -> str:
+  return "\n".join(line for section in sections for line in section) + "\n"
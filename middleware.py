@@ -1,96 +1,196 @@
-from fastapi import Request
 from dotenv import load_dotenv
 from fastapi.responses import JSONResponse
-from logger import logger
+from starlette.datastructures import MutableHeaders
+from starlette.requests import cookie_parser
+from logger import logger, request_path, format_body
+from jwt_cache import token_cache
+from revocation import revocation_store
+from db_pool import PoolUsage, request_pool_usage
+from metrics import request_metrics, UNMATCHED_ROUTE
+from query_stats import RequestQueries, request_queries, finish_request
+from db_routing import SQLALCHEMY_REPLICA_URLS, DB_READ_YOUR_WRITES_SECONDS, LAST_WRITE_COOKIE
 
+import logging
+import math
 import time
 import os
 import jwt
 import json
-import redis 
 
 load_dotenv()
 
-r = redis.Redis(host="localhost", port=6379, db=0)
-
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM")
+COOKIE_NAME = "jwt_token"
+
+# Only these methods carry a body worth validating; everything else is passed through
+# without touching `receive`.
+BODY_METHODS = {"POST", "PUT", "PATCH"}
+
+class RequestMiddleware:
+  # Single pure ASGI middleware doing, in one pass: request logging, JWT auth, JSON body
+  # validation, the X-Process-Time / Server-Timing (pool checkout wait and hold) headers,
+  # the read-your-writes cookie and the per-route request metrics.
+
+  def __init__(self, app):
+    self.app = app
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] != "http":
+      return await self.app(scope, receive, send)
+
+    start_time = time.perf_counter()
+    pool_usage = PoolUsage()
+    queries = RequestQueries()
+    # Unhandled exceptions propagate through here and become a 500
+    status_code = 500
+
+    async def send_with_process_time(message):
+      nonlocal status_code
+      if message["type"] == "http.response.start":
+        status_code = message["status"]
+        headers = MutableHeaders(scope=message)
+        headers["X-Process-Time"] = str(time.perf_counter() - start_time)
+        # Session teardown (get_db) has already run by now, so hold time is complete
+        if pool_usage.checkouts:
+          headers["Server-Timing"] = f"{pool_usage.server_timing()}, {queries.server_timing()}"
+        # The request wrote to the primary: keep this client's next reads there too
+        # (database.get_read_db)
+        if SQLALCHEMY_REPLICA_URLS and queries.writes and status_code < 400:
+          headers.append("set-cookie", last_write_cookie())
+      await send(message)
 
-async def add_process_time_header(request: Request, call_next):
-  start_time = time.time()
-  
-  response = await call_next(request)
-  
-  process_time = time.time() - start_time
-  response.headers["X-Process-Time"] = str(process_time)
-  
-  return response
-
-async def validate_request_json(request: Request, call_next):
-  try:
-    if request.headers.get('Content-Type') == 'application/json':
+    path = scope["path"]
+    method = scope["method"]
+    path_token = request_path.set(path)
+    usage_token = request_pool_usage.set(pool_usage)
+    queries_token = request_queries.set(queries)
+    request_metrics.in_flight += 1
+    try:
+      await self.handle(scope, receive, send_with_process_time, path, method)
+    finally:
+      request_metrics.in_flight -= 1
+      # The router stores the matched route in the scope; labels use its template
+      route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+      request_metrics.observe(method, route, status_code, time.perf_counter() - start_time)
+      repeated, over_budget = finish_request(method, route, queries)
+      request_metrics.observe_queries(method, route, queries.statements, queries.seconds, repeated, over_budget)
+      request_queries.reset(queries_token)
+      request_pool_usage.reset(usage_token)
+      request_path.reset(path_token)
+
+  async def handle(self, scope, receive, send, path, method):
+    logger.info("Incoming request method: %s, path: %s", method, path)
+
+    if requires_jwt(path):
+      error = await authenticate(scope)
+      if error is not None:
+        return await error(scope, receive, send)
+    else:
+      logger.debug("Skipping auth for %s", path)
+
+    if method in BODY_METHODS and is_json(scope):
+      body = await read_body(receive)
+      if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Request body: %s", format_body(body))
       try:
-        await request.json()
-      except json.JSONDecodeError:
-        return JSONResponse(
-          status_code=400,
-          content={"message": "Invalid JSON format"}
-        )
-    
-    response = await call_next(request)
-    return response
-      
-  except RuntimeError as e:
-    if "Body has already been consumed" in str(e):
-      return JSONResponse(
-        status_code=400,
-        content={"message": "Request body has already been consumed"}
-      )
-    raise
+        json.loads(body)
+      except (json.JSONDecodeError, UnicodeDecodeError):
+        response = JSONResponse(status_code=400, content={"message": "Invalid JSON format"})
+        return await response(scope, receive, send)
+      receive = replay_body(body, receive)
 
-async def validate_jwt_auth(request: Request, call_next):
+    await self.app(scope, receive, send)
 
-  path = request.url.path
-  # headers = request.headers
-  
-  # logger.info(f"Incoming request to: {path}")
-  body = await request.body()  # Read the request body
-  logger.info(f"Incoming request method: {request.method}, URL: {request.url}, Body: {body.decode('utf-8')}")
-  # logger.info(f"Incoming request is:  {type(request)}")
+# ---------------------------
+# Helper Functions
+# ---------------------------
+def requires_jwt(path: str) -> bool:
+  # /auth routes are public apart from signout; /internal routes check their own token
+  # (routers/internal.py)
+  if path.startswith("/internal"):
+    return False
+  return not path.startswith("/auth") or path.startswith("/auth/signout")
 
-  if path.startswith("/auth") and not(path.startswith("/auth/signout")):
-    logger.debug("Skipping auth for /auth endpoints")
-    return (await call_next(request))
-  else:
-    token = request.cookies.get("jwt_token")
+def last_write_cookie() -> str:
+  max_age = math.ceil(DB_READ_YOUR_WRITES_SECONDS)
+  return f"{LAST_WRITE_COOKIE}={time.time():.3f}; Max-Age={max_age}; Path=/; HttpOnly; SameSite=lax"
 
-    if not token:
-      return JSONResponse(
-            content={"message": "Token not found!"},
-            status_code=401
-        )
-    # token = headers.get("Authorization").replace("Bearer ", "")
-    if r.exists(token):
-      return JSONResponse(
-        content={"message": "User signed out!"},
-        status_code=401
+def get_header(scope, name: bytes):
+  for key, value in scope["headers"]:
+    if key == name:
+      return value.decode("latin-1")
+  return None
+
+def is_json(scope) -> bool:
+  content_type = get_header(scope, b"content-type")
+  return content_type is not None and content_type.split(";")[0].strip() == "application/json"
+
+async def read_body(receive) -> bytes:
+  chunks = []
+  more_body = True
+  while more_body:
+    message = await receive()
+    chunks.append(message.get("body", b""))
+    more_body = message.get("more_body", False)
+  return b"".join(chunks)
+
+def replay_body(body: bytes, receive):
+  sent = False
+
+  async def receive_replayed():
+    nonlocal sent
+    if not sent:
+      sent = True
+      return {"type": "http.request", "body": body, "more_body": False}
+    return await receive()
+
+  return receive_replayed
+
+async def authenticate(scope):
+  # Returns an error response, or None after storing the username and user id on request.state.
+  path = scope["path"]
+  cookie_header = get_header(scope, b"cookie")
+  token = cookie_parser(cookie_header).get(COOKIE_NAME) if cookie_header else None
+
+  if not token:
+    request_metrics.auth_failure("missing")
+    return JSONResponse(
+          content={"message": "Token not found!"},
+          status_code=401
       )
+  # token = headers.get("Authorization").replace("Bearer ", "")
+  if await revocation_store.is_revoked(token):
+    request_metrics.auth_failure("revoked")
+    return JSONResponse(
+      content={"message": "User signed out!"},
+      status_code=401
+    )
+  # Tokens verified earlier are served from the cache until their exp; tampered tokens
+  # hash differently and expired ones drop out, so both still reach jwt.decode below.
+  decoded = token_cache.get(token)
+  if decoded is None:
     try:
       decoded = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-
-      request.state.username = decoded.get('username')
-      logger.info(f"Successfully decoded JWT for user: {decoded.get('username')}")
-      
-      return (await call_next(request))
     except jwt.ExpiredSignatureError:
-      logger.warning(f"Expired JWT token attempt for {path}")
+      logger.warning("Expired JWT token attempt for %s", path)
+      request_metrics.auth_failure("expired")
       return JSONResponse(
           content={"message": "Token has expired"},
           status_code=401
       )
     except jwt.InvalidTokenError:
-      logger.warning(f"Invalid JWT token attempt for {path}")
+      logger.warning("Invalid JWT token attempt for %s", path)
+      request_metrics.auth_failure("invalid")
       return JSONResponse(
           content={"message": "Invalid token"},
           status_code=401
-      )
\ No newline at end of file
+      )
+    token_cache.put(token, decoded)
+
+  state = scope.setdefault("state", {})
+  state["username"] = decoded.get('username')
+  # Absent from tokens issued before it was added; routes then resolve it by username
+  state["user_id"] = decoded.get('user_id')
+  logger.info("Successfully decoded JWT for user: %s", decoded.get('username'))
+  return None
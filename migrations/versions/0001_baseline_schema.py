@@ -0,0 +1,112 @@
+"""baseline schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+Databases created before migrations existed already have these tables; mark them
+with `alembic stamp 0001` and then run `alembic upgrade head`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+question_category = postgresql.ENUM(
+    'FINANCIAL_METRICS', 'INVESTING_POTENTIAL', 'RISK_TOLERANCE', 'RISK_CAPACITY',
+    name='question_category', create_type=False
+)
+question_input_type = postgresql.ENUM(
+    'RADIO_BUTTON', 'CHECK_BOX', 'INPUT_NUMBER', 'INPUT_TEXT',
+    name='question_input_type', create_type=False
+)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    question_category.create(bind, checkfirst=True)
+    question_input_type.create(bind, checkfirst=True)
+
+    op.create_table(
+        'users',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('username', sa.String(length=50), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('password_hash', sa.String(length=128), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('username'),
+    )
+    op.create_table(
+        'questions',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('categories', postgresql.ARRAY(question_category), nullable=True),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('input_type', question_input_type, nullable=True),
+        sa.Column('options', sa.JSON(), nullable=True),
+        sa.Column('weight', sa.JSON(), nullable=False),
+        sa.Column('display_order', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('display_order'),
+    )
+    op.create_table(
+        'investor_responses',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        sa.Column('question_id', sa.UUID(), nullable=False),
+        sa.Column('response', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['question_id'], ['questions.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'financial_metrics',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        sa.Column('risk_capacity', sa.Float(), nullable=False),
+        sa.Column('risk_tolerance', sa.Float(), nullable=False),
+        sa.Column('investing_potential', sa.Float(), nullable=False),
+        sa.Column('liquidity_ratio', sa.Float(), nullable=False),
+        sa.Column('debt_to_income_ratio', sa.Float(), nullable=False),
+        sa.Column('investment_horizon_score', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'portfolio_recommendations',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        sa.Column('portfolio_type', sa.String(), nullable=False),
+        sa.Column('equity_allocation', sa.Float(), nullable=False),
+        sa.Column('fixed_income_allocation', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('portfolio_recommendations')
+    op.drop_table('financial_metrics')
+    op.drop_table('investor_responses')
+    op.drop_table('questions')
+    op.drop_table('users')
+    bind = op.get_bind()
+    question_input_type.drop(bind, checkfirst=True)
+    question_category.drop(bind, checkfirst=True)
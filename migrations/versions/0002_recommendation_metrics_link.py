@@ -0,0 +1,36 @@
+"""link portfolio recommendations to the metrics row they were derived from
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:01
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('portfolio_recommendations', sa.Column('financial_metrics_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'portfolio_recommendations_financial_metrics_id_fkey',
+        'portfolio_recommendations', 'financial_metrics',
+        ['financial_metrics_id'], ['id'],
+    )
+    op.create_unique_constraint(
+        'portfolio_recommendations_financial_metrics_id_key',
+        'portfolio_recommendations', ['financial_metrics_id'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('portfolio_recommendations_financial_metrics_id_key', 'portfolio_recommendations', type_='unique')
+    op.drop_constraint('portfolio_recommendations_financial_metrics_id_fkey', 'portfolio_recommendations', type_='foreignkey')
+    op.drop_column('portfolio_recommendations', 'financial_metrics_id')
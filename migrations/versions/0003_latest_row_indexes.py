@@ -0,0 +1,39 @@
+"""composite (user_id, created_at DESC, id DESC) indexes for latest-row-per-user lookups
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:02
+
+The trailing id makes the order deterministic when created_at ties and lets the
+"latest id for this user" subquery in queries.py run as an index-only scan.
+Built CONCURRENTLY so existing tables stay writable.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('financial_metrics', 'investor_responses', 'portfolio_recommendations')
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.create_index(
+                f'ix_{table}_user_id_created_at',
+                table,
+                ['user_id', sa.text('created_at DESC'), sa.text('id DESC')],
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.drop_index(f'ix_{table}_user_id_created_at', table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,41 @@
+"""per-user factor scores for partial questionnaire updates
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:03
+
+Rows are written by POST /questions/submit; users who submitted before this table
+existed get theirs on their next full submission.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FACTORS = (
+    'investment_type', 'investing_potential', 'income_stability', 'owns_house', 'savings_rate',
+    'investment_experience', 'fixed_asset_allocation', 'portfolio_checking_freq', 'market_dip_action',
+    'investment_strategy', 'portfolio_crash_reaction', 'investment_horizon', 'has_dependents',
+    'liquidity_ratio', 'major_financial_goals', 'debt_to_income_ratio',
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_factor_scores',
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        *(sa.Column(factor, sa.BigInteger(), nullable=False) for factor in FACTORS),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('user_factor_scores')
@@ -0,0 +1,162 @@
+"""store each question's scoring rules in a new scoring_rules column
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 00:00:00
+
+Scoring used to go by question text (scoring.DEFAULT_RULES), so rewording a question
+silently dropped its scoring. The rules are copied into a new `scoring_rules` column
+here, which the scoring engine reads exclusively from now on. `weight` is left as it
+was. updated_at is bumped so running workers rebuild their questionnaire caches
+(questionnaire_cache.py).
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Snapshot of scoring.DEFAULT_RULES at this revision, in the `scoring_rules` format
+QUESTION_RULES = {
+    'How do you want to invest your money?': [
+        {'factor': 'investment_type', 'points': {
+            'SIP': -5,
+            'One Time': 5,
+        }},
+    ],
+    'How much amount do you want to invest?': [
+        {'factor': 'investing_potential', 'points': None},
+    ],
+    'How regular is your income?': [
+        {'factor': 'income_stability', 'points': {
+            'Regular monthly income': 10,
+            'Irregular monthly income': 5,
+            'No monthly income': 0,
+        }},
+    ],
+    'Do you own a house?': [
+        {'factor': 'owns_house', 'points': {
+            'Yes': 5,
+        }},
+    ],
+    'What %age of your annual income do you save?': [
+        {'factor': 'savings_rate', 'points': {
+            'Greater than or equal to 30%': 10,
+            'Less than 30%': 7,
+            'Less than 20%': 4,
+            'Less than 10%': 1,
+        }},
+    ],
+    'What is your investing experience in mutual funds and stocks?': [
+        {'factor': 'investment_experience', 'points': {
+            'Never invested': -10,
+            'Started less than 3 years back': -5,
+            'Investing from last 10 years to 3 years': 5,
+            'Investing for more than 10 years': 10,
+            'I have stopped investing': -10,
+        }},
+    ],
+    'What %age of your investment is in FD, PPF, NSC etc.?': [
+        {'factor': 'fixed_asset_allocation', 'points': {
+            'Less than 20%': 10,
+            'Between 20-30%': 5,
+            'Between 40-50%': -5,
+            'Greater than 60%': -10,
+        }},
+    ],
+    'How often do you check your portfolio value?': [
+        {'factor': 'portfolio_checking_freq', 'points': {
+            'Everyday': -10,
+            '4 to 5 times a month': -5,
+            'Every month': 0,
+            '4 to 5 times a year': 5,
+        }},
+    ],
+    'In which market dip would you take corrective action?': [
+        {'factor': 'market_dip_action', 'points': {
+            'Portfolio is down 10%': -10,
+            'Portfolio is down 20%': -5,
+            'Portfolio is down 30%': 0,
+            'Portfolio is down more than 40%': 5,
+            'None of the above': 10,
+        }},
+    ],
+    'What portfolio strategy would you like to have?': [
+        {'factor': 'investment_strategy', 'points': {
+            'Preserve principal amount even if post tax growth is below inflation': -10,
+            'Preserve principal amount with post tax growth at par with inflation': -5,
+            'Achieve moderate growth': 5,
+            'Achieve high growth': 10,
+            'Maximise growth': 15,
+        }},
+    ],
+    'What would you do if your portfolio dropped 50%?': [
+        {'factor': 'portfolio_crash_reaction', 'points': {
+            'Sell everything': -10,
+            'Hold and wait': 5,
+            'Invest more': 10,
+        }},
+    ],
+    'What is your preferred investment horizon?': [
+        {'factor': 'investment_horizon', 'points': {
+            'Less than 3 years': -10,
+            '3 to 5 years': 0,
+            'More than 5 years': 10,
+        }},
+        {'factor': 'has_dependents', 'points': {
+            'Yes': -10,
+        }},
+    ],
+    'How many months of expenses can your emergency savings cover?': [
+        {'factor': 'liquidity_ratio', 'points': {
+            'Less than 3 months': -10,
+            '3 to 6 months': 0,
+            'More than 6 months': 10,
+        }},
+    ],
+    'Do you have any significant financial goals in the next 3-5 years?': [
+        {'factor': 'major_financial_goals', 'points': {
+            'Yes': -10,
+        }},
+    ],
+    'What percentage of your income goes towards EMIs (Debt-to-Income Ratio)?': [
+        {'factor': 'debt_to_income_ratio', 'points': {
+            'Less than 20%': 10,
+            '20-40%': 0,
+            'More than 40%': -10,
+        }},
+    ],
+}
+
+questions = sa.table(
+    'questions',
+    sa.column('id', sa.UUID()),
+    sa.column('text', sa.Text()),
+    sa.column('scoring_rules', sa.JSON()),
+    sa.column('updated_at', sa.DateTime()),
+)
+
+
+def upgrade() -> None:
+    op.add_column('questions', sa.Column('scoring_rules', sa.JSON(), nullable=True))
+    connection = op.get_bind()
+    now = datetime.now(timezone.utc)
+    for question_id, text in connection.execute(sa.select(questions.c.id, questions.c.text)):
+        if text in QUESTION_RULES:
+            connection.execute(
+                questions.update()
+                .where(questions.c.id == question_id)
+                .values(scoring_rules=QUESTION_RULES[text], updated_at=now)
+            )
+
+
+def downgrade() -> None:
+    # The previous revision scored by question text, so the rules only need to go; no
+    # other column was changed
+    op.drop_column('questions', 'scoring_rules')
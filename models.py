@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, JSON, UUID, Enum, ARRAY, Text
+from sqlalchemy import BigInteger, Column, Integer, String, Float, ForeignKey, DateTime, JSON, UUID, Enum, ARRAY, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime, timezone
@@ -42,6 +42,8 @@ class Questions(Base):
   input_type = Column(Enum(InputType, name='question_input_type', create_type=False))
   options = Column(JSON, nullable=True)
   weight = Column(JSON, nullable=False)
+  # What each answer scores, read by the scoring engine (scoring.parse_rules)
+  scoring_rules = Column(JSON, nullable=True)
   display_order = Column(Integer, nullable=False, unique=True)
   # position = Column(String(50), nullable=False)
   created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
@@ -85,6 +87,8 @@ class PortfolioRecommendation(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
+    # Metrics row this recommendation was derived from; one recommendation per row
+    financial_metrics_id = Column(Integer, ForeignKey('financial_metrics.id'), nullable=True, unique=True)
 
     portfolio_type = Column(String, nullable=False)  # "Conservative", "Aggressive Growth", etc.
     equity_allocation = Column(Float, nullable=False)  # % of equity allocation
@@ -92,4 +96,37 @@ class PortfolioRecommendation(Base):
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
-    user = relationship("User", back_populates="portfolio_recommendation")
\ No newline at end of file
+    user = relationship("User", back_populates="portfolio_recommendation")
+
+class UserFactorScores(Base):
+    __tablename__ = 'user_factor_scores'
+
+    # Current points of every scoring factor (scoring.FACTORS) for a user, so a partial
+    # questionnaire update only rescores the answers that changed. BIGINT, since a numeric
+    # rule stores the answer itself (e.g. the amount to invest)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), primary_key=True)
+
+    investment_type = Column(BigInteger, nullable=False, default=0)
+    investing_potential = Column(BigInteger, nullable=False, default=0)
+    income_stability = Column(BigInteger, nullable=False, default=0)
+    owns_house = Column(BigInteger, nullable=False, default=0)
+    savings_rate = Column(BigInteger, nullable=False, default=0)
+    investment_experience = Column(BigInteger, nullable=False, default=0)
+    fixed_asset_allocation = Column(BigInteger, nullable=False, default=0)
+    portfolio_checking_freq = Column(BigInteger, nullable=False, default=0)
+    market_dip_action = Column(BigInteger, nullable=False, default=0)
+    investment_strategy = Column(BigInteger, nullable=False, default=0)
+    portfolio_crash_reaction = Column(BigInteger, nullable=False, default=0)
+    investment_horizon = Column(BigInteger, nullable=False, default=0)
+    has_dependents = Column(BigInteger, nullable=False, default=0)
+    liquidity_ratio = Column(BigInteger, nullable=False, default=0)
+    major_financial_goals = Column(BigInteger, nullable=False, default=0)
+    debt_to_income_ratio = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+# Latest-row-per-user lookups (see queries.py); created by migration 0003
+for _model in (InvestorResponse, FinancialMetrics, PortfolioRecommendation):
+  Index(
+    f"ix_{_model.__tablename__}_user_id_created_at",
+    _model.user_id, _model.created_at.desc(), _model.id.desc()
+  )
@@ -0,0 +1,247 @@
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+
+import csv
+import json
+import numpy as np
+import os
+import re
+import threading
+
+load_dotenv()
+
+# Local store of fund NAV / index price history, one pair of column files per instrument:
+#
+#   <symbol>.dates   int32 little-endian, days since 1970-01-01, strictly increasing
+#   <symbol>.values  float64 little-endian, the NAV / close for that day
+#   index.json       symbol -> kind, name, rows, first and last date
+#
+# Columns are append-only and memory-mapped read-only, so a range query is two binary
+# searches and a slice of the mapping: no parsing, no copy, and pages shared by every
+# worker through the OS page cache. The index is the commit point: a reader only maps the
+# first `rows` entries, so an append interrupted before the index is rewritten is never
+# seen (and is truncated away by the next append). One writer at a time (jobs/load_nav.py).
+NAV_STORE_PATH = os.getenv("NAV_STORE_PATH", os.path.join("data", "nav"))
+# Instruments kept mapped at once (each mapping holds two file descriptors)
+NAV_STORE_MAX_OPEN = int(os.getenv("NAV_STORE_MAX_OPEN", "512"))
+
+DATE_DTYPE = np.dtype("<i4")
+VALUE_DTYPE = np.dtype("<f8")
+INSTRUMENT_KINDS = ("fund", "index")
+# Also the file name stem, so restricted to characters safe in a path
+SYMBOL_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$")
+# CSV column holding the value, first match wins
+VALUE_COLUMNS = ("value", "nav", "close", "price")
+
+class UnknownInstrumentError(KeyError):
+  pass
+
+def to_days(day: date) -> int:
+  return int(np.datetime64(day, "D").astype(np.int64))
+
+def to_iso(days: np.ndarray) -> List[str]:
+  return days.astype("datetime64[D]").astype(str).tolist()
+
+class NavStore:
+  # Reads are safe from any thread; mappings are opened on first use and kept, up to
+  # `max_open`, until the index shows the instrument has grown.
+
+  def __init__(self, path: str = NAV_STORE_PATH, max_open: int = NAV_STORE_MAX_OPEN):
+    self.path = path
+    self.max_open = max_open
+    self._lock = threading.Lock()
+    self._index: Dict[str, Dict] = {}
+    self._index_mtime = None
+    # symbol -> (rows, dates, values), least recently used first
+    self._open: "OrderedDict[str, tuple]" = OrderedDict()
+    self.maps_opened = 0
+
+  # ---------------------------
+  # Reading
+  # ---------------------------
+  def instruments(self, kind: Optional[str] = None) -> List[Dict]:
+    with self._lock:
+      self._refresh_index()
+      return [
+        {"symbol": symbol, **entry}
+        for symbol, entry in sorted(self._index.items())
+        if kind is None or entry["kind"] == kind
+      ]
+
+  def instrument(self, symbol: str) -> Dict:
+    with self._lock:
+      self._refresh_index()
+      entry = self._index.get(symbol)
+      if entry is None:
+        raise UnknownInstrumentError(symbol)
+      return {"symbol": symbol, **entry}
+
+  def series(self, symbol: str, start: Optional[date] = None, end: Optional[date] = None) -> Tuple[np.ndarray, np.ndarray]:
+    # (dates, values) with start <= date <= end, as read-only views of the mapped files
+    dates, values = self.columns(symbol)
+    low = 0 if start is None else int(np.searchsorted(dates, to_days(start), side="left"))
+    high = len(dates) if end is None else int(np.searchsorted(dates, to_days(end), side="right"))
+    return dates[low:high], values[low:high]
+
+  def columns(self, symbol: str) -> Tuple[np.ndarray, np.ndarray]:
+    with self._lock:
+      self._refresh_index()
+      entry = self._index.get(symbol)
+      if entry is None:
+        raise UnknownInstrumentError(symbol)
+      rows = entry["rows"]
+      mapped = self._open.get(symbol)
+      if mapped is not None and mapped[0] == rows:
+        self._open.move_to_end(symbol)
+        return mapped[1], mapped[2]
+      dates = self._map(symbol, ".dates", DATE_DTYPE, rows)
+      values = self._map(symbol, ".values", VALUE_DTYPE, rows)
+      self.maps_opened += 1
+      self._open[symbol] = (rows, dates, values)
+      self._open.move_to_end(symbol)
+      while len(self._open) > self.max_open:
+        # Views handed out earlier keep their mapping alive until they are dropped
+        self._open.popitem(last=False)
+      return dates, values
+
+  def _map(self, symbol: str, suffix: str, dtype: np.dtype, rows: int) -> np.ndarray:
+    if rows == 0:
+      return np.empty(0, dtype=dtype)
+    return np.memmap(self._file(symbol, suffix), dtype=dtype, mode="r", shape=(rows,))
+
+  def _file(self, symbol: str, suffix: str) -> str:
+    return os.path.join(self.path, symbol + suffix)
+
+  def _refresh_index(self):
+    # Picks up appends made by another process; a stat per call, reloaded on change
+    index_path = os.path.join(self.path, "index.json")
+    try:
+      mtime = os.stat(index_path).st_mtime_ns
+    except FileNotFoundError:
+      # Never written: whatever is held are this process's own uncommitted appends
+      # (write_index=False), which must survive until flush_index()
+      if self._index_mtime is not None:
+        self._index = {}
+      self._index_mtime = None
+      return
+    if mtime == self._index_mtime:
+      return
+    with open(index_path) as f:
+      self._index = json.load(f)["instruments"]
+    self._index_mtime = mtime
+
+  # ---------------------------
+  # Writing
+  # ---------------------------
+  def append(
+    self, symbol: str, days: np.ndarray, values: np.ndarray, kind: str = "fund", name: Optional[str] = None,
+    write_index: bool = True,
+  ) -> Tuple[int, int]:
+    # Appends the rows dated after the instrument's last date; returns (appended, skipped).
+    # Duplicate dates within the batch keep the last value. Bulk loads pass
+    # write_index=False and call flush_index() once at the end; until then the new rows
+    # are invisible to other processes.
+    if not SYMBOL_PATTERN.match(symbol):
+      raise ValueError(f"Invalid symbol: {symbol!r}")
+    if kind not in INSTRUMENT_KINDS:
+      raise ValueError(f"Invalid instrument kind: {kind!r}")
+    days = np.asarray(days, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(days, kind="stable")
+    days, values = days[order], values[order]
+    if len(days):
+      last_of_each = np.append(days[1:] != days[:-1], True)
+      days, values = days[last_of_each], values[last_of_each]
+
+    with self._lock:
+      os.makedirs(self.path, exist_ok=True)
+      self._refresh_index()
+      entry = dict(self._index.get(symbol) or {"kind": kind, "name": name or symbol, "rows": 0, "first": None, "last": None})
+      if entry["last"] is not None:
+        fresh = days > to_days(date.fromisoformat(entry["last"]))
+      else:
+        fresh = np.ones(len(days), dtype=bool)
+      skipped = int(len(days) - fresh.sum())
+      days, values = days[fresh], values[fresh]
+      if name:
+        entry["name"] = name
+      if not len(days):
+        return 0, skipped
+
+      rows = entry["rows"]
+      for suffix, column, dtype in ((".dates", days, DATE_DTYPE), (".values", values, VALUE_DTYPE)):
+        file_path = self._file(symbol, suffix)
+        with open(file_path, "ab") as f:
+          # Drops any tail left by an append that never reached the index
+          f.truncate(rows * dtype.itemsize)
+          f.write(column.astype(dtype).tobytes())
+
+      entry["rows"] = rows + len(days)
+      entry["first"] = entry["first"] or to_iso(days[:1])[0]
+      entry["last"] = to_iso(days[-1:])[0]
+      self._index[symbol] = entry
+      if write_index:
+        self._write_index()
+      return len(days), skipped
+
+  def flush_index(self):
+    with self._lock:
+      self._write_index()
+
+  def _write_index(self):
+    index_path = os.path.join(self.path, "index.json")
+    temporary = index_path + ".tmp"
+    with open(temporary, "w") as f:
+      f.write(json.dumps({"version": 1, "instruments": self._index}, separators=(",", ":")))
+    os.replace(temporary, index_path)
+    self._index_mtime = os.stat(index_path).st_mtime_ns
+
+  def stats(self) -> Dict[str, float]:
+    with self._lock:
+      return {
+        "instruments": len(self._index),
+        "open": len(self._open),
+        "max_open": self.max_open,
+        "maps_opened": self.maps_opened,
+      }
+
+nav_store = NavStore()
+
+# ---------------------------
+# CSV loading
+# ---------------------------
+def read_csv(lines: Iterable[str], symbol: Optional[str] = None) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+  # `date` (YYYY-MM-DD) and a value column (value, nav, close or price), plus `symbol` for
+  # files holding several instruments; without one, every row belongs to `symbol`.
+  # Returns symbol -> (days, values).
+  reader = csv.reader(lines)
+  fields = [field.strip().lower() for field in next(reader, [])]
+  value_column = next((column for column in VALUE_COLUMNS if column in fields), None)
+  if "date" not in fields or value_column is None:
+    raise ValueError(f"CSV needs a date column and one of {', '.join(VALUE_COLUMNS)}")
+  symbol_index = fields.index("symbol") if "symbol" in fields else None
+  if symbol is None and symbol_index is None:
+    raise ValueError("CSV has no symbol column; pass the symbol")
+  date_index, value_index = fields.index("date"), fields.index(value_column)
+
+  columns: Dict[str, Tuple[List[str], List[str]]] = {}
+  for row in reader:
+    if not row:
+      continue
+    key = row[symbol_index].strip() if symbol_index is not None else symbol
+    dates, values = columns.setdefault(key, ([], []))
+    dates.append(row[date_index].strip())
+    values.append(row[value_index])
+  return {
+    key: (np.array(dates, dtype="datetime64[D]").astype(np.int64), np.array(values, dtype=np.float64))
+    for key, (dates, values) in columns.items()
+  }
+
+def load_csv(store: NavStore, path: str, symbol: Optional[str] = None, kind: str = "fund", name: Optional[str] = None) -> Dict[str, Tuple[int, int]]:
+  with open(path, newline="") as f:
+    parsed = read_csv(f, symbol)
+  results = {key: store.append(key, days, values, kind, name, write_index=False) for key, (days, values) in parsed.items()}
+  store.flush_index()
+  return results
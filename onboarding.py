@@ -0,0 +1,359 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from database import SessionLocal
+from logger import logger
+from models import User, InvestorResponse, FinancialMetrics, UserFactorScores
+from portfolio_cache import portfolio_cache
+from queries import upsert_statement
+from query_stats import record_statement
+from scoring import get_scoring_engine, compute_metrics, UnknownQuestionError, FACTORS, METRIC_COMPONENTS
+
+import csv
+import io
+import json
+import os
+import time
+import uuid
+
+load_dotenv()
+
+# Bulk questionnaire ingestion for many users at once: a CSV or NDJSON stream of
+# (user, question, response) rows. Consecutive rows of one user form one submission,
+# scored exactly like POST /questions/submit. Submissions are written a batch of users
+# per transaction, so memory is bounded by the batch, not the file.
+
+# Users whose submissions are written per transaction
+ONBOARDING_BATCH_USERS = int(os.getenv("ONBOARDING_BATCH_USERS", "500"))
+# Longer runs of rows for one user are rejected rather than held in memory
+ONBOARDING_MAX_ROWS_PER_USER = int(os.getenv("ONBOARDING_MAX_ROWS_PER_USER", "200"))
+# Row errors listed in the summary; later ones are only counted
+ONBOARDING_MAX_ERRORS = int(os.getenv("ONBOARDING_MAX_ERRORS", "1000"))
+ONBOARDING_MAX_LINE_BYTES = int(os.getenv("ONBOARDING_MAX_LINE_BYTES", "65536"))
+
+ONBOARDING_FORMATS = ("csv", "ndjson")
+
+RESPONSE_COLUMNS = ("user_id", "question_id", "response", "created_at", "updated_at")
+METRICS_COLUMNS = ("user_id",) + tuple(METRIC_COMPONENTS) + ("created_at", "updated_at")
+
+class RowError(ValueError):
+  pass
+
+# The input as a whole can't be read, e.g. a CSV header without the needed columns
+class OnboardingInputError(ValueError):
+  pass
+
+class Submission:
+  # Consecutive rows of one user; `rows` are (line, (question_id, UUID), response)
+  __slots__ = ("key", "user", "first_line", "rows", "row_count", "failed")
+
+  def __init__(self, key: Tuple[str, str], user: str, first_line: int):
+    self.key = key
+    self.user = user
+    self.first_line = first_line
+    self.rows: List[Tuple[int, Tuple[str, uuid.UUID], str]] = []
+    self.row_count = 0
+    self.failed = False
+
+class Onboarding:
+  # Incremental: feed() takes the input in chunks of any size (a request body as it
+  # arrives, or a file read in blocks) and finish() writes what is left and returns the
+  # summary. Not thread-safe; one instance per upload.
+
+  def __init__(
+    self,
+    input_format: str = "csv",
+    batch_users: int = ONBOARDING_BATCH_USERS,
+    max_rows_per_user: int = ONBOARDING_MAX_ROWS_PER_USER,
+    max_errors: int = ONBOARDING_MAX_ERRORS,
+    session_factory=SessionLocal,
+  ):
+    if input_format not in ONBOARDING_FORMATS:
+      raise ValueError(f"format must be one of {', '.join(ONBOARDING_FORMATS)}")
+    self.input_format = input_format
+    self.batch_users = batch_users
+    self.max_rows_per_user = max_rows_per_user
+    self.max_errors = max_errors
+    self.session_factory = session_factory
+
+    self._partial = b""
+    self._skipping = False
+    self._line = 0
+    self._header: Optional[List[str]] = None
+    # Raw question id -> (canonical id, UUID), parsed once per distinct id
+    self._question_ids: Dict[str, Tuple[str, uuid.UUID]] = {}
+    self._current: Optional[Submission] = None
+    self._batch: List[Submission] = []
+    self._started = time.perf_counter()
+
+    self.rows = 0
+    self.submissions = 0
+    self.rows_written = 0
+    self.rejected_submissions = 0
+    self.rejected_rows = 0
+    self.batches = 0
+    self.error_count = 0
+    self.errors: List[Dict] = []
+
+  # ---------------------------
+  # Input
+  # ---------------------------
+  def feed(self, data: bytes):
+    lines = (self._partial + data).split(b"\n")
+    self._partial = lines.pop()
+    for line in lines:
+      if self._skipping:
+        # Rest of a line that was already counted and reported as too long
+        self._skipping = False
+        continue
+      self._line += 1
+      self._read_line(line)
+    if len(self._partial) > ONBOARDING_MAX_LINE_BYTES:
+      self._line += 1
+      self._partial = b""
+      self._skipping = True
+      self.rows += 1
+      self.rejected_rows += 1
+      self._error(self._line, None, f"Line longer than {ONBOARDING_MAX_LINE_BYTES} bytes.")
+
+  def finish(self) -> Dict:
+    if self._partial and not self._skipping:
+      self._line += 1
+      self._read_line(self._partial)
+    self._partial = b""
+    self._close_submission()
+    self._flush()
+    return self.summary()
+
+  def _read_line(self, line: bytes):
+    try:
+      text = line.decode("utf-8").rstrip("\r")
+    except UnicodeDecodeError:
+      self.rows += 1
+      self.rejected_rows += 1
+      return self._error(self._line, None, "Line is not valid UTF-8.")
+    if not text.strip():
+      return
+    if self.input_format == "csv" and self._header is None:
+      self._header = [name.strip().lower() for name in next(csv.reader([text]))]
+      columns = set(self._header)
+      if "question_id" not in columns or not {"response", "submitted_response"} & columns or not {"user_id", "username"} & columns:
+        raise OnboardingInputError("CSV header needs question_id, response and user_id or username columns.")
+      return
+
+    self.rows += 1
+    user = None
+    try:
+      fields = self._fields(text)
+      key, user = self._user_key(fields)
+      question_id, response = self._answer(fields)
+    except RowError as e:
+      if user is None:
+        # Not attributable to a user, so no submission is affected
+        self.rejected_rows += 1
+        return self._error(self._line, None, str(e))
+      submission = self._submission(key, user)
+      submission.row_count += 1
+      submission.failed = True
+      return self._error(self._line, user, str(e))
+
+    submission = self._submission(key, user)
+    submission.row_count += 1
+    if len(submission.rows) >= self.max_rows_per_user:
+      if not submission.failed:
+        self._error(self._line, user, f"More than {self.max_rows_per_user} rows for one user.")
+      submission.failed = True
+      return
+    submission.rows.append((self._line, question_id, response))
+
+  def _fields(self, text: str) -> Dict:
+    if self.input_format == "csv":
+      values = next(csv.reader([text]))
+      return dict(zip(self._header, values))
+    try:
+      fields = json.loads(text)
+    except ValueError:
+      raise RowError("Invalid JSON.")
+    if not isinstance(fields, dict):
+      raise RowError("Each line must be a JSON object.")
+    return fields
+
+  def _user_key(self, fields: Dict) -> Tuple[Tuple[str, str], str]:
+    user_id = fields.get("user_id")
+    if user_id:
+      try:
+        return ("id", str(uuid.UUID(str(user_id)))), str(user_id)
+      except ValueError:
+        raise RowError("Invalid user id.")
+    username = fields.get("username")
+    if username:
+      return ("username", str(username)), str(username)
+    raise RowError("Missing user_id or username.")
+
+  def _answer(self, fields: Dict) -> Tuple[Tuple[str, uuid.UUID], str]:
+    raw_id = fields.get("question_id")
+    response = fields.get("response", fields.get("submitted_response"))
+    if raw_id is None or response is None:
+      raise RowError("Missing question_id or response.")
+    raw_id = str(raw_id)
+    question_id = self._question_ids.get(raw_id)
+    if question_id is None:
+      try:
+        parsed = uuid.UUID(raw_id)
+      except ValueError:
+        raise RowError("Invalid question id.")
+      question_id = self._question_ids[raw_id] = (str(parsed), parsed)
+    return question_id, str(response)
+
+  def _submission(self, key: Tuple[str, str], user: str) -> Submission:
+    if self._current is None or self._current.key != key:
+      self._close_submission()
+      self._current = Submission(key, user, self._line)
+    return self._current
+
+  def _close_submission(self):
+    submission, self._current = self._current, None
+    if submission is None:
+      return
+    if submission.failed:
+      self._reject(submission)
+      return
+    self._batch.append(submission)
+    if len(self._batch) >= self.batch_users:
+      self._flush()
+
+  def _reject(self, submission: Submission, error: Optional[str] = None):
+    # Like a submit answered with 400/500: none of the user's rows are saved
+    self.rejected_submissions += 1
+    self.rejected_rows += submission.row_count
+    if error is not None:
+      self._error(submission.first_line, submission.user, error)
+
+  def _error(self, line: int, user: Optional[str], error: str):
+    self.error_count += 1
+    if len(self.errors) < self.max_errors:
+      self.errors.append({"line": line, "user": user, "error": error})
+
+  # ---------------------------
+  # Scoring and writes
+  # ---------------------------
+  def _flush(self):
+    batch, self._batch = self._batch, []
+    if not batch:
+      return
+    with self.session_factory() as db:
+      engine = get_scoring_engine(db, {question_id for submission in batch for _, (question_id, _), _ in submission.rows})
+      user_ids = resolve_users(db, {submission.key for submission in batch})
+
+      now = datetime.now(timezone.utc)
+      written: List[Tuple[Submission, uuid.UUID]] = []
+      responses, metrics_rows, factor_rows = [], [], {}
+      for submission in batch:
+        user_id = user_ids.get(submission.key)
+        if user_id is None:
+          self._reject(submission, "Unknown user.")
+          continue
+        answers = [(question_id, response) for _, (question_id, _), response in submission.rows]
+        try:
+          factors = engine.score_factors(answers)
+        except (UnknownQuestionError, ValueError):
+          self._reject_answers(engine, submission)
+          continue
+        metrics = compute_metrics(factors)
+        responses.extend(
+          (user_id, question_uuid, response, now, now) for _, (_, question_uuid), response in submission.rows
+        )
+        metrics_rows.append((user_id, *(metrics[name] for name in METRIC_COMPONENTS), now, now))
+        # One factor row per user and statement; a later submission in the batch wins
+        factor_rows[user_id] = {"user_id": user_id, **factors}
+        written.append((submission, user_id))
+
+      if written:
+        try:
+          write_rows(db, InvestorResponse, RESPONSE_COLUMNS, responses)
+          db.execute(
+            upsert_statement(db.get_bind().dialect.name, UserFactorScores, [UserFactorScores.user_id], FACTORS + ("updated_at",)),
+            list(factor_rows.values())
+          )
+          write_rows(db, FinancialMetrics, METRICS_COLUMNS, metrics_rows)
+          db.commit()
+        except (SQLAlchemyError, db.get_bind().dialect.dbapi.Error):
+          # COPY runs on the raw driver cursor, so its failures arrive unwrapped
+          db.rollback()
+          logger.exception("Bulk onboarding batch of %d submissions failed", len(written))
+          for submission, _ in written:
+            self._reject(submission, "Could not save questionnaire.")
+          return
+
+    self.batches += 1
+    for submission, user_id in written:
+      self.submissions += 1
+      self.rows_written += len(submission.rows)
+      portfolio_cache.invalidate(user_id)
+
+  def _reject_answers(self, engine, submission: Submission):
+    # Scoring the whole set failed; score each answer alone to report the rows at fault
+    for line, (question_id, _), response in submission.rows:
+      try:
+        engine.assign([(question_id, response)])
+      except UnknownQuestionError:
+        self._error(line, submission.user, f"Unknown question: {question_id}")
+      except ValueError:
+        self._error(line, submission.user, "Invalid response for a numeric question.")
+    self._reject(submission)
+
+  def summary(self) -> Dict:
+    seconds = time.perf_counter() - self._started
+    return {
+      "rows": self.rows,
+      "submissions": self.submissions,
+      "rows_written": self.rows_written,
+      "rejected_submissions": self.rejected_submissions,
+      "rejected_rows": self.rejected_rows,
+      "batches": self.batches,
+      "seconds": round(seconds, 3),
+      "rows_per_second": round(self.rows / seconds, 1) if seconds > 0 else None,
+      "error_count": self.error_count,
+      "errors": self.errors,
+    }
+
+# ---------------------------
+# Helper Functions
+# ---------------------------
+def resolve_users(db, keys) -> Dict[Tuple[str, str], uuid.UUID]:
+  # User keys of a batch -> user ids, one query per kind of key; unknown users are left out
+  ids = [uuid.UUID(value) for kind, value in keys if kind == "id"]
+  usernames = [value for kind, value in keys if kind == "username"]
+  found = {}
+  if ids:
+    for user_id in db.execute(select(User.id).where(User.id.in_(ids))).scalars():
+      found[("id", str(user_id))] = user_id
+  if usernames:
+    for user_id, username in db.execute(select(User.id, User.username).where(User.username.in_(usernames))):
+      found[("username", username)] = user_id
+  return found
+
+def write_rows(db, model, columns: Tuple[str, ...], rows: List[tuple]):
+  # COPY on Postgres (psycopg2), otherwise one Core executemany INSERT (the ORM's bulk
+  # path costs more than the insert itself); same transaction as db
+  if not rows:
+    return
+  if db.get_bind().dialect.name != "postgresql":
+    db.connection().execute(insert(model.__table__), [dict(zip(columns, row)) for row in rows])
+    return
+  buffer = io.StringIO()
+  # Quoted strings, so an empty response is '' rather than NULL
+  csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC, lineterminator="\n").writerows(
+    tuple(str(value) if isinstance(value, (uuid.UUID, datetime)) else value for value in row) for row in rows
+  )
+  buffer.seek(0)
+  statement = f"COPY {model.__tablename__} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+  cursor = db.connection().connection.cursor()
+  started_at = time.perf_counter()
+  try:
+    cursor.copy_expert(statement, buffer)
+  finally:
+    cursor.close()
+    record_statement(statement, time.perf_counter() - started_at, write=True)
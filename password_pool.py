@@ -0,0 +1,89 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+
+import asyncio
+import multiprocessing
+import os
+import time
+
+# This module is re-imported by every pool worker (spawn start method), so it only
+# depends on passlib and the standard library.
+
+load_dotenv()
+
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", str(min(2, os.cpu_count() or 1))))
+PASSWORD_POOL_MAX_PENDING = int(os.getenv("PASSWORD_POOL_MAX_PENDING", str(PASSWORD_POOL_WORKERS * 8)))
+
+# Password hashing context
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def _hash_password(password: str) -> str:
+  return pwd_context.hash(password)
+
+def _verify_password(plain_password: str, hashed_password: str) -> bool:
+  return pwd_context.verify(plain_password, hashed_password)
+
+class PasswordPoolBusy(Exception):
+  pass
+
+class PasswordPool:
+  # Runs bcrypt in a dedicated process pool so hashing neither holds the GIL nor ties up
+  # FastAPI's threadpool. At most `max_pending` jobs may be queued or running; beyond
+  # that callers get PasswordPoolBusy immediately instead of waiting in line.
+  # Counters are only touched from the event loop thread.
+
+  def __init__(self, workers: int = PASSWORD_POOL_WORKERS, max_pending: int = PASSWORD_POOL_MAX_PENDING):
+    self.workers = workers
+    self.max_pending = max_pending
+    self._executor: Optional[ProcessPoolExecutor] = None
+    self.pending = 0
+    self.completed = 0
+    self.rejected = 0
+    self.total_seconds = 0.0
+    self.max_seconds = 0.0
+
+  def start(self):
+    if self._executor is None:
+      self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+  def shutdown(self):
+    if self._executor is not None:
+      self._executor.shutdown(wait=True, cancel_futures=True)
+      self._executor = None
+
+  async def _run(self, fn, *args):
+    if self.pending >= self.max_pending:
+      self.rejected += 1
+      raise PasswordPoolBusy()
+    self.start()
+    self.pending += 1
+    start_time = time.perf_counter()
+    try:
+      return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+    finally:
+      elapsed = time.perf_counter() - start_time
+      self.pending -= 1
+      self.completed += 1
+      self.total_seconds += elapsed
+      self.max_seconds = max(self.max_seconds, elapsed)
+
+  async def hash(self, password: str) -> str:
+    return await self._run(_hash_password, password)
+
+  async def verify(self, plain_password: str, hashed_password: str) -> bool:
+    return await self._run(_verify_password, plain_password, hashed_password)
+
+  def stats(self) -> Dict[str, float]:
+    return {
+      "workers": self.workers,
+      "max_pending": self.max_pending,
+      "pending": self.pending,
+      "completed": self.completed,
+      "rejected": self.rejected,
+      "avg_seconds": self.total_seconds / self.completed if self.completed else 0.0,
+      "max_seconds": self.max_seconds,
+    }
+
+password_pool = PasswordPool()
@@ -0,0 +1,61 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+
+import os
+import threading
+import time
+
+load_dotenv()
+
+PORTFOLIO_CACHE_SIZE = int(os.getenv("PORTFOLIO_CACHE_SIZE", "10000"))
+# Upper bound on how long a worker keeps serving a recommendation after it was rewritten
+# in place (jobs/rescore_portfolios.py); new submissions are picked up immediately.
+PORTFOLIO_CACHE_TTL = float(os.getenv("PORTFOLIO_CACHE_TTL", "300"))
+
+class PortfolioCache:
+  # user_id -> (financial_metrics_id, recommendation response, expiry), bounded LRU.
+  # An entry is only served for the metrics row it was derived from, so a stale entry
+  # on another worker is never returned after a new submission; invalidate() just
+  # frees it early on the worker that handled the submission.
+
+  def __init__(self, maxsize: int = PORTFOLIO_CACHE_SIZE, ttl: float = PORTFOLIO_CACHE_TTL):
+    self.maxsize = maxsize
+    self.ttl = ttl
+    self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, user_id, metrics_id: int) -> Optional[Any]:
+    with self._lock:
+      entry = self._entries.get(user_id)
+      if entry is None or entry[0] != metrics_id or entry[2] <= time.monotonic():
+        self.misses += 1
+        return None
+      self._entries.move_to_end(user_id)
+      self.hits += 1
+      return entry[1]
+
+  def put(self, user_id, metrics_id: int, value: Any):
+    if self.maxsize <= 0:
+      return
+    with self._lock:
+      self._entries[user_id] = (metrics_id, value, time.monotonic() + self.ttl)
+      self._entries.move_to_end(user_id)
+      while len(self._entries) > self.maxsize:
+        self._entries.popitem(last=False)
+
+  def invalidate(self, user_id):
+    with self._lock:
+      self._entries.pop(user_id, None)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+  def stats(self) -> Dict[str, int]:
+    with self._lock:
+      return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+portfolio_cache = PortfolioCache()
@@ -0,0 +1,115 @@
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from dotenv import load_dotenv
+
+import math
+import numpy as np
+import os
+
+load_dotenv()
+
+# Monte Carlo projection of a monthly-rebalanced equity / fixed-income mix. Each asset's
+# monthly log return is normal (correlated across the two), calibrated so the expected
+# annual return and volatility match the settings below.
+PROJECTION_EQUITY_RETURN = float(os.getenv("PROJECTION_EQUITY_RETURN", "0.12"))
+PROJECTION_EQUITY_VOLATILITY = float(os.getenv("PROJECTION_EQUITY_VOLATILITY", "0.18"))
+PROJECTION_FIXED_INCOME_RETURN = float(os.getenv("PROJECTION_FIXED_INCOME_RETURN", "0.07"))
+PROJECTION_FIXED_INCOME_VOLATILITY = float(os.getenv("PROJECTION_FIXED_INCOME_VOLATILITY", "0.04"))
+PROJECTION_CORRELATION = float(os.getenv("PROJECTION_CORRELATION", "0.1"))
+PROJECTION_PATHS = int(os.getenv("PROJECTION_PATHS", "20000"))
+# Fixed seed: the same inputs always give the same paths, on every worker
+PROJECTION_SEED = int(os.getenv("PROJECTION_SEED", "7"))
+# Path-months simulated per array operation (about 80 bytes each while in flight)
+PROJECTION_CHUNK_SIZE = int(os.getenv("PROJECTION_CHUNK_SIZE", "500000"))
+PROJECTION_CACHE_SIZE = int(os.getenv("PROJECTION_CACHE_SIZE", "128"))
+
+MODES = ("sip", "lumpsum")
+PERCENTILES = (5, 10, 25, 50, 75, 90, 95)
+# Equity weights are simulated in steps of this many percent (the bands are multiples of 5)
+EQUITY_STEP = 5
+
+def quantize_equity(equity: float) -> int:
+  return int(min(max(round(equity / EQUITY_STEP) * EQUITY_STEP, 0), 100))
+
+# ---------------------------
+# Simulation
+# ---------------------------
+def monthly_parameters(annual_return: float, annual_volatility: float) -> Tuple[float, float]:
+  # (mean, sd) of the monthly log return with E[growth] = (1 + annual_return) ** (1/12)
+  sd = annual_volatility / math.sqrt(12)
+  return math.log1p(annual_return) / 12 - sd * sd / 2, sd
+
+def simulate_paths(rng: np.random.Generator, equity: int, months: int, paths: int, mode: str) -> np.ndarray:
+  # (paths, months) wealth at each month end for one unit invested: once up front
+  # ("lumpsum"), or at the start of every month ("sip"). Wealth is linear in the amount,
+  # so callers scale by theirs.
+  equity_mean, equity_sd = monthly_parameters(PROJECTION_EQUITY_RETURN, PROJECTION_EQUITY_VOLATILITY)
+  fixed_mean, fixed_sd = monthly_parameters(PROJECTION_FIXED_INCOME_RETURN, PROJECTION_FIXED_INCOME_VOLATILITY)
+  shocks = rng.standard_normal((2, paths, months))
+  fixed_shocks = PROJECTION_CORRELATION * shocks[0] + math.sqrt(1 - PROJECTION_CORRELATION ** 2) * shocks[1]
+  weight = equity / 100
+  # Rebalanced monthly, so each month's growth is the weighted mix of the two assets'
+  gross = weight * np.exp(equity_mean + equity_sd * shocks[0]) + (1 - weight) * np.exp(fixed_mean + fixed_sd * fixed_shocks)
+  growth = np.cumprod(gross, axis=1)
+  if mode == "lumpsum":
+    return growth
+  # Contribution k grows by growth[t] / growth[k - 1] until month t, so
+  # wealth[t] = growth[t] * sum over k <= t of 1 / growth[k - 1]
+  before = np.empty_like(growth)
+  before[:, 0] = 1.0
+  before[:, 1:] = growth[:, :-1]
+  return growth * np.cumsum(1 / before, axis=1)
+
+@lru_cache(maxsize=PROJECTION_CACHE_SIZE)
+def unit_projection(equity: int, months: int, mode: str, paths: int = PROJECTION_PATHS, seed: int = PROJECTION_SEED):
+  # (sorted final wealth per path, its PERCENTILES, PERCENTILES at each year end) per unit
+  # amount. Shared by every user with the same allocation, horizon and mode; read-only.
+  rng = np.random.default_rng([seed, equity, months, MODES.index(mode)])
+  finals = np.empty(paths)
+  year_ends = np.arange(11, months, 12)
+  yearly = np.empty((paths, len(year_ends)))
+  chunk = max(PROJECTION_CHUNK_SIZE // months, 1)
+  for start in range(0, paths, chunk):
+    stop = min(start + chunk, paths)
+    wealth = simulate_paths(rng, equity, months, stop - start, mode)
+    finals[start:stop] = wealth[:, -1]
+    yearly[start:stop] = wealth[:, year_ends]
+  finals.sort()
+  bands = np.percentile(yearly, PERCENTILES, axis=0).T if len(year_ends) else np.empty((0, len(PERCENTILES)))
+  finals.flags.writeable = False
+  return finals, np.percentile(finals, PERCENTILES).tolist(), bands.tolist()
+
+def project(equity: float, amount: float, years: int, mode: str = "sip", target: Optional[float] = None) -> Dict:
+  if mode not in MODES:
+    raise ValueError(f"mode must be one of {', '.join(MODES)}")
+  months = int(years) * 12
+  simulated_equity = quantize_equity(equity)
+  finals, final_percentiles, bands = unit_projection(simulated_equity, months, mode)
+  invested = amount * months if mode == "sip" else amount
+
+  result = {
+    "equity_allocation": simulated_equity,
+    "fixed_income_allocation": 100 - simulated_equity,
+    "mode": mode,
+    "amount": amount,
+    "years": int(years),
+    "paths": len(finals),
+    "invested": invested,
+    "percentiles": {
+      f"p{percentile}": value * amount for percentile, value in zip(PERCENTILES, final_percentiles)
+    },
+    "yearly": [
+      {"year": year, **{f"p{percentile}": value * amount for percentile, value in zip(PERCENTILES, row)}}
+      for year, row in enumerate(bands, start=1)
+    ],
+    "target": target,
+    "probability": None,
+  }
+  if target is not None:
+    # Share of paths ending at or above the target; finals are sorted
+    result["probability"] = 1 - int(np.searchsorted(finals, target / amount, side="left")) / len(finals)
+  return result
+
+def projection_cache_stats() -> Dict[str, float]:
+  info = unit_projection.cache_info()
+  return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
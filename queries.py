@@ -0,0 +1,43 @@
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from typing import Iterable, Optional
+
+# ---------------------------
+# Latest row per user
+# ---------------------------
+# Rows are ordered by (created_at DESC, id DESC), which is exactly the key of the
+# ix_<table>_user_id_created_at indexes, so the id lookup below is an index-only scan
+# that stops at the first entry. The row itself is then fetched by primary key.
+
+def latest_id_query(model, user_id):
+  return (
+    select(model.id)
+    .where(model.user_id == user_id)
+    .order_by(model.created_at.desc(), model.id.desc())
+    .limit(1)
+  )
+
+def get_latest_id(db: Session, model, user_id) -> Optional[int]:
+  return db.execute(latest_id_query(model, user_id)).scalar()
+
+def get_latest(db: Session, model, user_id):
+  # One round trip: the outer lookup is by primary key on the subquery's result.
+  return db.query(model).filter(model.id == latest_id_query(model, user_id).scalar_subquery()).first()
+
+# ---------------------------
+# Upserts
+# ---------------------------
+def upsert_statement(dialect_name: str, model, index_elements: Iterable, update_columns: Iterable[str]):
+  # INSERT ... ON CONFLICT (index_elements) DO UPDATE SET column = excluded.column; one
+  # statement whether or not the row exists. Takes executemany parameters as well.
+  if dialect_name == "postgresql":
+    statement = postgresql.insert(model)
+  elif dialect_name == "sqlite":
+    statement = sqlite.insert(model)
+  else:
+    raise RuntimeError(f"Unsupported database dialect: {dialect_name}")
+  return statement.on_conflict_do_update(
+    index_elements=list(index_elements),
+    set_={column: statement.excluded[column] for column in update_columns},
+  )
@@ -0,0 +1,168 @@
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import event
+from logger import logger
+
+import os
+import re
+import time
+
+load_dotenv()
+
+# A statement shape seen this many times in one request is reported as a likely N+1
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "3"))
+
+# Statements (excluding COMMIT/ROLLBACK) each route may issue. Exceeding it is logged and
+# counted in /internal/metrics; query_budget() below turns it into a test failure.
+QUERY_BUDGETS: Dict[Tuple[str, str], int] = {
+  ("POST", "/auth/signup"): 2,
+  # +1 when a replica doesn't have the user yet and the primary is asked
+  ("POST", "/auth/signin"): 2,
+  ("GET", "/auth/signout"): 0,
+  # Routes using the questionnaire also re-read its fingerprint every
+  # QUESTIONNAIRE_CHECK_INTERVAL, +1 for the snapshot / scoring engine when it changed.
+  # Served from the snapshot otherwise
+  ("GET", "/questions/"): 2,
+  # Routes behind current_user_id: +1 for the user lookup when it isn't cached
+  ("POST", "/questions/submit"): 6,
+  # Factor points + latest metrics, responses, factor update, metrics row
+  ("PATCH", "/questions/submit"): 7,
+  # Scored in memory otherwise
+  ("POST", "/questions/what-if"): 2,
+  # Cached: latest metrics id only; first call: + recommendation, metrics row, insert
+  ("GET", "/portfolio/"): 5,
+  # Latest metrics id, + the metrics row when the recommendation isn't cached
+  ("GET", "/portfolio/projection"): 3,
+  # Next-page cursor, then the streamed page
+  ("GET", "/export/{kind}"): 3,
+  # Served from the NAV store and the backtest cache, never the database
+  ("GET", "/finance/instruments/{symbol}/history"): 0,
+  ("GET", "/finance/backtest"): 0,
+}
+
+# Routes that repeat statements by design, e.g. once per batch, and are not N+1 suspects
+QUERY_REPEAT_EXEMPT = {("POST", "/internal/onboarding")}
+
+# IN lists rendered with one placeholder per value; collapsed so the shape doesn't depend
+# on the number of values
+IN_LIST = re.compile(r"\bIN \((?:[^()]|\([^()]*\))*\)", re.IGNORECASE)
+WHITESPACE = re.compile(r"\s+")
+
+def statement_shape(statement: str) -> str:
+  return IN_LIST.sub("IN (...)", WHITESPACE.sub(" ", statement)).strip()
+
+class RequestQueries:
+  # Statements executed while serving one request. Shapes are only normalized when the
+  # request is finished.
+  __slots__ = ("statements", "writes", "seconds", "texts")
+
+  def __init__(self):
+    self.statements = 0
+    # INSERT / UPDATE / DELETE statements among them
+    self.writes = 0
+    self.seconds = 0.0
+    self.texts: Counter = Counter()
+
+  def record(self, statement: str, seconds: float, write: bool):
+    # An executemany is one round trip
+    self.statements += 1
+    if write:
+      self.writes += 1
+    self.seconds += seconds
+    self.texts[statement] += 1
+
+  def repeated(self, threshold: int = QUERY_REPEAT_THRESHOLD) -> List[Tuple[str, int]]:
+    shapes = Counter()
+    for text, count in self.texts.items():
+      shapes[statement_shape(text)] += count
+    return [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
+
+  def server_timing(self) -> str:
+    return f'db;dur={self.seconds * 1000:.2f};desc="{self.statements} statements"'
+
+# Set per request by the middleware, like db_pool.request_pool_usage
+request_queries: ContextVar[Optional[RequestQueries]] = ContextVar("request_queries", default=None)
+
+# ---------------------------
+# Engine events
+# ---------------------------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  if request_queries.get() is not None:
+    context._query_started_at = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  queries = request_queries.get()
+  if queries is None:
+    return
+  started_at = getattr(context, "_query_started_at", None)
+  seconds = time.perf_counter() - started_at if started_at is not None else 0.0
+  queries.record(statement, seconds, context.isinsert or context.isupdate or context.isdelete)
+
+def instrument(engine):
+  event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+  event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def record_statement(statement: str, seconds: float, write: bool = False):
+  # For statements sent on a raw DBAPI cursor (e.g. COPY), which the engine events above
+  # never see
+  queries = request_queries.get()
+  if queries is not None:
+    queries.record(statement, seconds, write)
+
+# ---------------------------
+# Budgets
+# ---------------------------
+class QueryBudgetExceeded(AssertionError):
+  pass
+
+_recorders: List["query_budget"] = []
+
+def finish_request(method: str, route: str, queries: RequestQueries) -> Tuple[int, bool]:
+  # Called by the middleware once a request is done. Logs repeated statement shapes and
+  # budget overruns; returns (number of repeated shapes, over budget).
+  repeated = [] if (method, route) in QUERY_REPEAT_EXEMPT else queries.repeated()
+  for shape, count in repeated:
+    logger.warning("Possible N+1 on %s %s: %d x %s", method, route, count, shape)
+  budget = QUERY_BUDGETS.get((method, route))
+  over_budget = budget is not None and queries.statements > budget
+  if over_budget:
+    logger.warning("%s %s issued %d statements (budget %d)", method, route, queries.statements, budget)
+  for recorder in _recorders:
+    recorder.requests.append((method, route, queries))
+  return len(repeated), over_budget
+
+class query_budget:
+  # For tests: records every request finished inside the block and fails on exit if one
+  # went over its budget (QUERY_BUDGETS, or `max_statements` for all of them) or repeated a
+  # statement shape. Works with TestClient, which serves requests on another thread.
+  #
+  #   with query_budget() as budget:
+  #     client.post("/questions/submit", json=answers)
+  #   assert budget.requests[0][2].statements == 2
+
+  def __init__(self, max_statements: Optional[int] = None, allow_repeats: bool = False):
+    self.max_statements = max_statements
+    self.allow_repeats = allow_repeats
+    self.requests: List[Tuple[str, str, RequestQueries]] = []
+
+  def __enter__(self):
+    _recorders.append(self)
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    _recorders.remove(self)
+    if exc_type is not None:
+      return False
+    problems = []
+    for method, route, queries in self.requests:
+      budget = self.max_statements if self.max_statements is not None else QUERY_BUDGETS.get((method, route))
+      if budget is not None and queries.statements > budget:
+        problems.append(f"{method} {route}: {queries.statements} statements, budget {budget}")
+      if not self.allow_repeats:
+        for shape, count in queries.repeated():
+          problems.append(f"{method} {route}: {count} x {shape}")
+    if problems:
+      raise QueryBudgetExceeded("\n".join(problems))
+    return False
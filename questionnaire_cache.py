@@ -0,0 +1,117 @@
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import func, select, update
+from logger import logger
+from models import Questions
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+load_dotenv()
+
+# How often (seconds) each worker compares the Questions table's fingerprint against the
+# one its caches were built from
+QUESTIONNAIRE_CHECK_INTERVAL = float(os.getenv("QUESTIONNAIRE_CHECK_INTERVAL", "5"))
+# Shorter interval used when a submission references a question this worker doesn't know
+QUESTIONNAIRE_RECHECK_INTERVAL = float(os.getenv("QUESTIONNAIRE_RECHECK_INTERVAL", "1"))
+
+# ---------------------------
+# Questionnaire version
+# ---------------------------
+# Everything derived from the Questions table (the encoded GET /questions/ body, the
+# scoring engine) is tagged with this version and rebuilt when it moves on. The version
+# follows the table itself: its fingerprint (row count, latest updated_at) is re-read at
+# most every QUESTIONNAIRE_CHECK_INTERVAL seconds, so an edit made anywhere (another
+# worker, a migration, a script) reaches every worker within that time. ORM edits bump
+# updated_at on their own; anything else should call touch_questionnaire() or
+# POST /internal/questionnaire/refresh afterwards.
+_version = 0
+_fingerprint: Optional[Tuple] = None
+_checked_at = float("-inf")
+_lock = threading.Lock()
+
+def questionnaire_version() -> int:
+  return _version
+
+def questionnaire_fingerprint(db) -> Tuple:
+  return tuple(db.execute(select(func.count(Questions.id), func.max(Questions.updated_at))).one())
+
+def refresh_questionnaire_version(db, max_age: float = QUESTIONNAIRE_CHECK_INTERVAL) -> int:
+  # The current version, after re-reading the fingerprint if the last read is older than
+  # max_age seconds. The version moves on whenever the fingerprint changes.
+  global _version, _fingerprint, _checked_at
+  if time.monotonic() - _checked_at < max_age:
+    return _version
+  fingerprint = questionnaire_fingerprint(db)
+  with _lock:
+    _checked_at = time.monotonic()
+    if fingerprint != _fingerprint:
+      _fingerprint = fingerprint
+      _version += 1
+      logger.info("Questionnaire changed (version %d)", _version)
+    return _version
+
+def invalidate_questionnaire():
+  # This process only: its next lookup re-reads the fingerprint, whatever its age
+  global _checked_at
+  with _lock:
+    _checked_at = float("-inf")
+
+def touch_questionnaire(db):
+  # For edits that bypass the ORM (raw SQL, bulk updates): bumps updated_at so every
+  # worker sees a new fingerprint. Commits.
+  db.execute(update(Questions).values(updated_at=datetime.now(timezone.utc)))
+  db.commit()
+  invalidate_questionnaire()
+
+# ---------------------------
+# Encoded questionnaire
+# ---------------------------
+class QuestionnaireSnapshot:
+  def __init__(self, body: bytes, version: int):
+    self.body = body
+    self.version = version
+    self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def encode_questions(questions: List[Questions]) -> bytes:
+  # Same shape and encoding FastAPI produces for List[QuestionResponse].
+  content = [
+    {
+      "id": str(item.id),
+      "text": item.text,
+      "input_type": item.input_type.value,
+      "possible_inputs": item.options,
+      "display_order": item.display_order,
+    }
+    for item in questions
+  ]
+  return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+_snapshot: Optional[QuestionnaireSnapshot] = None
+_snapshot_lock = threading.Lock()
+
+def get_questionnaire_snapshot(db) -> QuestionnaireSnapshot:
+  global _snapshot
+  version = refresh_questionnaire_version(db)
+  snapshot = _snapshot
+  if snapshot is not None and snapshot.version == version:
+    return snapshot
+  with _snapshot_lock:
+    if _snapshot is None or _snapshot.version != version:
+      questions = db.query(Questions).order_by(Questions.display_order).all()
+      _snapshot = QuestionnaireSnapshot(encode_questions(questions), version)
+      logger.info("Questionnaire cached (version %d, etag %s)", version, _snapshot.etag)
+    return _snapshot
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+  if not if_none_match:
+    return False
+  for candidate in if_none_match.split(","):
+    candidate = candidate.strip()
+    if candidate == "*" or candidate.removeprefix("W/") == etag:
+      return True
+  return False
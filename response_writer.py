@@ -0,0 +1,212 @@
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError, OperationalError, SQLAlchemyError
+from logger import logger
+
+import os
+import threading
+import time
+
+load_dotenv()
+
+# Opt-in: when enabled, POST/PATCH /questions/submit return once the scores are committed
+# and their InvestorResponse rows are written shortly after, in batches shared across
+# requests. Rows still queued when the process dies are lost.
+RESPONSE_WRITE_BEHIND = os.getenv("RESPONSE_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+RESPONSE_BATCH_SIZE = int(os.getenv("RESPONSE_BATCH_SIZE", "500"))
+# Longest a queued row waits before its batch is written, in seconds
+RESPONSE_FLUSH_INTERVAL = float(os.getenv("RESPONSE_FLUSH_INTERVAL", "0.05"))
+RESPONSE_QUEUE_MAX_ROWS = int(os.getenv("RESPONSE_QUEUE_MAX_ROWS", "20000"))
+# How long a submission waits for queue space before it is turned away with a 503
+RESPONSE_ENQUEUE_TIMEOUT = float(os.getenv("RESPONSE_ENQUEUE_TIMEOUT", "1"))
+
+class ResponseQueueFull(Exception):
+  pass
+
+def is_transient(error: SQLAlchemyError) -> bool:
+  # Failures of the database or the connection, worth retrying as they are; anything else
+  # (constraint violations, bad data) fails the same way every time.
+  return isinstance(error, OperationalError) or (isinstance(error, DBAPIError) and error.connection_invalidated)
+
+class ResponseWriter:
+  # Bounded queue of InvestorResponse rows drained by one background thread. Request
+  # threads reserve room before committing their own transaction and queue the rows only
+  # once it has committed; rows count against `max_rows` until their batch is written, so
+  # the bound covers everything held in memory.
+
+  def __init__(
+    self,
+    enabled: bool = RESPONSE_WRITE_BEHIND,
+    batch_size: int = RESPONSE_BATCH_SIZE,
+    flush_interval: float = RESPONSE_FLUSH_INTERVAL,
+    max_rows: int = RESPONSE_QUEUE_MAX_ROWS,
+    enqueue_timeout: float = RESPONSE_ENQUEUE_TIMEOUT,
+  ):
+    self.enabled = enabled
+    self.batch_size = batch_size
+    self.flush_interval = flush_interval
+    self.max_rows = max_rows
+    self.enqueue_timeout = enqueue_timeout
+    # (enqueued at, rows) per submission, oldest first
+    self._pending: "deque" = deque()
+    self._held = 0  # rows reserved, queued or being written
+    self._cond = threading.Condition()
+    self._thread: Optional[threading.Thread] = None
+    self._closing = False
+    self.batches = 0
+    self.rows_written = 0
+    self.rejected = 0
+    self.failures = 0
+    self.dropped = 0
+    self.last_lag_seconds = 0.0
+    self.max_lag_seconds = 0.0
+
+  # Lifecycle
+  def start(self):
+    if self.enabled and self._thread is None:
+      self._closing = False
+      self._thread = threading.Thread(target=self._run, name="response-writer", daemon=True)
+      self._thread.start()
+
+  def shutdown(self):
+    # Writes everything still queued, then stops the thread.
+    if self._thread is None:
+      return
+    with self._cond:
+      self._closing = True
+      self._cond.notify_all()
+    self._thread.join()
+    self._thread = None
+
+  # Request path
+  @contextmanager
+  def deferred(self, rows: List[Dict]):
+    # Reserves room for `rows` (ResponseQueueFull if none frees up within enqueue_timeout)
+    # and queues them when the block exits cleanly, i.e. after the caller's commit.
+    count = len(rows)
+    with self._cond:
+      if not self._cond.wait_for(lambda: self._held + count <= self.max_rows, timeout=self.enqueue_timeout):
+        self.rejected += 1
+        raise ResponseQueueFull()
+      self._held += count
+    try:
+      yield
+    except BaseException:
+      with self._cond:
+        self._held -= count
+        self._cond.notify_all()
+      raise
+    if self._thread is None:
+      # Not started (e.g. outside the app's lifespan): nothing would drain the queue
+      try:
+        self._write(rows)
+      finally:
+        with self._cond:
+          self._held -= count
+          self._cond.notify_all()
+      return
+    with self._cond:
+      self._pending.append((time.monotonic(), rows))
+      self._cond.notify_all()
+
+  # Background thread
+  def _run(self):
+    while True:
+      with self._cond:
+        self._cond.wait_for(lambda: self._pending or self._closing)
+        if not self._pending:
+          return
+        deadline = self._pending[0][0] + self.flush_interval
+        while not self._closing and self._queued_rows() < self.batch_size:
+          remaining = deadline - time.monotonic()
+          if remaining <= 0:
+            break
+          self._cond.wait(remaining)
+        batch, oldest = self._take()
+      self._flush(batch, oldest)
+
+  def _queued_rows(self) -> int:
+    return sum(len(rows) for _, rows in self._pending)
+
+  def _take(self):
+    # Whole submissions, oldest first, up to batch_size rows (at least one submission)
+    batch = []
+    oldest = self._pending[0][0]
+    while self._pending and (not batch or len(batch) + len(self._pending[0][1]) <= self.batch_size):
+      batch.extend(self._pending.popleft()[1])
+    return batch, oldest
+
+  def _flush(self, batch: List[Dict], oldest: float):
+    written = self._write_rows(batch)
+    lag = time.monotonic() - oldest
+    with self._cond:
+      self._held -= len(batch)
+      if written:
+        self.batches += 1
+        self.rows_written += written
+      self.last_lag_seconds = lag
+      self.max_lag_seconds = max(self.max_lag_seconds, lag)
+      self._cond.notify_all()
+
+  def _write_rows(self, rows: List[Dict]) -> int:
+    # Returns how many rows were written. Transient failures are retried with backoff while
+    # the app is running (the queue fills up and submissions get 503s meanwhile), and given
+    # up after a few attempts once it is shutting down. Other failures are down to some of
+    # the rows: the batch is split in halves until the failing rows are found, and those
+    # are logged in full and dropped.
+    attempts = 0
+    while True:
+      try:
+        self._write(rows)
+        return len(rows)
+      except SQLAlchemyError as e:
+        with self._cond:
+          self.failures += 1
+        if not is_transient(e):
+          if len(rows) == 1:
+            logger.error("Dropping queued response %r: %s", rows[0], e)
+            with self._cond:
+              self.dropped += 1
+            return 0
+          logger.warning("Writing %d queued responses failed, splitting the batch: %s", len(rows), e)
+          middle = len(rows) // 2
+          return self._write_rows(rows[:middle]) + self._write_rows(rows[middle:])
+        attempts += 1
+        logger.exception("Writing %d queued responses failed (attempt %d)", len(rows), attempts)
+        with self._cond:
+          if self._closing and attempts >= 3:
+            self.dropped += len(rows)
+            logger.error("Dropping %d queued responses at shutdown", len(rows))
+            return 0
+        time.sleep(min(0.1 * 2 ** attempts, 5))
+
+  def _write(self, rows: List[Dict]):
+    # Imported here so this module does not pull in the engine at import time
+    from database import engine
+    from models import InvestorResponse
+    with engine.begin() as connection:
+      connection.execute(insert(InvestorResponse), rows)
+
+  def stats(self) -> Dict[str, float]:
+    with self._cond:
+      oldest = self._pending[0][0] if self._pending else None
+      return {
+        "enabled": int(self.enabled),
+        "held_rows": self._held,
+        "queued_rows": self._queued_rows(),
+        "max_rows": self.max_rows,
+        "batches": self.batches,
+        "rows_written": self.rows_written,
+        "rejected": self.rejected,
+        "failures": self.failures,
+        "dropped": self.dropped,
+        # Age of the oldest row still waiting, and write lag of the last / slowest batch
+        "lag_seconds": time.monotonic() - oldest if oldest is not None else 0.0,
+        "last_lag_seconds": self.last_lag_seconds,
+        "max_lag_seconds": self.max_lag_seconds,
+      }
+
+response_writer = ResponseWriter()
@@ -0,0 +1,266 @@
+from typing import Dict, Optional
+from dotenv import load_dotenv
+from redis.exceptions import RedisError
+from logger import logger
+from jwt_cache import token_digest
+
+import asyncio
+import os
+import time
+import redis.asyncio as aioredis
+
+load_dotenv()
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "0.5"))
+REDIS_BREAKER_FAILURES = int(os.getenv("REDIS_BREAKER_FAILURES", "3"))
+REDIS_BREAKER_RESET_SECONDS = float(os.getenv("REDIS_BREAKER_RESET_SECONDS", "30"))
+REVOCATION_BLOOM_BITS = int(os.getenv("REVOCATION_BLOOM_BITS", "0"))
+# The previous version blacklisted the raw token as the key (`SETEX <token> <ttl>
+# blacklisted`) and published nothing. For this many seconds after startup, which covers
+# a rolling deploy plus the 30-minute token lifetime, each sync copies those keys into
+# the local set, and lookups made before the first sync check them too. Synced lookups
+# never go to Redis either way. 0 turns it off.
+REVOCATION_LEGACY_SECONDS = float(os.getenv("REVOCATION_LEGACY_SECONDS", "3600"))
+
+REVOCATION_CHANNEL = "revocations"
+REVOCATION_KEY_PREFIX = "revoked:"
+PRUNE_INTERVAL_SECONDS = 60
+# Legacy keys are bare JWTs, whose base64url header always starts like this
+LEGACY_KEY_PATTERN = "eyJ*"
+
+# ---------------------------
+# Circuit breaker
+# ---------------------------
+class CircuitBreaker:
+  # Closed until `failure_threshold` consecutive failures, then open for `reset_timeout`
+  # seconds, after which calls are let through again (half-open) until one succeeds
+  # or fails.
+
+  def __init__(self, failure_threshold: int = REDIS_BREAKER_FAILURES, reset_timeout: float = REDIS_BREAKER_RESET_SECONDS):
+    self.failure_threshold = failure_threshold
+    self.reset_timeout = reset_timeout
+    self.failures = 0
+    self.opened_at: Optional[float] = None
+
+  @property
+  def state(self) -> str:
+    if self.opened_at is None:
+      return "closed"
+    if time.monotonic() - self.opened_at >= self.reset_timeout:
+      return "half_open"
+    return "open"
+
+  def allow(self) -> bool:
+    return self.state != "open"
+
+  def record_success(self):
+    self.failures = 0
+    self.opened_at = None
+
+  def record_failure(self):
+    self.failures += 1
+    if self.failures >= self.failure_threshold:
+      self.opened_at = time.monotonic()
+
+# ---------------------------
+# Bloom filter
+# ---------------------------
+class BloomFilter:
+  # Fixed-size Bloom filter over token digests; positions are taken straight from the
+  # digest bytes, so no extra hashing is needed.
+
+  def __init__(self, bits: int, hashes: int = 4):
+    self.bits = bits
+    self.hashes = min(hashes, 8)
+    self._array = bytearray((bits + 7) // 8)
+
+  def _positions(self, digest: bytes):
+    for i in range(self.hashes):
+      yield int.from_bytes(digest[i * 4:(i + 1) * 4], "big") % self.bits
+
+  def add(self, digest: bytes):
+    for position in self._positions(digest):
+      self._array[position >> 3] |= 1 << (position & 7)
+
+  def __contains__(self, digest: bytes) -> bool:
+    return all(self._array[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+# ---------------------------
+# Revocation store
+# ---------------------------
+class RevocationStore:
+  # Signed-out tokens, held locally as digest -> expiry and shared between workers
+  # through Redis: each revocation is written to `revoked:<digest>` with the token's
+  # remaining lifetime and published on the `revocations` channel.
+  #
+  # While the pub/sub listener is connected the local set is authoritative and requests
+  # never wait on Redis. While it is not (startup, reconnects), lookups that miss
+  # locally ask Redis directly. Redis failures trip the circuit breaker, and while it is
+  # open the store runs on local state only.
+
+  def __init__(self, client=None, bloom_bits: int = REVOCATION_BLOOM_BITS, legacy_seconds: float = REVOCATION_LEGACY_SECONDS):
+    self.client = client
+    self.breaker = CircuitBreaker()
+    self.synced = False
+    self._revoked: Dict[bytes, float] = {}
+    self._bloom_bits = bloom_bits
+    self._bloom = BloomFilter(bloom_bits) if bloom_bits else None
+    self._next_prune = time.monotonic() + PRUNE_INTERVAL_SECONDS
+    self._listener: Optional[asyncio.Task] = None
+    self._legacy_until = time.monotonic() + legacy_seconds
+
+  @property
+  def legacy(self) -> bool:
+    return time.monotonic() < self._legacy_until
+
+  # Local state
+  def _add(self, digest: bytes, expires_at: float):
+    if expires_at <= time.time():
+      return
+    self._revoked[digest] = expires_at
+    if self._bloom is not None:
+      self._bloom.add(digest)
+
+  def _prune(self):
+    now = time.time()
+    self._revoked = {digest: expires_at for digest, expires_at in self._revoked.items() if expires_at > now}
+    if self._bloom is not None:
+      self._bloom = BloomFilter(self._bloom_bits)
+      for digest in self._revoked:
+        self._bloom.add(digest)
+    self._next_prune = time.monotonic() + PRUNE_INTERVAL_SECONDS
+
+  def _is_revoked_locally(self, digest: bytes) -> bool:
+    if time.monotonic() >= self._next_prune:
+      self._prune()
+    if self._bloom is not None and digest not in self._bloom:
+      return False
+    expires_at = self._revoked.get(digest)
+    return expires_at is not None and expires_at > time.time()
+
+  def _record_failure(self, error: Exception):
+    self.breaker.record_failure()
+    logger.warning("Redis unavailable for token revocation (%s): %r", self.breaker.state, error)
+
+  def _apply(self, data):
+    if isinstance(data, bytes):
+      data = data.decode("ascii")
+    digest_hex, _, expires_at = data.partition(":")
+    try:
+      self._add(bytes.fromhex(digest_hex), float(expires_at))
+    except ValueError:
+      logger.warning("Ignoring malformed revocation message: %r", data)
+
+  # Request path
+  async def is_revoked(self, token: str) -> bool:
+    digest = token_digest(token)
+    if self._is_revoked_locally(digest):
+      return True
+    if self.synced or self.client is None or not self.breaker.allow():
+      return False
+    keys = [REVOCATION_KEY_PREFIX + digest.hex()] + ([token] if self.legacy else [])
+    try:
+      found = await asyncio.wait_for(self.client.exists(*keys), REDIS_TIMEOUT)
+    except (RedisError, OSError, asyncio.TimeoutError) as e:
+      self._record_failure(e)
+      return False
+    self.breaker.record_success()
+    return bool(found)
+
+  async def revoke(self, token: str, expires_at: float):
+    digest = token_digest(token)
+    self._add(digest, expires_at)
+
+    ttl_seconds = int(expires_at - time.time())
+    if ttl_seconds <= 0 or self.client is None:
+      return
+    if not self.breaker.allow():
+      logger.warning("Token revoked locally only; Redis circuit is open")
+      return
+    try:
+      async with self.client.pipeline(transaction=False) as pipe:
+        pipe.set(REVOCATION_KEY_PREFIX + digest.hex(), 1, ex=ttl_seconds)
+        pipe.publish(REVOCATION_CHANNEL, f"{digest.hex()}:{expires_at}")
+        await asyncio.wait_for(pipe.execute(), REDIS_TIMEOUT)
+    except (RedisError, OSError, asyncio.TimeoutError) as e:
+      self._record_failure(e)
+      return
+    self.breaker.record_success()
+
+  # Cross-worker sync
+  async def _scan_with_ttls(self, pattern: str):
+    # (key, remaining milliseconds) for every live key matching `pattern`
+    keys = [key async for key in self.client.scan_iter(match=pattern, count=1000)]
+    if not keys:
+      return []
+    async with self.client.pipeline(transaction=False) as pipe:
+      for key in keys:
+        pipe.pttl(key)
+      ttls = await pipe.execute()
+    return [(key.decode("ascii") if isinstance(key, bytes) else key, ttl_ms) for key, ttl_ms in zip(keys, ttls) if ttl_ms > 0]
+
+  async def _load_existing(self):
+    now = time.time()
+    for key, ttl_ms in await self._scan_with_ttls(REVOCATION_KEY_PREFIX + "*"):
+      self._apply(f"{key[len(REVOCATION_KEY_PREFIX):]}:{now + ttl_ms / 1000}")
+    if self.legacy:
+      await self._copy_legacy()
+
+  async def _copy_legacy(self):
+    # Raw-token keys written by the previous version: applied locally and copied to
+    # `revoked:<digest>` for workers started after the legacy window. The originals are
+    # left to expire, since workers still on the previous version read them.
+    keys = await self._scan_with_ttls(LEGACY_KEY_PATTERN)
+    if not keys:
+      return
+    now = time.time()
+    async with self.client.pipeline(transaction=False) as pipe:
+      for key, ttl_ms in keys:
+        digest = token_digest(key)
+        self._add(digest, now + ttl_ms / 1000)
+        pipe.set(REVOCATION_KEY_PREFIX + digest.hex(), 1, px=ttl_ms)
+      await pipe.execute()
+    logger.info("Copied %d legacy token revocations", len(keys))
+
+  async def _listen(self):
+    backoff = 1
+    while True:
+      pubsub = self.client.pubsub()
+      try:
+        # Subscribe before loading so nothing published in between is missed.
+        await pubsub.subscribe(REVOCATION_CHANNEL)
+        await self._load_existing()
+        self.synced = True
+        self.breaker.record_success()
+        backoff = 1
+        logger.info("Token revocations synced (%d active)", len(self._revoked))
+        async for message in pubsub.listen():
+          if message["type"] == "message":
+            self._apply(message["data"])
+      except (RedisError, OSError) as e:
+        self._record_failure(e)
+      finally:
+        self.synced = False
+        try:
+          await pubsub.aclose()
+        except (RedisError, OSError):
+          pass
+      await asyncio.sleep(backoff)
+      backoff = min(backoff * 2, 30)
+
+  async def start(self):
+    if self.client is not None and self._listener is None:
+      self._listener = asyncio.create_task(self._listen())
+
+  async def stop(self):
+    if self._listener is not None:
+      self._listener.cancel()
+      try:
+        await self._listener
+      except asyncio.CancelledError:
+        pass
+      self._listener = None
+    self.synced = False
+
+revocation_store = RevocationStore(aioredis.from_url(REDIS_URL, socket_connect_timeout=REDIS_TIMEOUT))
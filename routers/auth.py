@@ -1,18 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from database import get_db
+from database import get_db, get_read_db, engine, SessionLocal
 from models import User
 from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
 from typing import Dict, Any
 from logger import logger
+from jwt_cache import token_cache
+from revocation import revocation_store
+from password_pool import password_pool, PasswordPoolBusy
 
 import os
 import jwt
-import redis
+import uuid
 
 load_dotenv()
 
@@ -23,11 +26,6 @@ COOKIE_NAME = "jwt_token"
 # Create the APIRouter instance
 router = APIRouter()
 
-r = redis.Redis(host="localhost", port=6379, db=0)
-
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # ---------------------------
 # Pydantic Schemas
 # ---------------------------
@@ -48,19 +46,46 @@ class AuthResponse(BaseModel):
 # ---------------------------
 # Helper Functions
 # ---------------------------
-def hash_password(password: str) -> str:
-  return pwd_context.hash(password)
+# bcrypt runs in the dedicated password pool; when its queue is full the request is
+# turned away straight away rather than queueing behind a login storm.
+def password_pool_busy() -> HTTPException:
+  logger.warning("Password pool saturated, rejecting request")
+  return HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Too many sign-in attempts, please retry shortly.",
+    headers={"Retry-After": "1"}
+  )
+
+async def hash_password(password: str) -> str:
+  try:
+    return await password_pool.hash(password)
+  except PasswordPoolBusy:
+    raise password_pool_busy()
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+  try:
+    return await password_pool.verify(plain_password, hashed_password)
+  except PasswordPoolBusy:
+    raise password_pool_busy()
+
+def get_user_by_username(db: Session, username: str):
+  return db.query(User).filter(User.username == username).first()
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-  return pwd_context.verify(plain_password, hashed_password)
+def save_user(db: Session, user: User):
+  # The id is assigned up front, so nothing needs reading back after the commit
+  db.add(user)
+  db.commit()
 
-def generate_jwt_token(username: str, secret_key: str, algorithm:str) -> str:
+def generate_jwt_token(username: str, secret_key: str, algorithm:str, user_id=None) -> str:
   payload = {
       "username": username,
       "exp": datetime.now(timezone.utc) + timedelta(minutes=30)
     }
+  if user_id is not None:
+    # Checked by protected routes against the account the username resolves to
+    # (identity.current_user_id)
+    payload["user_id"] = str(user_id)
 
-  jwt_token = jwt.encode(payload, secret_key, algorithm=algorithm)
   return jwt.encode(payload, secret_key, algorithm=algorithm)
 
 # ---------------------------
@@ -68,29 +93,29 @@ def generate_jwt_token(username: str, secret_key: str, algorithm:str) -> str:
 # ---------------------------
 
 @router.post("/signup", response_model=AuthResponse)
-def sign_up(response: Response, payload: SignUpRequest, db: Session = Depends(get_db)):
-  logger.info(f"Signup attempt for username: {payload.username}")
+async def sign_up(response: Response, payload: SignUpRequest, db: Session = Depends(get_db)):
+  logger.info("Signup attempt for username: %s", payload.username)
   
-  existing_user = db.query(User).filter(User.username == payload.username).first()
+  existing_user = await run_in_threadpool(get_user_by_username, db, payload.username)
   if existing_user:
-    logger.warning(f"Signup failed - username already exists: {payload.username}")
+    logger.warning("Signup failed - username already exists: %s", payload.username)
     raise HTTPException(
       status_code=status.HTTP_400_BAD_REQUEST,
       detail="Username already taken."
     )
 
-  hashed_pw = hash_password(payload.password)
+  hashed_pw = await hash_password(payload.password)
 
+  user_id = uuid.uuid4()
   new_user = User(
+    id=user_id,
     username=payload.username,
     email=payload.email,
     password_hash=hashed_pw
   )
-  db.add(new_user)
-  db.commit()
-  db.refresh(new_user)
+  await run_in_threadpool(save_user, db, new_user)
 
-  token = generate_jwt_token(new_user.username, JWT_SECRET_KEY, JWT_ALGORITHM)
+  token = generate_jwt_token(payload.username, JWT_SECRET_KEY, JWT_ALGORITHM, user_id)
 
   response.set_cookie(
       key="jwt_token",
@@ -100,25 +125,30 @@ def sign_up(response: Response, payload: SignUpRequest, db: Session = Depends(ge
       samesite="lax" ## Change in PROD
   )
 
-  logger.info(f"Successfully created new user: {payload.username}")
+  logger.info("Successfully created new user: %s", payload.username)
 
   return AuthResponse(
-    username=new_user.username,
+    username=payload.username,
     message="User created successfully.",
     # token=token
   )
 
 @router.post("/signin", response_model=AuthResponse)
-def sign_in(response: Response, payload: SignInRequest, db: Session = Depends(get_db)):
-
-  user = db.query(User).filter(User.username == payload.username).first()
-  if not user or not verify_password(payload.password, user.password_hash):
+async def sign_in(response: Response, payload: SignInRequest, db: Session = Depends(get_read_db)):
+
+  user = await run_in_threadpool(get_user_by_username, db, payload.username)
+  if user is None and db.get_bind() is not engine:
+    # Read from a replica: the account may have been created moments ago on another client
+    # and not be replicated yet
+    with SessionLocal() as primary_db:
+      user = await run_in_threadpool(get_user_by_username, primary_db, payload.username)
+  if not user or not await verify_password(payload.password, user.password_hash):
     raise HTTPException(
       status_code=status.HTTP_401_UNAUTHORIZED,
       detail="Invalid username or password."
     )
   
-  token = generate_jwt_token(user.username, JWT_SECRET_KEY, JWT_ALGORITHM)
+  token = generate_jwt_token(user.username, JWT_SECRET_KEY, JWT_ALGORITHM, user.id)
 
   response.set_cookie(
       key="jwt_token",
@@ -136,7 +166,7 @@ def sign_in(response: Response, payload: SignInRequest, db: Session = Depends(ge
 
 
 @router.get("/signout")
-def sign_out(request: Request):
+async def sign_out(request: Request):
   headers = request.headers
   # token = headers.get("Authorization").replace("Bearer ", "")
   token = request.cookies.get("jwt_token")
@@ -170,7 +200,8 @@ def sign_out(request: Request):
       status_code=401
     )
   
-  r.setex(token, ttl_seconds, "blacklisted")
+  await revocation_store.revoke(token, exp_timestamp)
+  token_cache.revoke(token)
   return JSONResponse(
       content={"message": "User signed out!"},
       status_code=200
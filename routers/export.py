@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+from logger import logger
+from database import get_read_db
+from identity import current_user_id
+from export import EXPORTS, FORMATS, export_query, export_stream, next_page_after
+
+import uuid
+
+router = APIRouter()
+
+# ---------------------------
+# Routes
+# ---------------------------
+@router.get("/{kind}")
+def export_history(
+  request: Request,
+  kind: str,
+  output_format: str = Query("ndjson", alias="format"),
+  after: Optional[int] = None,
+  limit: int = Query(1000, ge=1, le=10000),
+  db: Session = Depends(get_read_db),
+  user_id: uuid.UUID = Depends(current_user_id)
+):
+  # One page of the user's responses / metrics / recommendations history, oldest first.
+  # When more rows follow, X-Next-After holds the `after` value for the next page.
+  if kind not in EXPORTS:
+    raise HTTPException(
+      status_code=status.HTTP_404_NOT_FOUND,
+      detail=f"Unknown export: {kind}"
+    )
+  if output_format not in FORMATS:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail=f"Unsupported format: {output_format}"
+    )
+
+  logger.info("Export of %s for username: %s", kind, request.state.username)
+
+  headers = {}
+  next_after = next_page_after(db, kind, user_id, after, limit)
+  if next_after is not None:
+    headers["X-Next-After"] = str(next_after)
+
+  return StreamingResponse(
+    # Streamed from the same database the cursor was read from
+    export_stream(kind, output_format, export_query(kind, user_id, after, limit), bind=db.get_bind()),
+    media_type=FORMATS[output_format],
+    headers=headers
+  )
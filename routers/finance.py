@@ -0,0 +1,110 @@
+from fastapi import APIRouter, HTTPException, Query, Response, status
+from datetime import date
+from typing import Optional
+from nav_store import nav_store, to_iso, UnknownInstrumentError, INSTRUMENT_KINDS
+from backtest import (
+  BACKTEST_EQUITY_SYMBOL, BACKTEST_FIXED_INCOME_SYMBOL, REBALANCE_FREQUENCIES,
+  NotEnoughHistoryError, band_allocation, run_backtest_json,
+)
+
+import json
+
+router = APIRouter()
+
+# ---------------------------
+# Helper Functions
+# ---------------------------
+def get_instrument(symbol: str):
+  try:
+    return nav_store.instrument(symbol)
+  except UnknownInstrumentError:
+    raise HTTPException(
+      status_code=status.HTTP_404_NOT_FOUND,
+      detail=f"Unknown instrument: {symbol}"
+    )
+
+# ---------------------------
+# Routes
+# ---------------------------
+@router.get("/instruments")
+def list_instruments(kind: Optional[str] = None):
+  # Funds and indices in the local NAV store (nav_store.py), with their date coverage
+  if kind is not None and kind not in INSTRUMENT_KINDS:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail=f"Unknown instrument kind: {kind}"
+    )
+  return nav_store.instruments(kind)
+
+@router.get("/instruments/{symbol}")
+def get_instrument_info(symbol: str):
+  return get_instrument(symbol)
+
+@router.get("/instruments/{symbol}/history")
+def get_history(symbol: str, start: Optional[date] = None, end: Optional[date] = None):
+  # Daily NAV / close from start to end (inclusive), read straight from the mapped columns.
+  # Encoded here rather than through the response model, which would walk every value.
+  if start is not None and end is not None and start > end:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail="start must not be after end."
+    )
+  instrument = get_instrument(symbol)
+  dates, values = nav_store.series(symbol, start, end)
+  body = json.dumps({
+    "symbol": symbol,
+    "kind": instrument["kind"],
+    "name": instrument["name"],
+    "dates": to_iso(dates),
+    "values": values.tolist(),
+  }, separators=(",", ":"))
+  return Response(content=body, media_type="application/json")
+
+@router.get("/backtest")
+def get_backtest(
+  band: Optional[str] = None,
+  equity: Optional[float] = Query(None, ge=0, le=100),
+  start: Optional[date] = None,
+  end: Optional[date] = None,
+  rebalance: str = "monthly",
+  rolling_years: float = Query(1.0, gt=0, le=30),
+  equity_symbol: str = BACKTEST_EQUITY_SYMBOL,
+  fixed_income_symbol: str = BACKTEST_FIXED_INCOME_SYMBOL
+):
+  # How a recommended band (e.g. band=Moderate Growth), or any equity percentage, would
+  # have done between start and end: equity curve, CAGR, volatility, max drawdown and
+  # rolling returns (see backtest.py). Results are memoized per parameters.
+  if (band is None) == (equity is None):
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail="Pass either band or equity."
+    )
+  if rebalance not in REBALANCE_FREQUENCIES:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail=f"rebalance must be one of {', '.join(REBALANCE_FREQUENCIES)}"
+    )
+  if start is not None and end is not None and start > end:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail="start must not be after end."
+    )
+  if band is not None:
+    try:
+      _, equity = band_allocation(band)
+    except KeyError:
+      raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Unknown band: {band}"
+      )
+  for symbol in (equity_symbol, fixed_income_symbol):
+    get_instrument(symbol)
+
+  try:
+    body = run_backtest_json(equity, start, end, rebalance, rolling_years, equity_symbol, fixed_income_symbol)
+  except NotEnoughHistoryError as e:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail=str(e)
+    )
+  return Response(content=body, media_type="application/json")
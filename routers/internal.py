@@ -0,0 +1,104 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from db_pool import pool_monitor
+from database import get_db, replica_router
+from password_pool import password_pool
+from jwt_cache import token_cache
+from portfolio_cache import portfolio_cache
+from response_writer import response_writer
+from nav_store import nav_store
+from backtest import backtest_cache_stats
+from projection import projection_cache_stats
+from metrics import request_metrics, render, render_stats, PROMETHEUS_CONTENT_TYPE
+from export import EXPORTS, FORMATS, export_query, export_stream
+from onboarding import Onboarding, OnboardingInputError, ONBOARDING_FORMATS
+from questionnaire_cache import touch_questionnaire, questionnaire_version
+
+import hmac
+import os
+
+load_dotenv()
+
+# Bearer token for the operational endpoints below; they are disabled when it is unset.
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN")
+
+router = APIRouter()
+
+# ---------------------------
+# Dependencies
+# ---------------------------
+def require_internal_token(request: Request):
+  if not INTERNAL_API_TOKEN:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+  scheme, _, token = request.headers.get("authorization", "").partition(" ")
+  if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), INTERNAL_API_TOKEN.encode()):
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid internal token")
+
+# ---------------------------
+# Routes
+# ---------------------------
+@router.get("/pool", dependencies=[Depends(require_internal_token)])
+def get_pool_stats():
+  # Database connection pool occupancy, overflow, timeouts and checkout wait/hold times
+  return pool_monitor.stats()
+
+@router.get("/metrics", dependencies=[Depends(require_internal_token)])
+async def get_metrics():
+  # Prometheus text format. Async so it renders on the event loop, where the request
+  # metrics are recorded.
+  body = render([
+    request_metrics.render(),
+    render_stats("db_pool", pool_monitor.stats(), "Database connection pool (db_pool.PoolMonitor)."),
+    render_stats("password_pool", password_pool.stats(), "bcrypt process pool (password_pool.PasswordPool)."),
+    render_stats("jwt_cache", token_cache.stats(), "Verified JWT cache (jwt_cache.VerifiedTokenCache)."),
+    render_stats("portfolio_cache", portfolio_cache.stats(), "Portfolio recommendation cache."),
+    render_stats("db_replicas", replica_router.stats(), "Read-only session routing (db_routing.ReplicaRouter)."),
+    render_stats("nav_store", nav_store.stats(), "Memory-mapped NAV / price store (nav_store.NavStore)."),
+    render_stats("backtest_cache", backtest_cache_stats(), "Memoized backtest results (backtest.py)."),
+    render_stats("projection_cache", projection_cache_stats(), "Memoized Monte Carlo projections (projection.py)."),
+    render_stats("response_writer", response_writer.stats(), "Write-behind questionnaire responses (response_writer.ResponseWriter)."),
+  ])
+  return Response(content=body, media_type=PROMETHEUS_CONTENT_TYPE)
+
+@router.get("/export/{kind}", dependencies=[Depends(require_internal_token)])
+def export_all(kind: str, output_format: str = Query("ndjson", alias="format")):
+  # Whole table for analytics, streamed from a server-side cursor in id order (on a
+  # replica when there are any)
+  if kind not in EXPORTS or output_format not in FORMATS:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+  return StreamingResponse(
+    export_stream(kind, output_format, export_query(kind), bind=replica_router.choose()),
+    media_type=FORMATS[output_format]
+  )
+
+@router.post("/onboarding", dependencies=[Depends(require_internal_token)])
+async def bulk_onboarding(request: Request, input_format: str = Query("csv", alias="format")):
+  # Bulk questionnaire submissions for many users (onboarding.py): the body is a CSV or
+  # NDJSON stream of user_id|username, question_id, response rows, grouped by user. It is
+  # read as it arrives and each chunk is scored and written off the event loop, so memory
+  # stays flat however large the upload. Returns the summary with per-row errors.
+  if input_format not in ONBOARDING_FORMATS:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail=f"format must be one of {', '.join(ONBOARDING_FORMATS)}"
+    )
+  onboarding = Onboarding(input_format)
+  try:
+    async for chunk in request.stream():
+      if chunk:
+        await run_in_threadpool(onboarding.feed, chunk)
+    return await run_in_threadpool(onboarding.finish)
+  except OnboardingInputError as e:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail=str(e)
+    )
+
+@router.post("/questionnaire/refresh", dependencies=[Depends(require_internal_token)])
+def refresh_questionnaire(db=Depends(get_db)):
+  # After editing questions outside the ORM: marks them updated, so every worker rebuilds
+  # its questionnaire snapshot and scoring engine within QUESTIONNAIRE_CHECK_INTERVAL
+  touch_questionnaire(db)
+  return {"version": questionnaire_version()}
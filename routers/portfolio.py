@@ -1,10 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Request
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.exc import IntegrityError
+from typing import Dict, List, Optional
 from logger import logger
 from database import get_db
-from models import User, FinancialMetrics, PortfolioRecommendation
+from identity import current_user_id
+from models import FinancialMetrics, PortfolioRecommendation
 from pydantic import BaseModel
+from scoring import final_score, select_portfolio
+from portfolio_cache import portfolio_cache
+from queries import get_latest_id
+from projection import MODES, project
+
+import uuid
 
 router = APIRouter()
 
@@ -17,75 +25,121 @@ class GeneratePortfolioResponse(BaseModel):
   equity_allocation: int
   fixed_income_allocation: int
 
+class ProjectionResponse(BaseModel):
+  portfolio_type: str
+  equity_allocation: int
+  fixed_income_allocation: int
+  mode: str
+  amount: float
+  years: int
+  paths: int
+  invested: float
+  # Final corpus at the 5th, 10th, 25th, 50th, 75th, 90th and 95th percentile (p5 ... p95)
+  percentiles: Dict[str, float]
+  # The same percentiles at the end of each year
+  yearly: List[Dict[str, float]]
+  target: Optional[float] = None
+  # Share of simulated paths ending at or above target
+  probability: Optional[float] = None
+
 class QuestionResponseItem(BaseModel):
   text: str
   response: str
   id: str
 
 
+# ---------------------------
+# Helper Functions
+# ---------------------------
+def portfolio_response(user_id: uuid.UUID, recommendation: PortfolioRecommendation) -> GeneratePortfolioResponse:
+  return GeneratePortfolioResponse(
+    user_id=str(user_id),
+    portfolio_type=recommendation.portfolio_type,
+    equity_allocation=recommendation.equity_allocation,
+    fixed_income_allocation=recommendation.fixed_income_allocation
+    )
+
 # ---------------------------
 # Routes
 # ---------------------------
 @router.get("/", response_model=GeneratePortfolioResponse)
-def generate_portfolio(request: Request, db: Session = Depends(get_db)):
+def generate_portfolio(request: Request, db: Session = Depends(get_db), user_id: uuid.UUID = Depends(current_user_id)):
+
+  logger.info("Get portfolio attempt for username: %s", request.state.username)
+
+  metrics_id = get_latest_id(db, FinancialMetrics, user_id)
+  if metrics_id is None:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail="Please fill the questionnaire!"
+    )
+
+  # A recommendation is derived once per metrics row; repeat calls read it back.
+  cached = portfolio_cache.get(user_id, metrics_id)
+  if cached is not None:
+    return cached
 
-  logger.info(f"Get portfolio attempt for username: {request.state.username}")
+  recommendation = db.query(PortfolioRecommendation).filter_by(financial_metrics_id=metrics_id).first()
+  if recommendation is None:
+    metrics = db.get(FinancialMetrics, metrics_id)
+    portfolio_type, equity, fixed_income = select_portfolio(final_score(metrics))
 
-  user = db.query(User).filter(User.username == request.state.username).first()
-  if not user:
+    recommendation = PortfolioRecommendation(
+      user_id=user_id,
+      financial_metrics_id=metrics_id,
+      portfolio_type=portfolio_type,
+      equity_allocation=equity,
+      fixed_income_allocation=fixed_income
+    )
+    # Built before the commit expires the instance, which would cost a refresh SELECT
+    result = portfolio_response(user_id, recommendation)
+
+    db.add(recommendation)
+    try:
+      db.commit()
+      logger.info("Portfolio generated for username: %s", request.state.username)
+    except IntegrityError:
+      # A concurrent request stored it first
+      db.rollback()
+      recommendation = db.query(PortfolioRecommendation).filter_by(financial_metrics_id=metrics_id).one()
+      result = portfolio_response(user_id, recommendation)
+  else:
+    result = portfolio_response(user_id, recommendation)
+
+  portfolio_cache.put(user_id, metrics_id, result)
+  return result
+
+@router.get("/projection", response_model=ProjectionResponse)
+def project_portfolio(
+  request: Request,
+  amount: float = Query(..., gt=0),
+  years: int = Query(..., ge=1, le=50),
+  mode: str = "sip",
+  target: Optional[float] = Query(None, gt=0),
+  db: Session = Depends(get_db),
+  user_id: uuid.UUID = Depends(current_user_id)
+):
+  # Monte Carlo range of outcomes for the user's recommended allocation: `amount` invested
+  # every month ("sip") or once ("lumpsum") for `years` (see projection.py). Read-only;
+  # unlike GET /portfolio/ it does not store a missing recommendation.
+  if mode not in MODES:
     raise HTTPException(
-      status_code=status.HTTP_401_UNAUTHORIZED,
-      detail="Invalid username or password."
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail=f"mode must be one of {', '.join(MODES)}"
     )
 
-  metrics = db.query(FinancialMetrics).filter_by(user_id=user.id).first()
-  if not metrics:
+  metrics_id = get_latest_id(db, FinancialMetrics, user_id)
+  if metrics_id is None:
     raise HTTPException(
       status_code=status.HTTP_400_BAD_REQUEST,
       detail="Please fill the questionnaire!"
     )
-  
-  final_score = (0.3 * metrics.risk_capacity) + (0.3 * metrics.risk_tolerance) + \
-                (0.15 * metrics.investing_potential) + (0.1 * metrics.liquidity_ratio) - \
-                (0.1 * metrics.debt_to_income_ratio) + (0.05 * metrics.investment_horizon_score)
-
-  # Determine portfolio type
-  if final_score < 30:
-      portfolio_type = "Ultra Conservative"
-      equity = 20
-      fixed_income = 80
-  elif final_score < 50:
-      portfolio_type = "Conservative"
-      equity = 35
-      fixed_income = 65
-  elif final_score < 70:
-      portfolio_type = "Moderate Growth"
-      equity = 50
-      fixed_income = 50
-  elif final_score < 85:
-      portfolio_type = "Aggressive Growth"
-      equity = 70
-      fixed_income = 30
+  cached = portfolio_cache.get(user_id, metrics_id)
+  if cached is not None:
+    portfolio_type, equity = cached.portfolio_type, cached.equity_allocation
   else:
-      portfolio_type = "High Growth"
-      equity = 90
-      fixed_income = 10
+    portfolio_type, equity, _ = select_portfolio(final_score(db.get(FinancialMetrics, metrics_id)))
 
-  recommendation = PortfolioRecommendation(
-    user_id=user.id,
-    portfolio_type=portfolio_type,
-    equity_allocation=equity,
-    fixed_income_allocation=fixed_income
-  )
+  logger.info("Projection for username: %s (%s, %s %s for %d years)", request.state.username, portfolio_type, mode, amount, years)
 
-  db.add(recommendation)
-  db.commit()
-
-  logger.info(f"Portfolio generated for username: {request.state.username}")
-
-  return GeneratePortfolioResponse(
-    user_id=str(user.id),
-    portfolio_type=portfolio_type,
-    equity_allocation=equity,
-    fixed_income_allocation=fixed_income
-    )
\ No newline at end of file
+  return ProjectionResponse(portfolio_type=portfolio_type, **project(equity, amount, years, mode, target))
@@ -1,10 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.exc import SQLAlchemyError
+from typing import Dict, List, Optional, Tuple
+from functools import lru_cache
+from contextlib import contextmanager, nullcontext
 from logger import logger
-from database import get_db
-from models import Questions, User, InvestorResponse, FinancialMetrics
+from database import get_db, get_read_db
+from identity import current_user_id
+from models import InvestorResponse, FinancialMetrics, UserFactorScores
 from pydantic import BaseModel
+from scoring import (
+  get_scoring_engine, compute_metrics, metric_deltas, final_score, select_portfolio,
+  UnknownQuestionError, FACTORS, METRIC_COMPONENTS,
+)
+from queries import latest_id_query, upsert_statement
+from questionnaire_cache import get_questionnaire_snapshot, etag_matches
+from portfolio_cache import portfolio_cache
+from response_writer import response_writer, ResponseQueueFull
+from dotenv import load_dotenv
+from types import SimpleNamespace
+
+import os
+import uuid
+
+load_dotenv()
+
+# Most scenarios one POST /questions/what-if may score
+WHAT_IF_MAX_SCENARIOS = int(os.getenv("WHAT_IF_MAX_SCENARIOS", "1000"))
 
 router = APIRouter()
 
@@ -39,282 +62,245 @@ class SubmitQuestionnaireResponse(BaseModel):
   debt_to_income_ratio: int
   investment_horizon_score: int
 
+class WhatIfRequest(BaseModel):
+  # Answers shared by every scenario, e.g. the client's current ones; each scenario's
+  # answers are applied on top (a scenario may also be a complete answer set on its own)
+  base: List[SubmitQuestionnaireRequest] = []
+  scenarios: List[List[SubmitQuestionnaireRequest]]
+
+class WhatIfResult(BaseModel):
+  risk_capacity: int
+  risk_tolerance: int
+  investing_potential: int
+  liquidity_ratio: int
+  debt_to_income_ratio: int
+  investment_horizon_score: int
+  final_score: float
+  portfolio_type: str
+  equity_allocation: int
+  fixed_income_allocation: int
 
 # ---------------------------
 # Routes
 # ---------------------------
 
 @router.get("/", response_model=List[QuestionResponse])
-def get_questionnaire(db: Session = Depends(get_db)):
+def get_questionnaire(request: Request, db: Session = Depends(get_read_db)):
   # Retrieve the entire questionnaire from the DB.
   # Could be protected if only authenticated users can see it.
+  # The encoded body is cached until the questionnaire is invalidated, so repeat calls
+  # do not touch the DB, and clients holding the current ETag get a 304.
 
-  questions = db.query(Questions).all()
+  snapshot = get_questionnaire_snapshot(db)
+  headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
 
-  questions_response_list = []
-  for item in questions:
+  if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
-    value = QuestionResponse(
-        id=str(item.id),
-        text=item.text,
-        input_type=item.input_type.value,
-        possible_inputs=item.options,
-        display_order=item.display_order
-      )
-    
-    questions_response_list.append(value)
-
-  return questions_response_list
+  return Response(content=snapshot.body, media_type="application/json", headers=headers)
 
 
 @router.post("/submit", response_model=SubmitQuestionnaireResponse)
-def submit_questionnaire(request: Request, payload: List[SubmitQuestionnaireRequest], db: Session = Depends(get_db)):
+def submit_questionnaire(request: Request, payload: List[SubmitQuestionnaireRequest], db: Session = Depends(get_db), user_id: uuid.UUID = Depends(current_user_id)):
+
+  question_ids, answers = parse_answers(payload)
+  engine = get_scoring_engine(db, [question_id for question_id, _ in answers])
+  factors = score_answers(engine.score_factors, answers)
+  metrics = compute_metrics(factors)
+
+  # Every question id was validated against the engine above, so the answers go out as
+  # one multi-row INSERT in the same transaction as the metrics row and the factor points
+  # that later partial updates start from (or, with write-behind, once that has committed).
+  financial_metrics = FinancialMetrics(user_id=user_id, **metrics)
+  try:
+    with save_responses(db, response_rows(user_id, question_ids, payload)):
+      db.execute(factor_scores_upsert(db.get_bind().dialect.name), {"user_id": user_id, **factors})
+      db.add(financial_metrics)
+      db.commit()
+  except ResponseQueueFull:
+    db.rollback()
+    raise response_queue_full()
+  except SQLAlchemyError:
+    db.rollback()
+    logger.exception("Questionnaire submission failed for username: %s", request.state.username)
+    raise HTTPException(
+      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+      detail="Could not save questionnaire."
+    )
+  portfolio_cache.invalidate(user_id)
+
+  logger.info("Scores are :- %s", factors)
+
+  return SubmitQuestionnaireResponse(message="Ok", **metrics)
+
+@router.patch("/submit", response_model=SubmitQuestionnaireResponse)
+def update_questionnaire(request: Request, payload: List[SubmitQuestionnaireRequest], db: Session = Depends(get_db), user_id: uuid.UUID = Depends(current_user_id)):
+  # Partial update: only the changed answers are sent. Their points are diffed against the
+  # user's stored factor points and only the metrics those factors feed are adjusted, so
+  # the work is proportional to the number of answers, not the questionnaire.
+
+  question_ids, answers = parse_answers(payload)
+  engine = get_scoring_engine(db, [question_id for question_id, _ in answers])
+  assigned = score_answers(engine.assign, answers)
+
+  # Factor points and the current metrics in one round trip; the factor row stays locked
+  # until commit so concurrent updates for the same user apply one after the other.
+  row = (
+    db.query(UserFactorScores, FinancialMetrics)
+    .join(FinancialMetrics, FinancialMetrics.user_id == UserFactorScores.user_id)
+    .filter(
+      UserFactorScores.user_id == user_id,
+      FinancialMetrics.id == latest_id_query(FinancialMetrics, user_id).scalar_subquery()
+    )
+    .with_for_update(of=UserFactorScores)
+    .first()
+  )
+  if row is None:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail="Please submit the full questionnaire first."
+    )
+  stored, latest = row
+
+  changes = {}
+  for factor, points in assigned.items():
+    old = getattr(stored, factor)
+    if old != points:
+      changes[factor] = (old, points)
+      setattr(stored, factor, points)
+  deltas = metric_deltas(changes)
+  metrics = {metric: int(getattr(latest, metric)) + deltas.get(metric, 0) for metric in METRIC_COMPONENTS}
+
+  try:
+    with save_responses(db, response_rows(user_id, question_ids, payload)):
+      if changes:
+        # Flushed together with the UPDATE of just the changed factor columns
+        db.add(FinancialMetrics(user_id=user_id, **metrics))
+      db.commit()
+  except ResponseQueueFull:
+    db.rollback()
+    raise response_queue_full()
+  except SQLAlchemyError:
+    db.rollback()
+    logger.exception("Questionnaire update failed for username: %s", request.state.username)
+    raise HTTPException(
+      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+      detail="Could not save questionnaire."
+    )
+  if changes:
+    portfolio_cache.invalidate(user_id)
+
+  logger.info("Changed scores are :- %s", {factor: new for factor, (old, new) in changes.items()})
+
+  return SubmitQuestionnaireResponse(message="Ok", **metrics)
 
-  user = db.query(User).filter(User.username == request.state.username).first()
-  if not user:
+@router.post("/what-if", response_model=List[WhatIfResult])
+def what_if(payload: WhatIfRequest, db: Session = Depends(get_read_db)):
+  # Scores hypothetical answer sets exactly like POST /submit and picks their band like
+  # GET /portfolio/, without writing anything. Results are in scenario order.
+  if len(payload.scenarios) > WHAT_IF_MAX_SCENARIOS:
     raise HTTPException(
-      status_code=status.HTTP_401_UNAUTHORIZED,
-      detail="Invalid username or password."
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail=f"At most {WHAT_IF_MAX_SCENARIOS} scenarios per request."
     )
-  
-  investment_type = 0
-  investing_potential = 0
-  income_stability = 0
-  owns_house = 0
-  savings_rate = 0
-  investment_experience = 0
-  fixed_asset_allocation = 0
-  portfolio_checking_freq = 0
-  market_dip_action = 0
-  investment_strategy = 0
-  portfolio_crash_reaction = 0 
-  investment_horizon = 0
-  has_dependents = 0
-  liquidity_ratio = 0
-  major_financial_goals = 0
-  debt_to_income_ratio = 0
-
-
-
-  response_list = []
+  # The same few question ids repeat in every scenario; each is parsed once
+  canonical_ids = {}
+  base = canonical_answers(payload.base, canonical_ids)
+  scenarios = []
+  for index, answers in enumerate(payload.scenarios):
+    with scenario_errors(index):
+      scenarios.append(canonical_answers(answers, canonical_ids))
+  engine = get_scoring_engine(db, canonical_ids.values())
+
+  # The base answers are scored once; a scenario's answers then overwrite the factors
+  # they feed, as later answers do in a submission
+  base_factors = score_answers(engine.score_factors, base)
+  results = []
+  for index, answers in enumerate(scenarios):
+    with scenario_errors(index):
+      factors = {**base_factors, **score_answers(engine.assign, answers)}
+    metrics = compute_metrics(factors)
+    score = final_score(SimpleNamespace(**metrics))
+    portfolio_type, equity, fixed_income = select_portfolio(score)
+    results.append(dict(
+      metrics, final_score=score, portfolio_type=portfolio_type,
+      equity_allocation=equity, fixed_income_allocation=fixed_income
+    ))
+  return results
+
+# ---------------------------
+# Helper Functions
+# ---------------------------
+def parse_answers(payload: List[SubmitQuestionnaireRequest]) -> Tuple[List[uuid.UUID], List[Tuple[str, str]]]:
+  try:
+    question_ids = [uuid.UUID(item.question_id) for item in payload]
+  except ValueError:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail="Invalid question id."
+    )
+  answers = [(str(question_id), item.submitted_response) for question_id, item in zip(question_ids, payload)]
+  return question_ids, answers
+
+def score_answers(scorer, answers):
+  try:
+    return scorer(answers)
+  except UnknownQuestionError as e:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail=f"Unknown question: {e.args[0]}"
+    )
+  except ValueError:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail="Invalid response for a numeric question."
+    )
+
+def canonical_answers(payload: List[SubmitQuestionnaireRequest], canonical_ids: Dict[str, str]) -> List[Tuple[str, str]]:
+  # parse_answers without the UUID objects, memoizing each raw id's canonical form
+  answers = []
   for item in payload:
-    new_response = InvestorResponse(user_id=user.id, question_id=item.question_id, response=item.submitted_response)
-    question = db.query(Questions).filter(Questions.id == item.question_id).first()
-    
-    # 1. Investment Type (SIP vs. One-Time) → Affects Risk Tolerance & Investing Potential
-    if question.text == 'How do you want to invest your money?':
-      if item.submitted_response == "SIP":
-          investment_type = -5
-      elif item.submitted_response == "One Time":
-          investment_type = 5
-      else:
-          investment_type = 0  # Default value if neither condition is met
-
-    # 2. Investing Potential → Directly used
-    if question.text == 'How much amount do you want to invest?':
-      investing_potential = int(item.submitted_response)
-
-    # 3. Income Stability → Affects Risk Capacity
-    if question.text == 'How regular is your income?':
-      if item.submitted_response == "Regular monthly income":
-          income_stability = 10
-      elif item.submitted_response == "Irregular monthly income":
-          income_stability = 5
-      elif item.submitted_response == "No monthly income":
-          income_stability = 0
-      else:
-          income_stability = 0  # Default value if neither condition is met
-
-    # 4. Homeownership → More security = Higher Risk Capacity
-    if question.text == 'Do you own a house?':
-      owns_house = 5 if item.submitted_response == "Yes" else 0
-
-    # 5. Savings Rate → Affects Risk Capacity
-    if question.text == 'What %age of your annual income do you save?':
-      if item.submitted_response == "Greater than or equal to 30%":
-          savings_rate = 10
-      elif item.submitted_response == "Less than 30%":
-          savings_rate = 7
-      elif item.submitted_response == "Less than 20%":
-          savings_rate = 4
-      elif item.submitted_response == "Less than 10%":
-          savings_rate = 1
-      else:
-          savings_rate = 0  # Default value if neither condition is met
-
-    # 6. EMI Burden → Affects Debt-to-Income Ratio
-    # if question.text == 'What %age of your annual income goes into the EMI?':
-    #   if item.submitted_response == "Less than 10%":
-    #       emi_burden = 1
-    #   elif item.submitted_response == "Less than 20%":
-    #       emi_burden = 0.5
-    #   elif item.submitted_response == "Less than 40%":
-    #       emi_burden = -0.5
-    #   elif item.submitted_response == "Greater than 40%":
-    #       emi_burden = -1
-    #   else:
-    #       emi_burden = 0  # Default value if neither condition is met
-
-    # 7. Investment Experience → Affects Risk Capacity
-    if question.text == 'What is your investing experience in mutual funds and stocks?':
-      if item.submitted_response == "Never invested":
-          investment_experience = -10
-      elif item.submitted_response == "Started less than 3 years back":
-          investment_experience = -5
-      elif item.submitted_response == "Investing from last 10 years to 3 years":
-          investment_experience = 5
-      elif item.submitted_response == "Investing for more than 10 years":
-          investment_experience = 10
-      elif item.submitted_response == "I have stopped investing":
-          investment_experience = -10
-      else:
-          investment_experience = 0  # Default value if neither condition is met
-
-    # 8. Fixed Asset Allocation → Affects Risk Capacity
-    if question.text == 'What %age of your investment is in FD, PPF, NSC etc.?':
-      if item.submitted_response == "Less than 20%":
-          fixed_asset_allocation = 10
-      elif item.submitted_response == "Between 20-30%":
-          fixed_asset_allocation = 5
-      elif item.submitted_response == "Between 40-50%":
-          fixed_asset_allocation = -5
-      elif item.submitted_response == "Greater than 60%":
-          fixed_asset_allocation = -10
-      else:
-          fixed_asset_allocation = 0  # Default value if neither condition is met
-
-    # 9. Portfolio Checking Frequency → Affects Risk Tolerance
-    if question.text == 'How often do you check your portfolio value?':
-      if item.submitted_response == "Everyday":
-          portfolio_checking_freq = -10
-      elif item.submitted_response == "4 to 5 times a month":
-          portfolio_checking_freq = -5
-      elif item.submitted_response == "Every month":
-          portfolio_checking_freq = 0
-      elif item.submitted_response == "4 to 5 times a year":
-          portfolio_checking_freq = 5
-      else:
-          portfolio_checking_freq = 0  # Default value if neither condition is met
-
-    # 10. Market Dip Action → Affects Risk Tolerance
-    if question.text == 'In which market dip would you take corrective action?':
-      if item.submitted_response == "Portfolio is down 10%":
-          market_dip_action = -10
-      elif item.submitted_response == "Portfolio is down 20%":
-          market_dip_action = -5
-      elif item.submitted_response == "Portfolio is down 30%":
-          market_dip_action = 0
-      elif item.submitted_response == "Portfolio is down more than 40%":
-          market_dip_action = 5
-      elif item.submitted_response == "None of the above":
-          market_dip_action = 10
-      else:
-          market_dip_action = 0  # Default value if neither condition is met
-    
-    # 11. Portfolio Strategy → Affects Risk Tolerance
-    if question.text == 'What portfolio strategy would you like to have?':
-      if item.submitted_response == "Preserve principal amount even if post tax growth is below inflation":
-          investment_strategy = -10
-      elif item.submitted_response == "Preserve principal amount with post tax growth at par with inflation":
-          investment_strategy = -5
-      elif item.submitted_response == "Achieve moderate growth":
-          investment_strategy = 5
-      elif item.submitted_response == "Achieve high growth":
-          investment_strategy = 10
-      elif item.submitted_response == "Maximise growth":
-          investment_strategy = 15
-      else:
-          investment_strategy = 0  # Default value if neither condition is met
-
-    # 12. Portfolio Crash Reaction → Affects Risk Tolerance
-    if question.text == 'What would you do if your portfolio dropped 50%?':
-      if item.submitted_response == "Sell everything":
-          portfolio_crash_reaction = -10
-      elif item.submitted_response == "Hold and wait":
-          portfolio_crash_reaction = 5
-      elif item.submitted_response == "Invest more":
-          portfolio_crash_reaction = 10
-      else:
-          portfolio_crash_reaction = 0  # Default value if neither condition is met
-
-    # 13. Investment Horizon → Affects Risk Capacity
-    if question.text == 'What is your preferred investment horizon?':
-      if item.submitted_response == "Less than 3 years":
-          investment_horizon = -10
-      elif item.submitted_response == "3 to 5 years":
-          investment_horizon = 0
-      elif item.submitted_response == "More than 5 years":
-          investment_horizon = 10
-      else:
-          investment_horizon = 0  # Default value if neither condition is met
-
-    # 14. Dependents → More dependents = Lower Risk Capacity
-    if question.text == 'What is your preferred investment horizon?':
-      has_dependents = -10 if item.submitted_response == "Yes" else 0
-
-    # 15. Emergency Savings → Affects Liquidity Ratio
-    if question.text == 'How many months of expenses can your emergency savings cover?':
-      if item.submitted_response == "Less than 3 months":
-          liquidity_ratio = -10
-      elif item.submitted_response == "3 to 6 months":
-          liquidity_ratio = 0
-      elif item.submitted_response == "More than 6 months":
-          liquidity_ratio = 10
-      else:
-          liquidity_ratio = 0  # Default value if neither condition is met
-
-    # 16. Financial Goals → Short-term goals lower risk-taking ability
-    if question.text == 'Do you have any significant financial goals in the next 3-5 years?':
-      major_financial_goals = -10 if item.submitted_response == "Yes" else 0
-
-    # 17. Additional Income Sources → Increases Investing Potential
-    # if question.text == 'Do you have additional sources of income?':
-    #   additional_income = 5 if item.submitted_response == "Yes" else 0
-
-    # 18. Personal Loans Taken Recently → Affects Debt-to-Income Ratio
-    # if question.text == 'Have you taken any personal loans or high-interest debt in the last year?':
-    #   personal_loans = -5 if item.submitted_response == "Yes" else 0
-
-    # 19. EMI Percentage → Affects Debt-to-Income Ratio
-    if question.text == 'What percentage of your income goes towards EMIs (Debt-to-Income Ratio)?':
-      if item.submitted_response == "Less than 20%":
-          debt_to_income_ratio = 10
-      elif item.submitted_response == "20-40%":
-          debt_to_income_ratio = 0
-      elif item.submitted_response == "More than 40%":
-          debt_to_income_ratio = -10
-      else:
-          debt_to_income_ratio = 0  # Default value if neither condition is met
-
-    db.add(new_response)
-    db.commit()
-    response_list.append(new_response)
-
-  # Final Risk Capacity Calculation
-  risk_capacity = (income_stability * 10) + savings_rate + owns_house + investment_experience + \
-                  fixed_asset_allocation + has_dependents + major_financial_goals
-
-  # Final Risk Tolerance Calculation
-  risk_tolerance = (portfolio_checking_freq + market_dip_action + investment_strategy +
-                    portfolio_crash_reaction + investment_type)  
-  
-  logger.info(f"Scores are :- income_stability = {income_stability}, savings_rate = {savings_rate}, owns_house = {owns_house}\
-              , investment_experience = {investment_experience}, fixed_asset_allocation = {fixed_asset_allocation}\
-              , has_dependents = {has_dependents}, major_financial_goals = {major_financial_goals}\
-              , portfolio_checking_freq = {portfolio_checking_freq}, market_dip_action = {market_dip_action}\
-              , investment_strategy = {investment_strategy}, portfolio_crash_reaction = {portfolio_crash_reaction}\
-              , investment_type = {investment_type}")
-      
-  financial_metrics = FinancialMetrics(user_id=user.id, risk_capacity=risk_capacity, risk_tolerance=risk_tolerance, investing_potential=investing_potential, liquidity_ratio=liquidity_ratio, debt_to_income_ratio=debt_to_income_ratio, investment_horizon_score=investment_horizon)
-  db.add(financial_metrics)
-  db.commit()
-
-  return SubmitQuestionnaireResponse(
-    risk_capacity=risk_capacity,
-    risk_tolerance=risk_tolerance,
-    investing_potential=investing_potential,
-    liquidity_ratio=liquidity_ratio,
-    debt_to_income_ratio=debt_to_income_ratio,
-    investment_horizon_score=investment_horizon,
-    message="Ok"
-    )
\ No newline at end of file
+    question_id = canonical_ids.get(item.question_id)
+    if question_id is None:
+      question_id = canonical_ids[item.question_id] = str(parse_answers([item])[0][0])
+    answers.append((question_id, item.submitted_response))
+  return answers
+
+@contextmanager
+def scenario_errors(index: int):
+  try:
+    yield
+  except HTTPException as e:
+    e.detail = f"Scenario {index}: {e.detail}"
+    raise
+
+def response_rows(user_id: uuid.UUID, question_ids: List[uuid.UUID], payload: List[SubmitQuestionnaireRequest]):
+  return [
+    {"user_id": user_id, "question_id": question_id, "response": item.submitted_response}
+    for question_id, item in zip(question_ids, payload)
+  ]
+
+def save_responses(db: Session, rows: List[dict]):
+  # Context manager around the caller's commit. Normally the rows are inserted right away
+  # in the request's transaction; with RESPONSE_WRITE_BEHIND they are handed to the
+  # response writer once the block (and so the commit) has succeeded.
+  if not rows:
+    return nullcontext()
+  if response_writer.enabled:
+    return response_writer.deferred(rows)
+  db.execute(insert(InvestorResponse), rows)
+  return nullcontext()
+
+# Queue space is reserved before the commit, so a full queue turns the submission away
+# without having saved anything.
+def response_queue_full() -> HTTPException:
+  logger.warning("Response write-behind queue full, rejecting submission")
+  return HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Too many submissions, please retry shortly.",
+    headers={"Retry-After": "1"}
+  )
+
+@lru_cache(maxsize=None)
+def factor_scores_upsert(dialect_name: str):
+  return upsert_statement(dialect_name, UserFactorScores, [UserFactorScores.user_id], FACTORS + ("updated_at",))
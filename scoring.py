@@ -0,0 +1,342 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from logger import logger
+from models import Questions
+from questionnaire_cache import refresh_questionnaire_version, QUESTIONNAIRE_RECHECK_INTERVAL
+
+import threading
+
+# ---------------------------
+# Scoring rules
+# ---------------------------
+# Every factor starts at 0 and is overwritten by the answer to the question(s) feeding it.
+FACTORS = (
+  "investment_type",
+  "investing_potential",
+  "income_stability",
+  "owns_house",
+  "savings_rate",
+  "investment_experience",
+  "fixed_asset_allocation",
+  "portfolio_checking_freq",
+  "market_dip_action",
+  "investment_strategy",
+  "portfolio_crash_reaction",
+  "investment_horizon",
+  "has_dependents",
+  "liquidity_ratio",
+  "major_financial_goals",
+  "debt_to_income_ratio",
+)
+
+# A rule is (factor, points). points maps an option to its score (unknown options score 0);
+# points=None means the response itself is the numeric score.
+Rule = Tuple[str, Optional[Dict[str, int]]]
+
+# Rules of the original questionnaire, by question text. Migration 0005 copied them into
+# each question's `scoring_rules`, which is all the engine reads, so rewording a question
+# keeps its scoring. Kept for seeding databases (encode_rules) and as the reference for
+# the scoring tests.
+DEFAULT_RULES: Dict[str, List[Rule]] = {
+  'How do you want to invest your money?': [
+    ("investment_type", {"SIP": -5, "One Time": 5}),
+  ],
+  'How much amount do you want to invest?': [
+    ("investing_potential", None),
+  ],
+  'How regular is your income?': [
+    ("income_stability", {
+      "Regular monthly income": 10,
+      "Irregular monthly income": 5,
+      "No monthly income": 0,
+    }),
+  ],
+  'Do you own a house?': [
+    ("owns_house", {"Yes": 5}),
+  ],
+  'What %age of your annual income do you save?': [
+    ("savings_rate", {
+      "Greater than or equal to 30%": 10,
+      "Less than 30%": 7,
+      "Less than 20%": 4,
+      "Less than 10%": 1,
+    }),
+  ],
+  'What is your investing experience in mutual funds and stocks?': [
+    ("investment_experience", {
+      "Never invested": -10,
+      "Started less than 3 years back": -5,
+      "Investing from last 10 years to 3 years": 5,
+      "Investing for more than 10 years": 10,
+      "I have stopped investing": -10,
+    }),
+  ],
+  'What %age of your investment is in FD, PPF, NSC etc.?': [
+    ("fixed_asset_allocation", {
+      "Less than 20%": 10,
+      "Between 20-30%": 5,
+      "Between 40-50%": -5,
+      "Greater than 60%": -10,
+    }),
+  ],
+  'How often do you check your portfolio value?': [
+    ("portfolio_checking_freq", {
+      "Everyday": -10,
+      "4 to 5 times a month": -5,
+      "Every month": 0,
+      "4 to 5 times a year": 5,
+    }),
+  ],
+  'In which market dip would you take corrective action?': [
+    ("market_dip_action", {
+      "Portfolio is down 10%": -10,
+      "Portfolio is down 20%": -5,
+      "Portfolio is down 30%": 0,
+      "Portfolio is down more than 40%": 5,
+      "None of the above": 10,
+    }),
+  ],
+  'What portfolio strategy would you like to have?': [
+    ("investment_strategy", {
+      "Preserve principal amount even if post tax growth is below inflation": -10,
+      "Preserve principal amount with post tax growth at par with inflation": -5,
+      "Achieve moderate growth": 5,
+      "Achieve high growth": 10,
+      "Maximise growth": 15,
+    }),
+  ],
+  'What would you do if your portfolio dropped 50%?': [
+    ("portfolio_crash_reaction", {
+      "Sell everything": -10,
+      "Hold and wait": 5,
+      "Invest more": 10,
+    }),
+  ],
+  # The dependents factor has always been read off the horizon question; kept as-is so
+  # stored scores stay comparable.
+  'What is your preferred investment horizon?': [
+    ("investment_horizon", {
+      "Less than 3 years": -10,
+      "3 to 5 years": 0,
+      "More than 5 years": 10,
+    }),
+    ("has_dependents", {"Yes": -10}),
+  ],
+  'How many months of expenses can your emergency savings cover?': [
+    ("liquidity_ratio", {
+      "Less than 3 months": -10,
+      "3 to 6 months": 0,
+      "More than 6 months": 10,
+    }),
+  ],
+  'Do you have any significant financial goals in the next 3-5 years?': [
+    ("major_financial_goals", {"Yes": -10}),
+  ],
+  'What percentage of your income goes towards EMIs (Debt-to-Income Ratio)?': [
+    ("debt_to_income_ratio", {
+      "Less than 20%": 10,
+      "20-40%": 0,
+      "More than 40%": -10,
+    }),
+  ],
+}
+
+class UnknownQuestionError(KeyError):
+  pass
+
+def parse_rules(value) -> Optional[List[Rule]]:
+  # A question's `scoring_rules`, either one rule or a list of them:
+  #   {"factor": "owns_house", "points": {"Yes": 5}}
+  #   {"factor": "investing_potential", "points": null}
+  entries = value if isinstance(value, list) else [value]
+  rules = []
+  for entry in entries:
+    if not isinstance(entry, dict) or entry.get("factor") not in FACTORS:
+      return None
+    points = entry.get("points")
+    if points is not None and not isinstance(points, dict):
+      return None
+    rules.append((entry["factor"], points))
+  return rules or None
+
+# Numeric answers are stored as factor points in user_factor_scores' BIGINT columns
+MAX_NUMERIC_RESPONSE = 2 ** 63 - 1
+
+def numeric_response(response: str) -> int:
+  value = int(response)
+  if abs(value) > MAX_NUMERIC_RESPONSE:
+    raise ValueError(f"Numeric response out of range: {response}")
+  return value
+
+def encode_rules(rules: List[Rule]) -> List[Dict]:
+  return [{"factor": factor, "points": points} for factor, points in rules]
+
+# Every stored metric is a weighted sum of factors: metric -> {factor: weight}.
+METRIC_COMPONENTS: Dict[str, Dict[str, int]] = {
+  "risk_capacity": {
+    "income_stability": 10,
+    "savings_rate": 1,
+    "owns_house": 1,
+    "investment_experience": 1,
+    "fixed_asset_allocation": 1,
+    "has_dependents": 1,
+    "major_financial_goals": 1,
+  },
+  "risk_tolerance": {
+    "portfolio_checking_freq": 1,
+    "market_dip_action": 1,
+    "investment_strategy": 1,
+    "portfolio_crash_reaction": 1,
+    "investment_type": 1,
+  },
+  "investing_potential": {"investing_potential": 1},
+  "liquidity_ratio": {"liquidity_ratio": 1},
+  "debt_to_income_ratio": {"debt_to_income_ratio": 1},
+  "investment_horizon_score": {"investment_horizon": 1},
+}
+
+# factor -> ((metric, weight), ...), i.e. the metrics a change to the factor affects
+FACTOR_METRICS: Dict[str, Tuple[Tuple[str, int], ...]] = {
+  factor: tuple(
+    (metric, components[factor]) for metric, components in METRIC_COMPONENTS.items() if factor in components
+  )
+  for factor in FACTORS
+}
+
+def compute_metrics(factors: Dict[str, int]) -> Dict[str, int]:
+  return {
+    metric: sum(weight * factors[factor] for factor, weight in components.items())
+    for metric, components in METRIC_COMPONENTS.items()
+  }
+
+def metric_deltas(changes: Dict[str, Tuple[int, int]]) -> Dict[str, int]:
+  # changes: factor -> (old points, new points). Returns the change of every metric the
+  # changed factors feed into; metrics not listed are unaffected.
+  deltas: Dict[str, int] = {}
+  for factor, (old, new) in changes.items():
+    for metric, weight in FACTOR_METRICS[factor]:
+      deltas[metric] = deltas.get(metric, 0) + weight * (new - old)
+  return deltas
+
+# ---------------------------
+# Portfolio bands
+# ---------------------------
+# Weight of each stored metric in the final score (debt_to_income_ratio counts against it).
+FINAL_SCORE_WEIGHTS = {
+  "risk_capacity": 0.3,
+  "risk_tolerance": 0.3,
+  "investing_potential": 0.15,
+  "liquidity_ratio": 0.1,
+  "debt_to_income_ratio": -0.1,
+  "investment_horizon_score": 0.05,
+}
+
+# (upper bound of final score, portfolio type, equity %, fixed income %), checked in order
+PORTFOLIO_BANDS = (
+  (30, "Ultra Conservative", 20, 80),
+  (50, "Conservative", 35, 65),
+  (70, "Moderate Growth", 50, 50),
+  (85, "Aggressive Growth", 70, 30),
+  (float("inf"), "High Growth", 90, 10),
+)
+
+def final_score(metrics) -> float:
+  # metrics is a FinancialMetrics row or anything with the same attributes
+  score = 0.0
+  for name, weight in FINAL_SCORE_WEIGHTS.items():
+    score += weight * getattr(metrics, name)
+  return score
+
+def select_portfolio(score: float) -> Tuple[str, int, int]:
+  # Returns (portfolio_type, equity, fixed_income)
+  for upper_bound, portfolio_type, equity, fixed_income in PORTFOLIO_BANDS:
+    if score < upper_bound:
+      return portfolio_type, equity, fixed_income
+  return PORTFOLIO_BANDS[-1][1:]
+
+# ---------------------------
+# Engine
+# ---------------------------
+class ScoringEngine:
+  # Compiled form of the questionnaire:
+  #   question_id -> ({option -> ((factor, points), ...)}, default_assignments, numeric_factors)
+  # so a submission is scored with one dict lookup per answer.
+
+  def __init__(self, rules_by_question: Dict[str, List[Rule]], version: int = 0):
+    self.version = version
+    self._table = {}
+    for question_id, rules in rules_by_question.items():
+      options = {option for factor, points in rules for option in (points or {})}
+      assignments = {
+        option: tuple((factor, points.get(option, 0)) for factor, points in rules if points is not None)
+        for option in options
+      }
+      default = tuple((factor, 0) for factor, points in rules if points is not None)
+      numeric = tuple(factor for factor, points in rules if points is None)
+      self._table[question_id] = (assignments, default, numeric)
+
+  @classmethod
+  def from_questions(cls, questions: Iterable[Questions], version: int = 0) -> "ScoringEngine":
+    rules_by_question = {}
+    for question in questions:
+      rules = parse_rules(question.scoring_rules)
+      if rules is None:
+        logger.warning("Question %s has no scoring rules; its answers will not be scored", question.id)
+        rules = []
+      rules_by_question[str(question.id)] = rules
+    return cls(rules_by_question, version)
+
+  def __contains__(self, question_id: str) -> bool:
+    return question_id in self._table
+
+  def score_factors(self, answers: Iterable[Tuple[str, str]]) -> Dict[str, int]:
+    # answers are (question_id, response) pairs; later answers win, as before.
+    factors = dict.fromkeys(FACTORS, 0)
+    factors.update(self.assign(answers))
+    return factors
+
+  def assign(self, answers: Iterable[Tuple[str, str]]) -> Dict[str, int]:
+    # Points for just the factors the given answers feed, e.g. a partial update.
+    factors = {}
+    table = self._table
+    for question_id, response in answers:
+      entry = table.get(question_id)
+      if entry is None:
+        raise UnknownQuestionError(question_id)
+      assignments, default, numeric = entry
+      for factor, points in assignments.get(response, default):
+        factors[factor] = points
+      for factor in numeric:
+        factors[factor] = numeric_response(response)
+    return factors
+
+  def score(self, answers: Iterable[Tuple[str, str]]) -> Tuple[Dict[str, int], Dict[str, int]]:
+    factors = self.score_factors(answers)
+    return factors, compute_metrics(factors)
+
+# ---------------------------
+# Process-wide engine
+# ---------------------------
+_engine: Optional[ScoringEngine] = None
+_lock = threading.Lock()
+
+def load_scoring_engine(db) -> ScoringEngine:
+  global _engine
+  with _lock:
+    version = refresh_questionnaire_version(db)
+    if _engine is None or _engine.version != version:
+      _engine = ScoringEngine.from_questions(db.query(Questions).all(), version)
+      logger.info("Scoring engine built (version %d)", version)
+    return _engine
+
+def get_scoring_engine(db, question_ids: Iterable[str] = ()) -> ScoringEngine:
+  # If the submission references questions this process has not seen, the questionnaire
+  # may have changed since the last check: it is checked again sooner (at most every
+  # QUESTIONNAIRE_RECHECK_INTERVAL, so unknown ids can't force a query per request) and
+  # the engine rebuilt only if it did. Otherwise scoring raises UnknownQuestionError.
+  engine = _engine
+  if engine is None or engine.version != refresh_questionnaire_version(db):
+    engine = load_scoring_engine(db)
+  if any(question_id not in engine for question_id in question_ids):
+    if refresh_questionnaire_version(db, QUESTIONNAIRE_RECHECK_INTERVAL) != engine.version:
+      engine = load_scoring_engine(db)
+  return engine
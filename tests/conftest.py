@@ -0,0 +1,62 @@
+import os
+import tempfile
+import pytest
+
+# Everything reads its settings at import time, so they are set before any app module is
+# imported: a throwaway SQLite primary and the internal API token.
+DATA_DIR = tempfile.mkdtemp(prefix="niveshark-tests-")
+os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{os.path.join(DATA_DIR, 'primary.db')}"
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-of-at-least-32-bytes")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+os.environ["INTERNAL_API_TOKEN"] = "test-internal-token"
+
+@pytest.fixture
+def db():
+  # Fresh schema and seeded questionnaire per test
+  from benchmarks.common import reset_database, seed_questionnaire, session
+  from questionnaire_cache import invalidate_questionnaire
+  from identity import identity_cache
+  reset_database()
+  invalidate_questionnaire()
+  identity_cache.clear()
+  with session() as db:
+    seed_questionnaire(db)
+    yield db
+
+@pytest.fixture
+def redis_client(monkeypatch):
+  # In-process Redis behind the (module-level) revocation store, with its state reset
+  import fakeredis
+  from revocation import revocation_store, CircuitBreaker
+  client = fakeredis.FakeAsyncRedis()
+  monkeypatch.setattr(revocation_store, "client", client)
+  monkeypatch.setattr(revocation_store, "breaker", CircuitBreaker())
+  monkeypatch.setattr(revocation_store, "_revoked", {})
+  return client
+
+@pytest.fixture
+def client(db, redis_client):
+  from fastapi.testclient import TestClient
+  from main import app
+  with TestClient(app) as client:
+    yield client
+
+def sign_up(client, username="investor"):
+  response = client.post("/auth/signup", json={"username": username, "email": f"{username}@example.com", "password": "secret"})
+  assert response.status_code == 200, response.text
+  return response
+
+@pytest.fixture
+def nav_data(tmp_path, monkeypatch):
+  # The shared NAV store on an empty directory, with nothing mapped or memoized from
+  # earlier tests
+  from collections import OrderedDict
+  from nav_store import nav_store
+  from backtest import _cached_backtest
+  monkeypatch.setattr(nav_store, "path", str(tmp_path))
+  monkeypatch.setattr(nav_store, "_index", {})
+  monkeypatch.setattr(nav_store, "_index_mtime", None)
+  monkeypatch.setattr(nav_store, "_open", OrderedDict())
+  _cached_backtest.cache_clear()
+  yield nav_store
+  _cached_backtest.cache_clear()
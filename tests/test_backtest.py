@@ -0,0 +1,85 @@
+from datetime import date
+from backtest import compute_backtest, portfolio_values, rebalance_anchors
+from nav_store import to_days
+from conftest import sign_up
+
+import numpy as np
+import pytest
+
+# Four days across a month end. Equity gains 10%, falls back 10% and gains 10% again
+# (from the new close); fixed income creeps up 1% once.
+DAYS = np.array([to_days(date(2024, 1, 30)), to_days(date(2024, 1, 31)), to_days(date(2024, 2, 1)), to_days(date(2024, 2, 2))])
+EQUITY = np.array([100.0, 110.0, 99.0, 108.9])
+FIXED = np.array([100.0, 100.0, 101.0, 101.0])
+PRICES = np.column_stack((EQUITY, FIXED))
+HALF = np.array([0.5, 0.5])
+
+def test_rebalance_anchors():
+  assert rebalance_anchors(DAYS, "none").tolist() == [0]
+  assert rebalance_anchors(DAYS, "daily").tolist() == [0, 1, 2, 3]
+  # 1 February is the first close of the new month
+  assert rebalance_anchors(DAYS, "monthly").tolist() == [0, 2]
+  assert rebalance_anchors(DAYS, "annually").tolist() == [0]
+
+def test_buy_and_hold():
+  # Holdings bought on day 0 and never touched: 50 * equity / 100 + 50 * fixed / 100
+  values = portfolio_values(PRICES, HALF, rebalance_anchors(DAYS, "none"))
+  assert values == pytest.approx([100.0, 105.0, 100.0, 104.95])
+
+def test_daily_rebalancing():
+  # Each day grows by the average of the two daily returns
+  values = portfolio_values(PRICES, HALF, rebalance_anchors(DAYS, "daily"))
+  day2 = 105.0 * (0.5 * 99 / 110 + 0.5 * 101 / 100)
+  day3 = day2 * (0.5 * 1.1 + 0.5 * 1.0)
+  assert values == pytest.approx([100.0, 105.0, day2, day3])
+
+def test_monthly_rebalancing():
+  # Reset to 50/50 at the 1 February close (value 100), then +10% / +0%
+  values = portfolio_values(PRICES, HALF, rebalance_anchors(DAYS, "monthly"))
+  assert values == pytest.approx([100.0, 105.0, 100.0, 105.0])
+
+def test_all_equity_follows_the_index():
+  values = portfolio_values(PRICES, np.array([1.0, 0.0]), rebalance_anchors(DAYS, "monthly"))
+  assert values == pytest.approx(EQUITY)
+
+@pytest.fixture
+def series(nav_data):
+  nav_data.append("EQ", DAYS, EQUITY, kind="index")
+  nav_data.append("BOND", DAYS, FIXED, kind="index")
+  return nav_data
+
+def test_compute_backtest(series):
+  result = compute_backtest(50.0, None, None, "monthly", 1.0, "EQ", "BOND")
+  assert result["start"] == "2024-01-30" and result["end"] == "2024-02-02"
+  assert result["final_value"] == pytest.approx(105.0)
+  assert result["total_return"] == pytest.approx(0.05)
+  assert result["max_drawdown"] == pytest.approx(100.0 / 105.0 - 1)
+  assert (result["peak_date"], result["trough_date"]) == ("2024-01-31", "2024-02-01")
+  # Under a year of history: no full rolling window
+  assert result["rolling_returns"]["values"] == []
+
+def test_backtest_endpoint(client, series):
+  sign_up(client)
+  params = {"equity": 50, "rebalance": "daily", "equity_symbol": "EQ", "fixed_income_symbol": "BOND"}
+  response = client.get("/finance/backtest", params=params)
+  assert response.status_code == 200
+  assert response.json()["final_value"] == pytest.approx(105.0 * 0.955 * 1.05)
+
+@pytest.mark.parametrize("params", [
+  {},
+  {"equity": 50, "band": "Moderate Growth"},
+  {"equity": 50, "rebalance": "weekly"},
+  {"equity": 50, "start": "2024-02-02", "end": "2024-01-30"},
+  {"band": "Reckless"},
+  # A single day is not enough to measure anything
+  {"equity": 50, "start": "2024-02-01", "end": "2024-02-01"},
+])
+def test_backtest_endpoint_rejects(client, series, params):
+  sign_up(client)
+  response = client.get("/finance/backtest", params={"equity_symbol": "EQ", "fixed_income_symbol": "BOND", **params})
+  assert response.status_code == 400, response.text
+
+def test_backtest_endpoint_unknown_symbol(client, series):
+  sign_up(client)
+  response = client.get("/finance/backtest", params={"equity": 50, "equity_symbol": "NOPE", "fixed_income_symbol": "BOND"})
+  assert response.status_code == 404
@@ -0,0 +1,25 @@
+from benchmarks.common import random_submission
+from identity import identity_cache
+from models import Questions, User
+from conftest import sign_up
+
+def test_deleted_user_gets_401(client, db):
+  sign_up(client)
+  questions = db.query(Questions).order_by(Questions.display_order).all()
+  assert client.post("/questions/submit", json=random_submission(questions)).status_code == 200
+
+  db.query(User).delete()
+  db.commit()
+  identity_cache.clear()
+  response = client.post("/questions/submit", json=random_submission(questions))
+  assert response.status_code == 401
+
+def test_recreated_username_rejects_old_token(client, db):
+  sign_up(client)
+  old_token = client.cookies.get("jwt_token")
+  db.query(User).delete()
+  db.commit()
+  identity_cache.clear()
+  sign_up(client)
+  client.cookies.set("jwt_token", old_token)
+  assert client.get("/portfolio/projection").status_code == 401
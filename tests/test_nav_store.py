@@ -0,0 +1,78 @@
+from datetime import date
+from nav_store import NavStore, UnknownInstrumentError, load_csv, to_days, to_iso
+
+import numpy as np
+import pytest
+
+def days(*isos):
+  return np.array([to_days(date.fromisoformat(iso)) for iso in isos])
+
+@pytest.fixture
+def store(tmp_path):
+  store = NavStore(str(tmp_path))
+  store.append("FUND", days("2024-01-01", "2024-01-02", "2024-01-04"), [10.0, 10.5, 11.0], name="Test fund")
+  return store
+
+def test_append_skips_old_dates_and_keeps_last_duplicate(store):
+  appended = store.append("FUND", days("2024-01-03", "2024-01-05", "2024-01-06", "2024-01-05"), [99.0, 11.5, 12.0, 11.6])
+  # 3 January is before the last stored date; the later 5 January value wins
+  assert appended == (2, 1)
+  dates, values = store.series("FUND")
+  assert to_iso(dates) == ["2024-01-01", "2024-01-02", "2024-01-04", "2024-01-05", "2024-01-06"]
+  assert values.tolist() == [10.0, 10.5, 11.0, 11.6, 12.0]
+  assert store.instrument("FUND") == {
+    "symbol": "FUND", "kind": "fund", "name": "Test fund", "rows": 5, "first": "2024-01-01", "last": "2024-01-06",
+  }
+
+def test_series_range_is_inclusive(store):
+  dates, values = store.series("FUND", date(2024, 1, 2), date(2024, 1, 4))
+  assert to_iso(dates) == ["2024-01-02", "2024-01-04"]
+  assert values.tolist() == [10.5, 11.0]
+  # Bounds between stored days, and ranges outside the history
+  assert to_iso(store.series("FUND", date(2024, 1, 3))[0]) == ["2024-01-04"]
+  assert to_iso(store.series("FUND", end=date(2024, 1, 3))[0]) == ["2024-01-01", "2024-01-02"]
+  assert len(store.series("FUND", date(2025, 1, 1))[0]) == 0
+
+def test_series_are_read_only_views(store):
+  dates, values = store.series("FUND")
+  assert isinstance(values, np.memmap)
+  with pytest.raises(ValueError):
+    values[0] = 0.0
+
+def test_reopened_store_sees_the_same_data(store, tmp_path):
+  reopened = NavStore(str(tmp_path))
+  assert reopened.instruments() == store.instruments()
+  assert reopened.series("FUND")[1].tolist() == [10.0, 10.5, 11.0]
+
+def test_appends_from_another_process_are_picked_up(store, tmp_path):
+  reader = NavStore(str(tmp_path))
+  assert len(reader.series("FUND")[0]) == 3
+  store.append("FUND", days("2024-01-08"), [12.5])
+  assert reader.series("FUND")[1].tolist() == [10.0, 10.5, 11.0, 12.5]
+  assert reader.stats()["maps_opened"] == 2
+
+def test_uncommitted_tail_is_ignored_and_truncated(store, tmp_path):
+  # An append that died before writing the index leaves extra bytes in the column files
+  with open(tmp_path / "FUND.values", "ab") as f:
+    f.write(np.array([777.0]).tobytes())
+  with open(tmp_path / "FUND.dates", "ab") as f:
+    f.write(np.array([to_days(date(2024, 1, 5))], dtype="<i4").tobytes())
+  reopened = NavStore(str(tmp_path))
+  assert reopened.series("FUND")[1].tolist() == [10.0, 10.5, 11.0]
+  reopened.append("FUND", days("2024-01-05"), [11.2])
+  assert NavStore(str(tmp_path)).series("FUND")[1].tolist() == [10.0, 10.5, 11.0, 11.2]
+
+def test_invalid_input(store):
+  with pytest.raises(ValueError):
+    store.append("../etc", days("2024-01-01"), [1.0])
+  with pytest.raises(ValueError):
+    store.append("FUND2", days("2024-01-01"), [1.0], kind="bond")
+  with pytest.raises(UnknownInstrumentError):
+    store.series("MISSING")
+
+def test_load_csv(tmp_path):
+  path = tmp_path / "prices.csv"
+  path.write_text("symbol,date,close\nA,2024-01-02,2\nB,2024-01-01,5\nA,2024-01-01,1\n")
+  store = NavStore(str(tmp_path / "store"))
+  assert load_csv(store, str(path), kind="index") == {"A": (2, 0), "B": (1, 0)}
+  assert store.series("A")[1].tolist() == [1.0, 2.0]
@@ -0,0 +1,43 @@
+from benchmarks.common import random_submission, seed_user
+from models import FinancialMetrics, Questions
+from onboarding import Onboarding
+
+import csv
+import io
+import onboarding
+import sqlite3
+
+def onboarding_csv(questions, usernames):
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  writer.writerow(["username", "question_id", "response"])
+  for username in usernames:
+    for answer in random_submission(questions):
+      writer.writerow([username, answer["question_id"], answer["submitted_response"]])
+  return buffer.getvalue().encode()
+
+def run(body):
+  job = Onboarding("csv")
+  job.feed(body)
+  return job.finish()
+
+def test_batch_is_written(db):
+  questions = db.query(Questions).all()
+  seed_user(db, "first")
+  seed_user(db, "second")
+  summary = run(onboarding_csv(questions, ["first", "second"]))
+  assert summary["submissions"] == 2
+  assert summary["rejected_submissions"] == 0
+  assert db.query(FinancialMetrics).count() == 2
+
+def test_driver_errors_reject_the_batch(db, monkeypatch):
+  # COPY goes straight to the driver, whose errors are not wrapped by SQLAlchemy
+  def failing_write_rows(*args):
+    raise sqlite3.IntegrityError("duplicate key value violates unique constraint")
+  monkeypatch.setattr(onboarding, "write_rows", failing_write_rows)
+  questions = db.query(Questions).all()
+  seed_user(db, "first")
+  summary = run(onboarding_csv(questions, ["first"]))
+  assert summary["submissions"] == 0
+  assert summary["rejected_submissions"] == 1
+  assert summary["errors"][0]["error"] == "Could not save questionnaire."
@@ -0,0 +1,63 @@
+from projection import PERCENTILES, project, simulate_paths, unit_projection
+
+import numpy as np
+import projection
+import pytest
+
+@pytest.fixture
+def no_volatility(monkeypatch):
+  # Every path grows by exactly the expected return; memoized results are dropped so the
+  # patched settings are used
+  monkeypatch.setattr(projection, "PROJECTION_EQUITY_VOLATILITY", 0.0)
+  monkeypatch.setattr(projection, "PROJECTION_FIXED_INCOME_VOLATILITY", 0.0)
+  unit_projection.cache_clear()
+  yield
+  unit_projection.cache_clear()
+
+def monthly_growth(equity):
+  weight = equity / 100
+  return weight * 1.12 ** (1 / 12) + (1 - weight) * 1.07 ** (1 / 12)
+
+def test_same_seed_same_paths():
+  first = unit_projection.__wrapped__(60, 36, "sip", paths=400, seed=3)
+  again = unit_projection.__wrapped__(60, 36, "sip", paths=400, seed=3)
+  other = unit_projection.__wrapped__(60, 36, "sip", paths=400, seed=4)
+  assert np.array_equal(first[0], again[0])
+  assert first[1:] == again[1:]
+  assert not np.array_equal(first[0], other[0])
+
+def test_project_is_reproducible():
+  unit_projection.cache_clear()
+  first = project(55, 10000, 5)
+  unit_projection.cache_clear()
+  assert project(55, 10000, 5) == first
+
+@pytest.mark.parametrize("equity", [0, 40, 100])
+def test_sip_matches_closed_form(no_volatility, equity):
+  # Contributions at the start of each month: FV = amount * g * (g**n - 1) / (g - 1)
+  g, months, amount = monthly_growth(equity), 10 * 12, 5000
+  expected = amount * g * (g ** months - 1) / (g - 1)
+  result = project(equity, amount, 10)
+  assert result["invested"] == amount * months
+  for percentile in PERCENTILES:
+    assert result["percentiles"][f"p{percentile}"] == pytest.approx(expected, rel=1e-9)
+  # Year ends follow the same formula
+  first_year = amount * g * (g ** 12 - 1) / (g - 1)
+  assert result["yearly"][0]["p50"] == pytest.approx(first_year, rel=1e-9)
+
+def test_lumpsum_matches_closed_form(no_volatility):
+  g = monthly_growth(70)
+  result = project(70, 100000, 8, mode="lumpsum")
+  assert result["percentiles"]["p50"] == pytest.approx(100000 * g ** 96, rel=1e-9)
+
+def test_target_probability_without_volatility(no_volatility):
+  g = monthly_growth(100)
+  final = 1000 * g * (g ** 24 - 1) / (g - 1)
+  assert project(100, 1000, 2, target=final * 0.999)["probability"] == 1
+  assert project(100, 1000, 2, target=final * 1.001)["probability"] == 0
+
+def test_simulated_paths_are_per_unit():
+  wealth = simulate_paths(np.random.default_rng(1), 50, 12, 100, "sip")
+  assert wealth.shape == (100, 12)
+  # The first month holds one contribution, grown for that month
+  assert np.all(wealth[:, 0] > 0.8) and np.all(wealth[:, 0] < 1.2)
@@ -0,0 +1,59 @@
+from benchmarks.common import random_submission
+from identity import identity_cache
+from models import Questions
+from query_stats import RequestQueries, query_budget, record_statement, request_queries
+from questionnaire_cache import invalidate_questionnaire
+from conftest import sign_up
+
+import random
+
+def run_main_routes(client, questions, rnd):
+  answers = random_submission(questions, rnd)
+  assert client.post("/questions/submit", json=answers).status_code == 200
+  assert client.patch("/questions/submit", json=random_submission(questions, rnd)[:3]).status_code == 200
+  what_if = {"base": answers, "scenarios": [random_submission(questions, rnd)[:2] for _ in range(5)]}
+  assert client.post("/questions/what-if", json=what_if).status_code == 200
+  assert client.get("/questions/").status_code == 200
+  assert client.get("/portfolio/").status_code == 200
+  assert client.get("/portfolio/projection", params={"amount": 10000, "years": 10}).status_code == 200
+  for kind in ("responses", "metrics"):
+    assert client.get(f"/export/{kind}").status_code == 200
+
+def test_main_routes_stay_within_budget(client, db):
+  questions = db.query(Questions).order_by(Questions.display_order).all()
+  rnd = random.Random(7)
+  with query_budget() as budget:
+    sign_up(client)
+    assert client.post("/auth/signin", json={"username": "investor", "password": "secret"}).status_code == 200
+    # Cold: nothing cached for this user, questionnaire re-checked
+    identity_cache.clear()
+    invalidate_questionnaire()
+    run_main_routes(client, questions, rnd)
+    # Warm
+    run_main_routes(client, questions, rnd)
+    assert client.get("/auth/signout").status_code == 200
+
+  routes = {(method, route) for method, route, _ in budget.requests}
+  assert routes >= {
+    ("POST", "/auth/signup"), ("POST", "/auth/signin"), ("GET", "/auth/signout"),
+    ("GET", "/questions/"), ("POST", "/questions/submit"), ("PATCH", "/questions/submit"),
+    ("POST", "/questions/what-if"), ("GET", "/portfolio/"), ("GET", "/portfolio/projection"),
+    ("GET", "/export/{kind}"),
+  }
+
+def test_unknown_questions_cost_no_rebuild(client, db):
+  sign_up(client)
+  answers = [{"question_id": "00000000-0000-0000-0000-000000000000", "submitted_response": "Yes"}]
+  with query_budget(max_statements=2) as budget:
+    for _ in range(5):
+      assert client.post("/questions/what-if", json={"base": answers, "scenarios": [[]]}).status_code == 400
+  assert len(budget.requests) == 5
+
+def test_raw_cursor_statements_are_counted():
+  queries = RequestQueries()
+  token = request_queries.set(queries)
+  try:
+    record_statement("COPY investor_responses (user_id) FROM STDIN WITH (FORMAT csv)", 0.01, write=True)
+  finally:
+    request_queries.reset(token)
+  assert (queries.statements, queries.writes) == (1, 1)
@@ -0,0 +1,27 @@
+from sqlalchemy import text
+from models import Questions
+from questionnaire_cache import get_questionnaire_snapshot, refresh_questionnaire_version, touch_questionnaire
+
+def test_snapshot_follows_orm_edits(db):
+  before = get_questionnaire_snapshot(db)
+  assert get_questionnaire_snapshot(db) is before
+
+  question = db.query(Questions).order_by(Questions.display_order).first()
+  question.text = "Reworded"
+  db.commit()
+  # Rate-limited: nothing is re-read until the check interval has passed
+  assert refresh_questionnaire_version(db) == before.version
+  assert refresh_questionnaire_version(db, max_age=0) != before.version
+
+  after = get_questionnaire_snapshot(db)
+  assert after.etag != before.etag
+  assert b"Reworded" in after.body
+
+def test_touch_is_seen_by_other_workers(db):
+  version = refresh_questionnaire_version(db, max_age=0)
+  # Raw SQL, e.g. from a migration, leaves updated_at alone
+  db.execute(text("UPDATE questions SET text = 'Raw edit'"))
+  db.commit()
+  assert refresh_questionnaire_version(db, max_age=0) == version
+  touch_questionnaire(db)
+  assert refresh_questionnaire_version(db, max_age=0) != version
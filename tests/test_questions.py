@@ -0,0 +1,51 @@
+from benchmarks.common import random_submission
+from models import FinancialMetrics, Questions
+from response_writer import response_writer
+from scoring import METRIC_COMPONENTS, compute_metrics, get_scoring_engine
+from conftest import sign_up
+
+import random
+
+def metrics_of(response):
+  assert response.status_code == 200, response.text
+  return {metric: response.json()[metric] for metric in METRIC_COMPONENTS}
+
+def test_patch_matches_full_rescore(client, db):
+  sign_up(client)
+  questions = db.query(Questions).order_by(Questions.display_order).all()
+  engine = get_scoring_engine(db)
+  rnd = random.Random(11)
+
+  answers = {item["question_id"]: item["submitted_response"] for item in random_submission(questions, rnd)}
+  metrics_of(client.post("/questions/submit", json=[
+    {"question_id": question_id, "submitted_response": response} for question_id, response in answers.items()
+  ]))
+  for _ in range(30):
+    changed = rnd.sample(random_submission(questions, rnd), rnd.randint(1, 4))
+    patched = metrics_of(client.patch("/questions/submit", json=changed))
+    answers.update((item["question_id"], item["submitted_response"]) for item in changed)
+    expected = compute_metrics(engine.score_factors(answers.items()))
+    assert patched == expected
+
+    db.expire_all()
+    latest = db.query(FinancialMetrics).order_by(FinancialMetrics.id.desc()).first()
+    assert {metric: getattr(latest, metric) for metric in METRIC_COMPONENTS} == expected
+
+def test_out_of_range_amount_is_rejected(client, db):
+  sign_up(client)
+  questions = db.query(Questions).order_by(Questions.display_order).all()
+  answers = random_submission(questions)
+  for item, question in zip(answers, questions):
+    if not question.options:
+      item["submitted_response"] = str(2 ** 63)
+  assert client.post("/questions/submit", json=answers).status_code == 400
+
+def test_full_queue_saves_nothing(client, db, monkeypatch):
+  sign_up(client)
+  monkeypatch.setattr(response_writer, "enabled", True)
+  monkeypatch.setattr(response_writer, "max_rows", 0)
+  monkeypatch.setattr(response_writer, "enqueue_timeout", 0)
+  questions = db.query(Questions).order_by(Questions.display_order).all()
+  response = client.post("/questions/submit", json=random_submission(questions))
+  assert response.status_code == 503
+  assert db.query(FinancialMetrics).count() == 0
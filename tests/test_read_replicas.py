@@ -0,0 +1,59 @@
+from sqlalchemy import create_engine
+from benchmarks.common import random_submission
+from database import Base
+from db_routing import DB_READ_YOUR_WRITES_SECONDS, LAST_WRITE_COOKIE, ReplicaRouter
+from models import Questions
+from conftest import DATA_DIR, sign_up
+
+import database
+import middleware
+import os
+import pytest
+import time
+
+@pytest.fixture
+def replica(monkeypatch):
+  # A second SQLite file with the schema but no rows: whatever a read returns shows which
+  # database served it
+  url = f"sqlite:///{os.path.join(DATA_DIR, 'replica.db')}"
+  replica_engine = create_engine(url)
+  Base.metadata.drop_all(bind=replica_engine)
+  Base.metadata.create_all(bind=replica_engine)
+  router = ReplicaRouter(database.engine, [replica_engine])
+  monkeypatch.setattr(database, "replica_router", router)
+  monkeypatch.setattr(middleware, "SQLALCHEMY_REPLICA_URLS", [url])
+  yield router
+  replica_engine.dispose()
+
+def exported_rows(client, last_write):
+  client.cookies.set(LAST_WRITE_COOKIE, last_write)
+  response = client.get("/export/responses")
+  assert response.status_code == 200
+  return len(response.text.splitlines())
+
+def test_reads_follow_the_last_write(client, db, replica):
+  response = sign_up(client)
+  # The signup wrote to the primary
+  assert LAST_WRITE_COOKIE in response.cookies
+  questions = db.query(Questions).order_by(Questions.display_order).all()
+  response = client.post("/questions/submit", json=random_submission(questions))
+  assert response.status_code == 200
+  last_write = response.cookies[LAST_WRITE_COOKIE]
+  assert time.time() - float(last_write) < DB_READ_YOUR_WRITES_SECONDS
+
+  # Within the window: the primary, which has the responses
+  assert exported_rows(client, last_write) == len(questions)
+  assert replica.stats()["pinned_reads"] > 0
+
+  # Afterwards, or without the cookie: the (empty) replica
+  expired = str(time.time() - DB_READ_YOUR_WRITES_SECONDS - 1)
+  assert exported_rows(client, expired) == 0
+  assert exported_rows(client, "") == 0
+  assert replica.stats()["replica0_sessions"] > 0
+
+def test_reads_do_not_set_the_cookie(client, replica):
+  sign_up(client)
+  client.cookies.delete(LAST_WRITE_COOKIE)
+  response = client.get("/questions/")
+  assert response.status_code == 200
+  assert LAST_WRITE_COOKIE not in response.cookies
@@ -0,0 +1,54 @@
+from sqlalchemy.exc import IntegrityError, OperationalError
+from response_writer import ResponseWriter
+
+import pytest
+
+class FlakyWriter(ResponseWriter):
+  # Rows are ints; negative ones break a constraint, and the first `outages` writes fail
+  # as if the database were unreachable
+  def __init__(self, outages=0, **kwargs):
+    super().__init__(enabled=True, flush_interval=0.01, **kwargs)
+    self.outages = outages
+    self.written = []
+
+  def _write(self, rows):
+    if self.outages:
+      self.outages -= 1
+      raise OperationalError("INSERT", {}, Exception("connection refused"))
+    if any(row < 0 for row in rows):
+      raise IntegrityError("INSERT", {}, Exception("violates foreign key constraint"))
+    self.written.extend(rows)
+
+def submit(writer, rows):
+  with writer.deferred(rows):
+    pass
+
+def test_transient_failures_are_retried():
+  writer = FlakyWriter(outages=2)
+  writer.start()
+  submit(writer, [1, 2, 3])
+  writer.shutdown()
+  assert writer.written == [1, 2, 3]
+  assert writer.stats()["dropped"] == 0
+  assert writer.stats()["failures"] == 2
+
+def test_permanent_failures_drop_only_bad_rows():
+  writer = FlakyWriter(batch_size=100)
+  writer.start()
+  rows = list(range(20)) + [-1] + list(range(20, 40)) + [-2]
+  submit(writer, rows)
+  writer.shutdown()
+  assert sorted(writer.written) == list(range(40))
+  stats = writer.stats()
+  assert stats["dropped"] == 2
+  assert stats["rows_written"] == 40
+  assert stats["held_rows"] == 0
+
+def test_inline_write_failure_releases_reservation():
+  # Not started: rows are written inline, and a failure must not leak queue space
+  writer = FlakyWriter(max_rows=5)
+  with pytest.raises(IntegrityError):
+    submit(writer, [-1, 1, 2])
+  assert writer.stats()["held_rows"] == 0
+  submit(writer, [1, 2, 3, 4, 5])
+  assert writer.written == [1, 2, 3, 4, 5]
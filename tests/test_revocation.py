@@ -0,0 +1,97 @@
+from redis.exceptions import ConnectionError as RedisConnectionError
+from revocation import RevocationStore, REVOCATION_KEY_PREFIX
+from jwt_cache import token_digest
+from conftest import sign_up
+
+import asyncio
+import fakeredis
+import time
+
+TOKEN = "eyJhbGciOiJIUzI1NiJ9.eyJzdWIiOiJ0ZXN0In0.signature"
+
+class FailingRedis:
+  # Every call fails as if Redis were down
+  def __init__(self):
+    self.calls = 0
+
+  async def exists(self, *keys):
+    self.calls += 1
+    raise RedisConnectionError("down")
+
+  def pipeline(self, transaction=True):
+    self.calls += 1
+    raise RedisConnectionError("down")
+
+def test_sign_out_revokes_token(client, redis_client):
+  sign_up(client)
+  assert client.get("/questions/").status_code == 200
+  token = client.cookies.get("jwt_token")
+  assert client.get("/auth/signout").status_code == 200
+  assert client.get("/questions/").status_code == 401
+  # Shared with other workers through Redis
+  assert asyncio.run(redis_client.exists(REVOCATION_KEY_PREFIX + token_digest(token).hex())) == 1
+
+def test_other_worker_sees_revocation():
+  async def run():
+    server = fakeredis.FakeServer()
+    worker_a = RevocationStore(fakeredis.FakeAsyncRedis(server=server))
+    worker_b = RevocationStore(fakeredis.FakeAsyncRedis(server=server))
+    assert not await worker_b.is_revoked(TOKEN)
+    await worker_a.revoke(TOKEN, time.time() + 600)
+    # Not synced yet: asks Redis
+    assert await worker_b.is_revoked(TOKEN)
+  asyncio.run(run())
+
+def test_legacy_raw_token_keys_are_honoured():
+  async def run():
+    client = fakeredis.FakeAsyncRedis()
+    await client.set(TOKEN, "blacklisted", ex=600)
+    # Before the first sync, misses ask Redis for both keys
+    assert await RevocationStore(client).is_revoked(TOKEN)
+    assert not await RevocationStore(client, legacy_seconds=0).is_revoked(TOKEN)
+
+    # Syncing copies them to the new key, leaving the original for older workers
+    store = RevocationStore(client)
+    await store._load_existing()
+    assert store._is_revoked_locally(token_digest(TOKEN))
+    assert await client.exists(REVOCATION_KEY_PREFIX + token_digest(TOKEN).hex(), TOKEN) == 2
+  asyncio.run(run())
+
+def test_synced_store_makes_no_redis_calls():
+  async def run():
+    client = fakeredis.FakeAsyncRedis()
+    await client.set(TOKEN, "blacklisted", ex=600)
+    store = RevocationStore(client)
+    await store.start()
+    try:
+      await asyncio.wait_for(wait_until_synced(store), 5)
+      calls = []
+      exists = client.exists
+      client.exists = lambda *keys: calls.append(keys) or exists(*keys)
+      # The legacy key was copied at sync; neither lookup leaves the process
+      assert await store.is_revoked(TOKEN)
+      assert not await store.is_revoked(TOKEN + "x")
+      assert calls == []
+    finally:
+      await store.stop()
+  asyncio.run(run())
+
+async def wait_until_synced(store):
+  while not store.synced:
+    await asyncio.sleep(0.01)
+
+def test_breaker_open_falls_back_to_local_state():
+  async def run():
+    client = FailingRedis()
+    store = RevocationStore(client)
+    for _ in range(store.breaker.failure_threshold):
+      assert not await store.is_revoked(TOKEN)
+    assert store.breaker.state == "open"
+    calls = client.calls
+
+    # Revocations still apply in this process, without waiting on Redis
+    await store.revoke(TOKEN, time.time() + 600)
+    assert await store.is_revoked(TOKEN)
+    assert not await store.is_revoked(TOKEN + "x")
+    assert client.calls == calls
+  asyncio.run(run())
@@ -0,0 +1,213 @@
+from types import SimpleNamespace
+from models import Questions, InputType
+from questionnaire_cache import get_questionnaire_snapshot
+from scoring import DEFAULT_RULES, ScoringEngine, UnknownQuestionError, get_scoring_engine, encode_rules
+
+import pytest
+import questionnaire_cache
+import random
+import uuid
+
+# ---------------------------
+# Reference: the if/elif cascade the engine replaced
+# ---------------------------
+def legacy_score(answers):
+  # answers are (question text, response) pairs in submission order; returns the metrics
+  # the original submit_questionnaire stored.
+  investment_type = investing_potential = income_stability = owns_house = savings_rate = 0
+  investment_experience = fixed_asset_allocation = portfolio_checking_freq = market_dip_action = 0
+  investment_strategy = portfolio_crash_reaction = investment_horizon = has_dependents = 0
+  liquidity_ratio = major_financial_goals = debt_to_income_ratio = 0
+
+  for text, response in answers:
+    if text == 'How do you want to invest your money?':
+      if response == "SIP":
+        investment_type = -5
+      elif response == "One Time":
+        investment_type = 5
+      else:
+        investment_type = 0
+    if text == 'How much amount do you want to invest?':
+      investing_potential = int(response)
+    if text == 'How regular is your income?':
+      if response == "Regular monthly income":
+        income_stability = 10
+      elif response == "Irregular monthly income":
+        income_stability = 5
+      else:
+        income_stability = 0
+    if text == 'Do you own a house?':
+      owns_house = 5 if response == "Yes" else 0
+    if text == 'What %age of your annual income do you save?':
+      if response == "Greater than or equal to 30%":
+        savings_rate = 10
+      elif response == "Less than 30%":
+        savings_rate = 7
+      elif response == "Less than 20%":
+        savings_rate = 4
+      elif response == "Less than 10%":
+        savings_rate = 1
+      else:
+        savings_rate = 0
+    if text == 'What is your investing experience in mutual funds and stocks?':
+      if response == "Never invested":
+        investment_experience = -10
+      elif response == "Started less than 3 years back":
+        investment_experience = -5
+      elif response == "Investing from last 10 years to 3 years":
+        investment_experience = 5
+      elif response == "Investing for more than 10 years":
+        investment_experience = 10
+      elif response == "I have stopped investing":
+        investment_experience = -10
+      else:
+        investment_experience = 0
+    if text == 'What %age of your investment is in FD, PPF, NSC etc.?':
+      if response == "Less than 20%":
+        fixed_asset_allocation = 10
+      elif response == "Between 20-30%":
+        fixed_asset_allocation = 5
+      elif response == "Between 40-50%":
+        fixed_asset_allocation = -5
+      elif response == "Greater than 60%":
+        fixed_asset_allocation = -10
+      else:
+        fixed_asset_allocation = 0
+    if text == 'How often do you check your portfolio value?':
+      if response == "Everyday":
+        portfolio_checking_freq = -10
+      elif response == "4 to 5 times a month":
+        portfolio_checking_freq = -5
+      elif response == "4 to 5 times a year":
+        portfolio_checking_freq = 5
+      else:
+        portfolio_checking_freq = 0
+    if text == 'In which market dip would you take corrective action?':
+      if response == "Portfolio is down 10%":
+        market_dip_action = -10
+      elif response == "Portfolio is down 20%":
+        market_dip_action = -5
+      elif response == "Portfolio is down 30%":
+        market_dip_action = 0
+      elif response == "Portfolio is down more than 40%":
+        market_dip_action = 5
+      elif response == "None of the above":
+        market_dip_action = 10
+      else:
+        market_dip_action = 0
+    if text == 'What portfolio strategy would you like to have?':
+      if response == "Preserve principal amount even if post tax growth is below inflation":
+        investment_strategy = -10
+      elif response == "Preserve principal amount with post tax growth at par with inflation":
+        investment_strategy = -5
+      elif response == "Achieve moderate growth":
+        investment_strategy = 5
+      elif response == "Achieve high growth":
+        investment_strategy = 10
+      elif response == "Maximise growth":
+        investment_strategy = 15
+      else:
+        investment_strategy = 0
+    if text == 'What would you do if your portfolio dropped 50%?':
+      if response == "Sell everything":
+        portfolio_crash_reaction = -10
+      elif response == "Hold and wait":
+        portfolio_crash_reaction = 5
+      elif response == "Invest more":
+        portfolio_crash_reaction = 10
+      else:
+        portfolio_crash_reaction = 0
+    if text == 'What is your preferred investment horizon?':
+      if response == "Less than 3 years":
+        investment_horizon = -10
+      elif response == "More than 5 years":
+        investment_horizon = 10
+      else:
+        investment_horizon = 0
+    if text == 'What is your preferred investment horizon?':
+      has_dependents = -10 if response == "Yes" else 0
+    if text == 'How many months of expenses can your emergency savings cover?':
+      if response == "Less than 3 months":
+        liquidity_ratio = -10
+      elif response == "More than 6 months":
+        liquidity_ratio = 10
+      else:
+        liquidity_ratio = 0
+    if text == 'Do you have any significant financial goals in the next 3-5 years?':
+      major_financial_goals = -10 if response == "Yes" else 0
+    if text == 'What percentage of your income goes towards EMIs (Debt-to-Income Ratio)?':
+      if response == "Less than 20%":
+        debt_to_income_ratio = 10
+      elif response == "More than 40%":
+        debt_to_income_ratio = -10
+      else:
+        debt_to_income_ratio = 0
+
+  return {
+    "risk_capacity": (income_stability * 10) + savings_rate + owns_house + investment_experience
+                     + fixed_asset_allocation + has_dependents + major_financial_goals,
+    "risk_tolerance": portfolio_checking_freq + market_dip_action + investment_strategy
+                      + portfolio_crash_reaction + investment_type,
+    "investing_potential": investing_potential,
+    "liquidity_ratio": liquidity_ratio,
+    "debt_to_income_ratio": debt_to_income_ratio,
+    "investment_horizon_score": investment_horizon,
+  }
+
+# ---------------------------
+# Tests
+# ---------------------------
+def seeded_questions():
+  return [
+    SimpleNamespace(id=uuid.uuid4(), text=text, scoring_rules=encode_rules(rules))
+    for text, rules in DEFAULT_RULES.items()
+  ]
+
+def random_answers(questions, rnd):
+  # Any subset of the questions in any order, some answered twice (the later answer wins),
+  # with options outside the known ones mixed in
+  answers = []
+  for question in rnd.sample(questions, rnd.randint(0, len(questions))) * rnd.choice((1, 1, 2)):
+    options = sorted({option for _, points in DEFAULT_RULES[question.text] for option in (points or {})})
+    if not options:
+      response = str(rnd.randrange(0, 1000000, 500))
+    elif rnd.random() < 0.1:
+      response = rnd.choice(("", "Maybe", "Yes", options[0].lower()))
+    else:
+      response = rnd.choice(options)
+    answers.append((question, response))
+  return answers
+
+def test_engine_matches_legacy_cascade():
+  questions = seeded_questions()
+  engine = ScoringEngine.from_questions(questions)
+  rnd = random.Random(20261018)
+  for _ in range(20000):
+    answers = random_answers(questions, rnd)
+    _, metrics = engine.score([(str(question.id), response) for question, response in answers])
+    assert metrics == legacy_score([(question.text, response) for question, response in answers])
+
+def test_rewording_a_question_keeps_its_scoring():
+  questions = seeded_questions()
+  owns_house = next(question for question in questions if question.text == 'Do you own a house?')
+  owns_house.text = 'Do you currently own the home you live in?'
+  engine = ScoringEngine.from_questions(questions)
+  factors, _ = engine.score([(str(owns_house.id), "Yes")])
+  assert factors["owns_house"] == 5
+
+def test_unknown_question_keeps_caches(db, monkeypatch):
+  snapshot = get_questionnaire_snapshot(db)
+  engine = get_scoring_engine(db)
+  unknown = str(uuid.uuid4())
+  for _ in range(10):
+    with pytest.raises(UnknownQuestionError):
+      get_scoring_engine(db, [unknown]).score([(unknown, "Yes")])
+  assert get_scoring_engine(db) is engine
+  assert get_questionnaire_snapshot(db) is snapshot
+
+  # A question added elsewhere is picked up on the recheck
+  question = Questions(text="New", input_type=InputType.INPUT_NUMBER, weight={}, scoring_rules=[{"factor": "savings_rate", "points": None}], display_order=100)
+  db.add(question)
+  db.commit()
+  monkeypatch.setattr(questionnaire_cache, "_checked_at", float("-inf"))
+  assert str(question.id) in get_scoring_engine(db, [str(question.id)])